@@ -6,5 +6,8 @@ export const selectedNote = $state({
   ajaxNoteEndpoint: undefined,
   selectedNoteId: undefined,
   csrfToken: undefined,
+  etag: undefined,
+  revision: undefined,
+  savedContent: undefined,
   isSaving: false,
 });
@@ -0,0 +1,101 @@
+/**
+ * Note change feed shared by every tab of this origin.
+ *
+ * One tab (the holder of a Web Lock) owns the EventSource and re-broadcasts
+ * events over a BroadcastChannel; the others only listen. Each tab announces
+ * the notes it shows, the leader subscribes to their union and reconnects
+ * with the last event id when it changes, so nothing is missed. When the
+ * leader tab closes, its lock is released and another tab takes over.
+ */
+const CHANNEL_NAME = "hyperdossier-note-events";
+const LOCK_NAME = "hyperdossier-note-events-leader";
+
+const tabId = Math.random().toString(36).slice(2);
+const listeners = new Set();
+const interests = new Map();
+
+let channel;
+let endpoint;
+let eventSource;
+let lastEventId;
+let reconnectTimer;
+
+function dispatch(type, data) {
+  listeners.forEach((listener) => listener(type, data));
+}
+
+function unionOfInterests() {
+  const ids = new Set();
+  interests.forEach((noteIds) => noteIds.forEach((id) => ids.add(id)));
+  return [...ids].sort((a, b) => a - b);
+}
+
+function connect() {
+  if (eventSource) eventSource.close();
+  const url = new URL(endpoint, window.location.origin);
+  const noteIds = unionOfInterests();
+  if (noteIds.length) url.searchParams.set("notes", noteIds.join(","));
+  // EventSource only sends Last-Event-ID on its own reconnects
+  if (lastEventId) url.searchParams.set("last_event_id", lastEventId);
+
+  eventSource = new EventSource(url.toString());
+  ["note.created", "note.updated", "note.deleted", "reset"].forEach((type) => {
+    eventSource.addEventListener(type, (event) => {
+      if (event.lastEventId) lastEventId = event.lastEventId;
+      const data = JSON.parse(event.data);
+      dispatch(type, data);
+      channel.postMessage({ kind: "event", type, data });
+    });
+  });
+}
+
+function scheduleReconnect() {
+  clearTimeout(reconnectTimer);
+  reconnectTimer = setTimeout(connect, 250);
+}
+
+function becomeLeader() {
+  return new Promise(() => {
+    // Never resolves: the lock is held for the lifetime of this tab
+    connect();
+    channel.addEventListener("message", ({ data }) => {
+      if (data.kind === "interest") {
+        interests.set(data.tabId, data.noteIds);
+        scheduleReconnect();
+      } else if (data.kind === "bye") {
+        interests.delete(data.tabId);
+      }
+    });
+    channel.postMessage({ kind: "leader" });
+  });
+}
+
+export function subscribeToNoteEvents(eventsEndpoint, noteIds, listener) {
+  listeners.add(listener);
+  if (channel) return () => listeners.delete(listener);
+
+  endpoint = eventsEndpoint;
+  channel = new BroadcastChannel(CHANNEL_NAME);
+  interests.set(tabId, noteIds);
+
+  const announce = () =>
+    channel.postMessage({ kind: "interest", tabId, noteIds });
+
+  channel.addEventListener("message", ({ data }) => {
+    if (data.kind === "event") dispatch(data.type, data.data);
+    if (data.kind === "leader") announce();
+  });
+  window.addEventListener("pagehide", () =>
+    channel.postMessage({ kind: "bye", tabId }),
+  );
+
+  if (navigator.locks) {
+    navigator.locks.request(LOCK_NAME, becomeLeader);
+    announce();
+  } else {
+    // No Web Locks: every tab keeps its own connection
+    becomeLeader();
+  }
+
+  return () => listeners.delete(listener);
+}
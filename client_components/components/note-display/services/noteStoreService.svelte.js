@@ -1,28 +1,73 @@
 import { selectedNote } from "../noteStore.svelte.js";
+import { buildSaveBody, rebaseText } from "./textPatch.js";
+
+// Shared by every renderer: one save in flight at a time, edits made
+// meanwhile go out once it is answered, against the revision it returned.
+let saveInFlight = false;
+let saveQueued = false;
 
 export function noteStoreService() {
   function loadDefaultNote() {
     selectedNote.content = localStorage.getItem("localNote") || "";
   }
 
+  function fetchNote(headers = {}) {
+    return fetch(selectedNote.ajaxNoteEndpoint, {
+      method: "GET",
+      headers: { "Content-Type": "application/json", ...headers },
+    }).then((response) => {
+      // 304: nothing changed since the last load, keep the local state
+      if (response.status === 304) return null;
+      const etag = response.headers.get("ETag") || undefined;
+      return response.json().then((data) => ({ data, etag }));
+    });
+  }
+
+  /**
+   * Take the server's copy of the note, replaying local edits that are not
+   * saved yet onto it. When both changed the same text the user picks one.
+   * Returns whether local edits are left to save.
+   */
+  function adoptServerNote(result, etag) {
+    const server = result.note_content;
+    const local = selectedNote.content;
+    const base = selectedNote.savedContent;
+    let content = server;
+    if (base !== undefined && local !== base) {
+      content = rebaseText(base, server, local);
+      if (content === null) {
+        content = window.confirm(
+          "This note was changed elsewhere while you were editing the same part. " +
+            "Keep your version? Cancel shows the other one.",
+        )
+          ? local
+          : server;
+      }
+    }
+    selectedNote.title = result.note_title;
+    selectedNote.content = content;
+    selectedNote.savedContent = server;
+    selectedNote.revision = result.note_revision;
+    selectedNote.type = result.note_type;
+    selectedNote.attachments = result.note_attachments || [];
+    selectedNote.etag = etag;
+    return content !== server;
+  }
+
   function loadNoteContent() {
-    if (!selectedNote.selectedNoteId) return;
+    // A save in flight brings the note up to date itself
+    if (!selectedNote.selectedNoteId || saveInFlight) return;
 
-    fetch(selectedNote.ajaxNoteEndpoint, {
-      method: "GET",
-      headers: {
-        "Content-Type": "application/json",
-      },
-    })
-      .then((response) => response.json())
-      .then((data) => {
-        if (data.status !== "ok") {
-          console.error("Error fetching note:", data);
-        } else {
-          selectedNote.title = data.result.note_title;
-          selectedNote.content = data.result.note_content;
-          selectedNote.type = data.result.note_type;
-          selectedNote.attachments = data.result.note_attachments || [];
+    const headers = {};
+    if (selectedNote.etag) headers["If-None-Match"] = selectedNote.etag;
+
+    fetchNote(headers)
+      .then((loaded) => {
+        if (loaded === null || saveInFlight) return;
+        if (loaded.data.status !== "ok") {
+          console.error("Error fetching note:", loaded.data);
+        } else if (adoptServerNote(loaded.data.result, loaded.etag)) {
+          saveNoteContent();
         }
       })
       .catch((err) => console.error("Ajax error:", err));
@@ -35,24 +80,62 @@ export function noteStoreService() {
 
     if (!selectedNote.selectedNoteId) return;
     selectedNote.isSaving = true;
+    if (saveInFlight) {
+      saveQueued = true;
+      return;
+    }
+    saveInFlight = true;
+    saveQueued = false;
+
+    const headers = {
+      "X-CSRFToken": selectedNote.csrfToken,
+      "Content-Type": "application/json",
+    };
+    if (selectedNote.etag) headers["If-Match"] = selectedNote.etag;
+
+    const content = selectedNote.content;
+    const body = buildSaveBody(
+      selectedNote.savedContent,
+      content,
+      selectedNote.revision,
+    );
+    let resave = false;
+
     fetch(selectedNote.ajaxNoteEndpoint, {
       method: "POST",
-      headers: {
-        "X-CSRFToken": selectedNote.csrfToken,
-        "Content-Type": "application/json",
-      },
-      body: JSON.stringify({ content: selectedNote.content }),
+      headers,
+      body: JSON.stringify(body),
     })
-      .then((response) => response.json())
-      .then((data) => {
-        selectedNote.isSaving = false;
-        if (data.status !== "ok") {
-          console.error("Error updating note:", data);
+      .then((response) => {
+        if (response.status === 412 || response.status === 409) {
+          // Changed elsewhere: replay our edits onto the server's copy
+          console.warn("Note changed on the server, rebasing local edits");
+          return fetchNote().then((loaded) => {
+            if (loaded.data.status !== "ok") {
+              console.error("Error fetching note:", loaded.data);
+            } else {
+              resave = adoptServerNote(loaded.data.result, loaded.etag);
+            }
+          });
         }
+        return response.json().then((data) => {
+          if (data.status !== "ok") {
+            console.error("Error updating note:", data);
+          } else {
+            selectedNote.etag = data.etag;
+            selectedNote.revision = data.revision;
+            selectedNote.savedContent = content;
+          }
+        });
       })
-      .catch((err) => {
-        console.error("Ajax error:", err);
-        selectedNote.isSaving = false;
+      .catch((err) => console.error("Ajax error:", err))
+      .finally(() => {
+        saveInFlight = false;
+        if (saveQueued || resave) {
+          saveNoteContent();
+        } else {
+          selectedNote.isSaving = false;
+        }
       });
   }
 
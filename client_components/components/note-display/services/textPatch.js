@@ -0,0 +1,80 @@
+/**
+ * Single-op diff between the last saved text and the current one:
+ * common prefix and suffix are kept, the middle is replaced.
+ * Offsets count code points, like Python string indices on the server.
+ */
+export function buildTextPatch(oldText, newText) {
+  const before = Array.from(oldText);
+  const after = Array.from(newText);
+
+  let prefix = 0;
+  const maxPrefix = Math.min(before.length, after.length);
+  while (prefix < maxPrefix && before[prefix] === after[prefix]) prefix++;
+
+  let suffix = 0;
+  const maxSuffix = maxPrefix - prefix;
+  while (
+    suffix < maxSuffix &&
+    before[before.length - 1 - suffix] === after[after.length - 1 - suffix]
+  ) {
+    suffix++;
+  }
+
+  return [
+    {
+      offset: prefix,
+      delete: before.length - prefix - suffix,
+      insert: after.slice(prefix, after.length - suffix).join(""),
+    },
+  ];
+}
+
+/**
+ * Request body for an autosave: a patch against baseRevision when that is
+ * smaller than sending the whole content, a full replace otherwise.
+ */
+export function buildSaveBody(savedText, newText, baseRevision) {
+  if (baseRevision === undefined || savedText === undefined) {
+    return { content: newText };
+  }
+  const patch = {
+    mode: "patch",
+    base_revision: baseRevision,
+    ops: buildTextPatch(savedText, newText),
+  };
+  const patchBody = JSON.stringify(patch);
+  if (patchBody.length >= newText.length) {
+    return { content: newText, base_revision: baseRevision };
+  }
+  return patch;
+}
+
+/**
+ * Replay the local edit of baseText onto serverText, someone else's edit of
+ * the same base. Both are reduced to one op (see buildTextPatch); when the
+ * two touch the same span there is no safe order and null is returned.
+ */
+export function rebaseText(baseText, serverText, localText) {
+  if (localText === baseText || serverText === localText) return serverText;
+  if (serverText === baseText) return localText;
+
+  const [theirs] = buildTextPatch(baseText, serverText);
+  const [ours] = buildTextPatch(baseText, localText);
+  let offset;
+  if (ours.offset === theirs.offset) {
+    return null;
+  } else if (ours.offset + ours.delete <= theirs.offset) {
+    offset = ours.offset;
+  } else if (theirs.offset + theirs.delete <= ours.offset) {
+    offset = ours.offset + Array.from(theirs.insert).length - theirs.delete;
+  } else {
+    return null;
+  }
+
+  const chars = Array.from(serverText);
+  return (
+    chars.slice(0, offset).join("") +
+    ours.insert +
+    chars.slice(offset + ours.delete).join("")
+  );
+}
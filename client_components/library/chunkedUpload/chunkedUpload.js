@@ -0,0 +1,143 @@
+/**
+ * Resumable chunked upload of note attachments.
+ *
+ * A session is opened on the server, chunks are PUT in order with their
+ * offset, and the session is completed into a NoteAttachment. The session
+ * URL is remembered in localStorage per file, so picking the same file again
+ * after a reload or a dropped connection continues from the server's offset.
+ */
+const STORAGE_PREFIX = "hyperdossier-upload:";
+const MAX_RETRIES = 5;
+
+function storageKey(createUrl, file) {
+  return `${STORAGE_PREFIX}${createUrl}:${file.name}:${file.size}:${file.lastModified}`;
+}
+
+async function request(url, options, csrfToken) {
+  const response = await fetch(url, {
+    credentials: "same-origin",
+    ...options,
+    headers: { "X-CSRFToken": csrfToken, ...(options.headers || {}) },
+  });
+  const data = await response.json().catch(() => ({}));
+  return { response, data };
+}
+
+async function openSession(createUrl, file, csrfToken) {
+  const key = storageKey(createUrl, file);
+  const saved = localStorage.getItem(key);
+  if (saved) {
+    const { response, data } = await request(saved, { method: "GET" }, csrfToken);
+    if (response.ok && data.result.status === "OPEN") {
+      return { url: saved, session: data.result };
+    }
+    localStorage.removeItem(key);
+  }
+
+  const { response, data } = await request(
+    createUrl,
+    {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({
+        name: file.name,
+        size: file.size,
+        mime_type: file.type,
+      }),
+    },
+    csrfToken,
+  );
+  if (!response.ok) {
+    throw new Error(data.message || `Upload could not start (${response.status})`);
+  }
+  localStorage.setItem(key, data.result.url);
+  return { url: data.result.url, session: data.result };
+}
+
+export async function uploadInChunks(file, { createUrl, csrfToken, onProgress }) {
+  const { url, session } = await openSession(createUrl, file, csrfToken);
+  let offset = session.offset;
+  let retries = 0;
+  onProgress?.(offset, file.size);
+
+  while (offset < file.size) {
+    const chunk = file.slice(offset, offset + session.chunk_size);
+    let response, data;
+    try {
+      ({ response, data } = await request(
+        url,
+        {
+          method: "PUT",
+          headers: {
+            "Content-Type": "application/octet-stream",
+            "Upload-Offset": String(offset),
+          },
+          body: chunk,
+        },
+        csrfToken,
+      ));
+    } catch (error) {
+      response = null;
+    }
+
+    if (response?.ok) {
+      offset = data.result.offset;
+      retries = 0;
+      onProgress?.(offset, file.size);
+    } else if (response?.status === 409 && typeof data.offset === "number") {
+      offset = data.offset;
+    } else if (retries < MAX_RETRIES && (!response || response.status >= 500)) {
+      retries += 1;
+      await new Promise((resolve) => setTimeout(resolve, 1000 * 2 ** retries));
+    } else {
+      throw new Error(data?.message || `Upload failed (${response?.status})`);
+    }
+  }
+
+  const { response, data } = await request(
+    `${url}complete/`,
+    { method: "POST" },
+    csrfToken,
+  );
+  if (!response.ok) {
+    throw new Error(data.message || `Upload could not complete (${response.status})`);
+  }
+  localStorage.removeItem(storageKey(createUrl, file));
+  return data.result.attachment;
+}
+
+/**
+ * Enhance <input type="file" data-chunked-upload-url="..."> elements: picked
+ * files are uploaded right away, progress goes to the element referenced by
+ * data-chunked-upload-status. Attachments are created server-side, the
+ * surrounding form is left alone.
+ */
+export function initChunkedUploadInputs(root = document) {
+  root.querySelectorAll("input[type=file][data-chunked-upload-url]").forEach((input) => {
+    const status = document.getElementById(input.dataset.chunkedUploadStatus);
+    const report = (text) => {
+      if (status) status.textContent = text;
+    };
+
+    input.addEventListener("change", async () => {
+      const files = [...input.files];
+      input.disabled = true;
+      try {
+        for (const file of files) {
+          await uploadInChunks(file, {
+            createUrl: input.dataset.chunkedUploadUrl,
+            csrfToken: input.dataset.csrfToken,
+            onProgress: (done, total) =>
+              report(`${file.name}: ${total ? Math.floor((done / total) * 100) : 100}%`),
+          });
+        }
+        report(`${files.length} file(s) attached`);
+      } catch (error) {
+        report(error.message);
+      } finally {
+        input.value = "";
+        input.disabled = false;
+      }
+    });
+  });
+}
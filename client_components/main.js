@@ -4,5 +4,9 @@ import "./main.css";
 import "./components/note-display/NoteDisplay.svelte";
 import "./components/searchable-select/SearchableSelect.svelte";
 import { GlobalPopover } from "./library/GlobalPopover/GlobalPopover";
+import { initChunkedUploadInputs } from "./library/chunkedUpload/chunkedUpload";
 
-document.addEventListener("DOMContentLoaded", () => new GlobalPopover());
\ No newline at end of file
+document.addEventListener("DOMContentLoaded", () => {
+  new GlobalPopover();
+  initChunkedUploadInputs();
+});
\ No newline at end of file
@@ -23,6 +23,8 @@ class CommonConfig(AppConfig):
             "title": "Tools",
             "items": [
                 {"label": "System dashboard", "url_name": "admin:dashboard"},
-                {"label": "Background tasks", "url_name": "finances:transaction_list"},
+                {"label": "Background tasks", "url_name": "admin:jobs_job_changelist"},
+                {"label": "Export data", "url_name": "admin:export"},
+                {"label": "Import transactions", "url_name": "admin:finance_import"},
             ],
         })
\ No newline at end of file
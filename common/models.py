@@ -13,4 +13,16 @@ class FailedLogin(models.Model):
 
 
 class CustomizedUser(AbstractUser):
-    pass
\ No newline at end of file
+    pass
+
+class SharedVersion(models.Model):
+    """
+    A named counter all processes share, see common.versions. Processes
+    keep state in memory and reload it when the version moves on.
+    """
+
+    name = models.CharField(max_length=64, primary_key=True)
+    value = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.name}={self.value}"
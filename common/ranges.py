@@ -0,0 +1,148 @@
+import re
+import uuid
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+
+BLOCK_SIZE = 64 * 1024
+# More ranges than this are answered with the whole file instead.
+MAX_RANGES = 16
+
+_RANGE_RE = re.compile(r"^\s*(\d*)\s*-\s*(\d*)\s*$")
+
+
+def file_etag(size: int, mtime: float) -> str:
+    """Strong ETag in nginx's format, so X-Accel responses keep the same one."""
+    return f'"{int(mtime):x}-{size:x}"'
+
+
+def parse_range_header(header: str, size: int):
+    """
+    Byte ranges of a Range header as a list of (start, end) with end
+    inclusive, sorted and merged. Returns None when the header should be
+    ignored (malformed, not bytes, too many ranges) and [] when no range is
+    satisfiable.
+    """
+    unit, _, spec = (header or "").partition("=")
+    if unit.strip().lower() != "bytes" or not spec:
+        return None
+    parts = spec.split(",")
+    if len(parts) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for part in parts:
+        match = _RANGE_RE.match(part)
+        if not match or match.groups() == ("", ""):
+            return None
+        first, last = match.groups()
+        if first == "":
+            # suffix range: the last N bytes
+            length = int(last)
+            if length == 0 or size == 0:
+                continue
+            ranges.append((max(size - length, 0), size - 1))
+            continue
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        if start >= size:
+            continue
+        end = min(int(last), size - 1) if last else size - 1
+        ranges.append((start, end))
+
+    ranges.sort()
+    merged = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def if_range_matches(request, etag: str, mtime: float) -> bool:
+    if_range = request.headers.get("If-Range")
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        # Range requests need a strong match.
+        return not if_range.startswith("W/") and etag in parse_etags(if_range)
+    # A date must be exactly the Last-Modified we send (RFC 9110 13.1.5).
+    date = parse_http_date_safe(if_range)
+    return date is not None and int(mtime) == date
+
+
+def _read_range(fileobj, start, end):
+    fileobj.seek(start)
+    remaining = end - start + 1
+    while remaining > 0:
+        data = fileobj.read(min(BLOCK_SIZE, remaining))
+        if not data:
+            break
+        remaining -= len(data)
+        yield data
+
+
+def _stream_single(path, start, end):
+    with open(path, "rb") as fileobj:
+        yield from _read_range(fileobj, start, end)
+
+
+def _stream_multipart(path, ranges, parts, closing):
+    with open(path, "rb") as fileobj:
+        for (start, end), header in zip(ranges, parts):
+            yield header
+            yield from _read_range(fileobj, start, end)
+        yield closing
+
+
+def range_response(request, path, ranges, size, content_type):
+    """
+    206 for one or more satisfiable ranges (multipart/byteranges for
+    several), 416 when none is satisfiable.
+    """
+    if not ranges:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        response = StreamingHttpResponse(
+            [] if request.method == "HEAD" else _stream_single(path, start, end),
+            status=206,
+            content_type=content_type,
+        )
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Length"] = end - start + 1
+        return response
+
+    boundary = uuid.uuid4().hex
+    parts = [
+        (
+            f"\r\n--{boundary}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+        ).encode()
+        for start, end in ranges
+    ]
+    closing = f"\r\n--{boundary}--\r\n".encode()
+    length = sum(len(part) for part in parts) + len(closing)
+    length += sum(end - start + 1 for start, end in ranges)
+
+    response = StreamingHttpResponse(
+        []
+        if request.method == "HEAD"
+        else _stream_multipart(path, ranges, parts, closing),
+        status=206,
+        content_type=f"multipart/byteranges; boundary={boundary}",
+    )
+    response["Content-Length"] = length
+    return response
+
+
+def set_file_validators(response, etag, mtime):
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(int(mtime))
+    response["Accept-Ranges"] = "bytes"
@@ -1,3 +1,41 @@
+import io
+import zipfile
+
 from django.test import TestCase
+from django.urls import reverse
+
+from .export import export_columns
+from .models import CustomizedUser
+from .versions import bump_version, get_version
+
+
+class SharedVersionTests(TestCase):
+    def test_bump_returns_each_increment(self):
+        start = get_version("test")
+        self.assertEqual(
+            [bump_version("test") for _ in range(3)], [start + 1, start + 2, start + 3]
+        )
+        self.assertEqual(get_version("test"), start + 3)
+
+    def test_bump_creates_the_counter(self):
+        self.assertGreater(bump_version("new"), 0)
+
+
+class ExportColumnsTests(TestCase):
+    def test_user_export_leaves_out_password(self):
+        user = CustomizedUser.objects.create_superuser("admin", "admin@example.com", "pw")
+        self.client.force_login(user)
+        response = self.client.get(
+            reverse("admin:export"), {"models": "common.customizeduser", "format": "csv"}
+        )
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+        header = archive.read("common.customizeduser.csv").decode().splitlines()[0]
+        self.assertIn("username", header.split(","))
+        self.assertNotIn("password", header)
+        self.assertNotIn(user.password, archive.read("common.customizeduser.csv").decode())
+
+    def test_model_admin_export_fields_pick_the_columns(self):
+        class UserExport:
+            export_fields = ["id", "username"]
 
-# Create your tests here.
+        self.assertEqual(export_columns(CustomizedUser, UserExport()), ["id", "username"])
@@ -0,0 +1,39 @@
+"""
+Version counters shared by every web and task worker process through the
+database. A process caching something in memory remembers the version it
+loaded and reloads once get_version() moves on; whoever changes the
+underlying data calls bump_version(). Bumps are atomic UPDATEs, so
+concurrent ones are never lost and each sees its own increment.
+"""
+
+import time
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import SharedVersion
+
+
+def get_version(name):
+    """Current value of the named version, created on first use."""
+    value = SharedVersion.objects.filter(name=name).values_list("value", flat=True).first()
+    if value is None:
+        # Seeded from the clock so a new counter (e.g. after a restore)
+        # never repeats a version a process may still hold.
+        version, _ = SharedVersion.objects.get_or_create(
+            name=name, defaults={"value": int(time.time() * 1000)}
+        )
+        value = version.value
+    return value
+
+
+def bump_version(name):
+    """Increment the named version and return the new value."""
+    counter = SharedVersion.objects.filter(name=name)
+    with transaction.atomic():
+        # Write first: on SQLite a read would take a shared lock that
+        # concurrent bumps then deadlock upgrading.
+        if not counter.update(value=F("value") + 1):
+            get_version(name)
+            counter.update(value=F("value") + 1)
+        return SharedVersion.objects.values_list("value", flat=True).get(name=name)
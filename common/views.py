@@ -7,9 +7,18 @@ from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.http import FileResponse, Http404, HttpResponse
 from django.template.response import TemplateResponse
+from django.utils.cache import get_conditional_response
 from django.utils.encoding import smart_str
 from django.views.decorators.http import require_http_methods
 
+from .ranges import (
+    file_etag,
+    if_range_matches,
+    parse_range_header,
+    range_response,
+    set_file_validators,
+)
+
 
 @login_required
 @require_http_methods(["GET", "HEAD"])
@@ -21,6 +30,9 @@ def protected_media(request, relative_path: str):
     URL: /files/<path:relative_path>/
     Example: /files/documents/report.pdf
              -> MEDIA_ROOT/documents/report.pdf
+
+    ?filename=... sets the name the browser saves the file under, for files
+    stored under a generated name (content-addressed attachments).
     """
     media_root = Path(settings.MEDIA_ROOT).resolve()
     requested = (media_root / relative_path).resolve()
@@ -33,35 +45,66 @@ def protected_media(request, relative_path: str):
     if not requested.is_file():
         raise Http404("File not found")
 
+    download_name = "".join(
+        ch
+        for ch in Path(request.GET.get("filename", "")).name
+        if ch.isprintable() and ch not in '"\\'
+    ) or requested.name
+
     content_type, _ = mimetypes.guess_type(requested.name)
     if content_type is None:
         content_type = "application/octet-stream"
 
+    # One stat() for existence, validators and length.
+    stat = requested.stat()
+    etag = file_etag(stat.st_size, stat.st_mtime)
+    not_modified = get_conditional_response(
+        request, etag=etag, last_modified=int(stat.st_mtime)
+    )
+    if not_modified is not None:
+        set_file_validators(not_modified, etag, stat.st_mtime)
+        not_modified["Cache-Control"] = "private, max-age=3600"
+        return not_modified
+
     # --- DEV MODE --------------------------------------------------------
     # If running Django dev server, serve file bytes directly
     if settings.DEBUG or getattr(settings, "RUNSERVER", False):
-        if request.method == "HEAD":
+        ranges = None
+        if "Range" in request.headers and if_range_matches(
+            request, etag, stat.st_mtime
+        ):
+            ranges = parse_range_header(request.headers["Range"], stat.st_size)
+
+        if ranges is not None:
+            response = range_response(
+                request, requested, ranges, stat.st_size, content_type
+            )
+        elif request.method == "HEAD":
             response = HttpResponse(content_type=content_type)
-            response["Content-Length"] = requested.stat().st_size
-            response["Content-Disposition"] = (
-                f'inline; filename="{smart_str(requested.name)}"'
+            response["Content-Length"] = stat.st_size
+        else:
+            response = FileResponse(
+                open(requested, "rb"),
+                content_type=content_type,
+                as_attachment=False,
+                filename=download_name,
             )
-            return response
-
-        return FileResponse(
-            open(requested, "rb"),
-            content_type=content_type,
-            as_attachment=False,
-            filename=requested.name,
+        response["Content-Disposition"] = (
+            f'inline; filename="{smart_str(download_name)}"'
         )
+        set_file_validators(response, etag, stat.st_mtime)
+        response["Cache-Control"] = "private, max-age=3600"
+        return response
 
     # --- PROD MODE -------------------------------------------------------
-    # Use Nginx X-Accel-Redirect
+    # Use Nginx X-Accel-Redirect. Nginx answers Range / If-Range itself and
+    # computes the same ETag and Last-Modified from the file.
     internal_path = f"/hyperdossier/protected-media/{rel_for_internal.as_posix()}"
 
     response = HttpResponse(content_type=content_type)
     response["X-Accel-Redirect"] = internal_path
-    response["Content-Disposition"] = f'inline; filename="{smart_str(requested.name)}"'
+    response["Content-Disposition"] = f'inline; filename="{smart_str(download_name)}"'
+    set_file_validators(response, etag, stat.st_mtime)
 
     response["Cache-Control"] = "private, max-age=3600"
 
@@ -48,6 +48,7 @@ INSTALLED_APPS = [
     "django.contrib.admindocs",
     "finances",
     "infobjects",
+    "jobs",
     "hyperadmin",
     "django.contrib.admin",
     "iommi",
@@ -96,6 +97,17 @@ DATABASES = {
     }
 }
 
+# Shared by every web and task worker process through the database
+# (`manage.py createcachetable`). In-memory state is invalidated through
+# common.versions instead, whose bumps are atomic.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "django_cache",
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -150,14 +162,24 @@ STATICFILES_DIRS = [
 ]
 STATIC_ROOT = os.path.join(ROOT_DIR, "var", "static")
 
-Q_CLUSTER = {
-    "name": "DjangORM",
-    "workers": 1,
-    "timeout": 90,
-    "retry": 120,
-    "queue_limit": 50,
-    "bulk": 10,
-    "orm": "default",
+# django.tasks, stored in the database and run by `manage.py run_tasks`.
+TASKS = {
+    "default": {
+        "BACKEND": "jobs.backend.DatabaseBackend",
+        "OPTIONS": {
+            "DEFAULT_TIMEOUT": 90,
+            "DEFAULT_MAX_ATTEMPTS": 3,
+            "RETRY_BACKOFF": 30,
+            "RETRY_BACKOFF_MAX": 3600,
+            "WORKER_MODE": "thread",
+            "WORKER_CONCURRENCY": 2,
+            "POLL_INTERVAL": 1.0,
+            "HEARTBEAT_INTERVAL": 10,
+            "STALE_AFTER": 120,
+            "SHUTDOWN_TIMEOUT": 30,
+            "KEEP_FINISHED_DAYS": 14,
+        },
+    }
 }
 
 LOG_DIR = os.path.join(ROOT_DIR, "var", "logs")
@@ -229,3 +251,45 @@ IOMMI_DEFAULT_STYLE = Style(
     #     my_project_custom_js=Asset.js(attrs__src="/static/custom.js"),
     # ),
 )
+
+GLOBAL_SEARCH = {
+    "MAX_WORKERS": 4,
+    "PROVIDER_TIMEOUT": 0.8,
+    "TOTAL_TIMEOUT": 1.5,
+}
+
+NOTE_AUTOSAVE_BUFFER = {
+    "ENABLED": True,
+    "FLUSH_INTERVAL": 0.25,
+    "MAX_PENDING_BYTES": 4 * 1024 * 1024,
+    # Longest a save waits for its flush before being answered 202.
+    "ACK_TIMEOUT": 5.0,
+}
+
+NOTE_UPLOADS = {
+    "CHUNK_SIZE": 8 * 1024 * 1024,
+    "MAX_UPLOAD_SIZE": 20 * 1024**3,
+    "TEMP_DIR": "uploads/tmp",
+}
+
+NOTE_DERIVATIVES = {
+    "SIZES": {"thumb": 320, "preview": 1280},
+    "FORMAT": "WEBP",
+    "QUALITY": 80,
+    "MAX_WORKERS": 2,
+}
+
+NOTE_TEXT_INDEX = {
+    "CHUNK_CHARS": 4000,
+    "COMMIT_BYTES": 1024 * 1024,
+    "MAX_TEXT_BYTES": 64 * 1024 * 1024,
+}
+
+# Uploaded bank statements waiting for their import job; outside
+# MEDIA_ROOT so they are never served or collected by gc_media.
+FINANCE_IMPORT_DIR = os.path.join(ROOT_DIR, "var", "imports")
+
+FINANCE_RATES = {
+    # Unit code cross rates are triangulated through, None picks one.
+    "PIVOT_UNIT": None,
+}
@@ -1,7 +1,45 @@
 from django.apps import apps
 from hyperadmin.admin import hyperadmin
 
+from .models import OwningSubject, SubjectUserAccess
+from .permissions import SUBJECT_LOOKUPS, Role, SubjectScopedAdmin
+
 app = apps.get_app_config('finances')
 
+
+class OwningSubjectAdmin(SubjectScopedAdmin):
+    subject_roles = {
+        "view": Role.VIEWER,
+        "add": None,
+        "change": Role.OWNER,
+        "delete": Role.OWNER,
+    }
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if not change and not request.user.is_superuser:
+            # Whoever creates a subject owns it, or they could not see it.
+            SubjectUserAccess.objects.create(
+                user=request.user, subject=obj, role=Role.OWNER
+            )
+
+
+class SubjectUserAccessAdmin(SubjectScopedAdmin):
+    subject_roles = {
+        "view": Role.OWNER,
+        "add": Role.OWNER,
+        "change": Role.OWNER,
+        "delete": Role.OWNER,
+    }
+
+
+admin_classes = {
+    OwningSubject: OwningSubjectAdmin,
+    SubjectUserAccess: SubjectUserAccessAdmin,
+}
+
 for model_name, model in app.models.items():
-    hyperadmin.register(model)
+    if model in SUBJECT_LOOKUPS:
+        hyperadmin.register(model, admin_classes.get(model, SubjectScopedAdmin))
+    else:
+        hyperadmin.register(model)
@@ -0,0 +1,130 @@
+"""
+Fixed-point amounts. Transaction.amount_minor holds amount as an integer
+number of minor units of its unit, 10 ** -Unit.decimals each (cents for
+decimals=2). Integers are summed exactly by every database and by NumPy,
+so ledgers, cubes and reports add those and turn the result into a
+Decimal only when showing it.
+"""
+
+from decimal import Decimal
+
+from django.db import connections, router
+from django.db.models import Count, Sum
+
+# Largest amount_minor a BigIntegerField (and an int64 array) can hold.
+MAX_MINOR = 2**63 - 1
+
+
+def to_minor(amount, places):
+    """Decimal amount as an int of minor units, rounded half to even."""
+    return int(Decimal(amount).scaleb(places).to_integral_value())
+
+
+def from_minor(value, places):
+    """The Decimal amount of value minor units."""
+    return Decimal(value).scaleb(-places)
+
+
+def check_minor(amount, places, code=""):
+    """
+    amount_minor of amount, or ValueError when amount has more decimal
+    places than the unit or is too large for an integer column.
+    """
+    minor = to_minor(amount, places)
+    if from_minor(minor, places) != amount:
+        raise ValueError(f"{code or 'This unit'} allows at most {places} decimal places.")
+    if abs(minor) > MAX_MINOR:
+        raise ValueError(f"Amount {amount} is too large.")
+    return minor
+
+
+def check_places(amounts, places, code=""):
+    """ValueError when one of amounts has more than places decimal places."""
+    for amount in amounts:
+        if from_minor(to_minor(amount, places), places) != amount:
+            raise ValueError(
+                f"{code or 'This unit'} has amounts like {amount.normalize():f} "
+                f"with more than {places} decimal places."
+            )
+
+
+def unit_decimals():
+    """{unit_id: Unit.decimals}, one query."""
+    from .models import Unit
+
+    return dict(Unit.objects.values_list("id", "decimals"))
+
+
+def sum_amounts(transactions, *fields):
+    """
+    Totals of a Transaction queryset grouped by fields and unit, summed as
+    integers in SQL: [{**fields, "unit_id", "amount": Decimal,
+    "transactions": int}].
+    """
+    rows = list(
+        transactions.order_by()
+        .values(*fields, "unit_id", "unit__decimals")
+        .annotate(total=Sum("amount_minor"), count=Count("id"))
+    )
+    for row in rows:
+        row["amount"] = from_minor(row.pop("total"), row.pop("unit__decimals"))
+        row["transactions"] = row.pop("count")
+    return rows
+
+
+def totals_by_unit(transactions):
+    """{unit_id: Decimal total} of a Transaction queryset."""
+    return {row["unit_id"]: row["amount"] for row in sum_amounts(transactions)}
+
+
+def sync_amount_minor(transactions=None, batch_size=5000):
+    """
+    Recompute amount_minor where it is off, e.g. after a queryset update()
+    of amount or a change of Unit.decimals. Returns the number of rows
+    fixed; ledger and cube are not touched, rebuild them afterwards.
+    """
+    from .models import Transaction
+
+    if transactions is None:
+        transactions = Transaction.objects.all()
+    decimals = unit_decimals()
+    stale = [
+        (to_minor(amount, decimals[unit_id]), pk)
+        for pk, amount, unit_id, minor in transactions.order_by()
+        .values_list("pk", "amount", "unit_id", "amount_minor")
+        .iterator(chunk_size=batch_size)
+        if to_minor(amount, decimals[unit_id]) != minor
+    ]
+    if stale:
+        connection = connections[router.db_for_write(Transaction)]
+        opts = Transaction._meta
+        quote = connection.ops.quote_name
+        sql = "UPDATE {} SET {} = %s WHERE {} = %s".format(
+            quote(opts.db_table),
+            quote(opts.get_field("amount_minor").column),
+            quote(opts.pk.column),
+        )
+        with connection.cursor() as cursor:
+            for start in range(0, len(stale), batch_size):
+                cursor.executemany(sql, stale[start : start + batch_size])
+    return len(stale)
+
+
+def mismatched_amounts(transactions=None, batch_size=5000):
+    """
+    (pk, amount, amount_minor) of the transactions whose amount_minor is not
+    exactly their amount: stale, or rounded because amount has more decimal
+    places than its unit.
+    """
+    from .models import Transaction
+
+    if transactions is None:
+        transactions = Transaction.objects.all()
+    decimals = unit_decimals()
+    for pk, amount, unit_id, minor in (
+        transactions.order_by()
+        .values_list("pk", "amount", "unit_id", "amount_minor")
+        .iterator(chunk_size=batch_size)
+    ):
+        if from_minor(minor, decimals[unit_id]) != amount:
+            yield pk, amount, minor
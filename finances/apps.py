@@ -1,6 +1,93 @@
+import io
+import os
+import uuid
+import zoneinfo
+
 from django.apps import AppConfig
+from django.contrib import messages
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.utils.text import get_valid_filename
+from hyperadmin.hooks import register_admin_view
+
+
+def _is_text_encoding(name):
+    try:
+        # What the import wraps the upload in; rejects non-text codecs too.
+        io.TextIOWrapper(io.BytesIO(), encoding=name)
+    except LookupError:
+        return False
+    return True
+
+
+def make_import_view(admin_site):
+    def view(request):
+        """Upload a bank statement and import it with a background job."""
+        from .imports import IMPORT_FORMATS
+        from .models import AssetSource, OwningSubject
+        from .permissions import Role, subject_access
+        from .tasks import import_storage, import_transactions_task
+
+        access = subject_access(request)
+        if not request.user.has_perm("finances.add_transaction") or not access.any(
+            Role.EDITOR
+        ):
+            messages.error(request, "You may not add transactions.")
+            return redirect("admin:index")
+        subjects = access.filter(OwningSubject.objects.all(), Role.EDITOR)
+        asset_sources = access.filter(AssetSource.objects.select_related("subject"), Role.EDITOR)
+
+        if request.method == "POST" and request.FILES.get("file"):
+            subject = subjects.filter(pk=request.POST.get("subject")).first()
+            asset_source = asset_sources.filter(
+                pk=request.POST.get("asset_source") or None, subject=subject
+            ).first()
+            fmt = request.POST.get("format")
+            tz = request.POST.get("timezone") or None
+            encoding = request.POST.get("encoding") or "utf-8-sig"
+            if subject is None:
+                messages.error(request, "Pick an owning subject.")
+            elif tz and tz not in zoneinfo.available_timezones():
+                messages.error(request, f"Unknown time zone {tz!r}.")
+            elif not _is_text_encoding(encoding):
+                messages.error(request, f"Unknown text encoding {encoding!r}.")
+            else:
+                upload = request.FILES["file"]
+                name = import_storage.save(
+                    os.path.join(uuid.uuid4().hex, get_valid_filename(upload.name)), upload
+                )
+                result = import_transactions_task.enqueue(
+                    name,
+                    subject.pk,
+                    asset_source_id=asset_source.pk if asset_source else None,
+                    fmt=fmt if fmt in IMPORT_FORMATS else None,
+                    encoding=encoding,
+                    tz=tz,
+                )
+                messages.success(
+                    request, f"Importing {upload.name} in the background (job #{result.id})."
+                )
+                return redirect("admin:jobs_job_change", result.id)
+
+        preferences = getattr(request.user, "preferences", None)
+        context = dict(
+            admin_site.each_context(request),
+            title="Import transactions",
+            subjects=subjects,
+            asset_sources=asset_sources,
+            formats=IMPORT_FORMATS,
+            timezone=preferences.timezone if preferences is not None else "",
+        )
+        return TemplateResponse(request, "finance/import.html", context)
+
+    return view
 
 
 class FinancesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'finances'
+
+    def ready(self):
+        from . import signals
+
+        register_admin_view("finances/import/", make_import_view, name="finance_import")
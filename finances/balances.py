@@ -0,0 +1,371 @@
+from collections import defaultdict
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .amounts import from_minor, mismatched_amounts
+from .models import DailyBalance, Transaction
+
+# Transaction fields that decide which ledger rows a transaction touches.
+LEDGER_FIELDS = (
+    "type",
+    "amount_minor",
+    "unit_id",
+    "occurred_at",
+    "from_asset_source_id",
+    "to_asset_source_id",
+)
+
+ZERO = Decimal(0)
+
+
+def ledger_date(occurred_at):
+    """The ledger day of a timestamp, in settings.TIME_ZONE."""
+    if timezone.is_naive(occurred_at):
+        occurred_at = timezone.make_aware(occurred_at)
+    return timezone.localdate(occurred_at)
+
+
+def ledger_values(txn):
+    return {name: getattr(txn, name) for name in LEDGER_FIELDS}
+
+
+def ledger_entries(values):
+    """
+    {(asset_source_id, unit_id, date): (signed minor units, transaction
+    count)} for one transaction given as ledger_values(); money leaves
+    from_asset_source and enters to_asset_source.
+    """
+    if values is None:
+        return {}
+    day = ledger_date(values["occurred_at"])
+    amount = values["amount_minor"]
+    entries = {}
+    if values["from_asset_source_id"] is not None:
+        entries[(values["from_asset_source_id"], values["unit_id"], day)] = (-amount, 1)
+    if values["to_asset_source_id"] is not None:
+        entries[(values["to_asset_source_id"], values["unit_id"], day)] = (amount, 1)
+    return entries
+
+
+def _apply(asset_source_id, unit_id, day, amount, count):
+    rows = DailyBalance.objects.filter(asset_source_id=asset_source_id, unit_id=unit_id)
+    updated = rows.filter(date=day).update(
+        delta_minor=F("delta_minor") + amount,
+        balance_minor=F("balance_minor") + amount,
+        transactions=F("transactions") + count,
+    )
+    if not updated:
+        if count <= 0:
+            # Removing something the ledger never had: it is out of sync (see
+            # check_balances) or the asset source is being deleted with it.
+            return
+        previous = (
+            rows.filter(date__lt=day)
+            .order_by("-date")
+            .values_list("balance_minor", flat=True)
+            .first()
+        )
+        try:
+            with transaction.atomic():
+                DailyBalance.objects.create(
+                    asset_source_id=asset_source_id,
+                    unit_id=unit_id,
+                    date=day,
+                    delta_minor=amount,
+                    balance_minor=(previous or 0) + amount,
+                    transactions=count,
+                )
+        except IntegrityError:
+            # A concurrent writer created the day first.
+            return _apply(asset_source_id, unit_id, day, amount, count)
+    elif count < 0:
+        rows.filter(date=day, transactions=0).delete()
+
+    if amount:
+        rows.filter(date__gt=day).update(balance_minor=F("balance_minor") + amount)
+
+
+def record_ledger_change(old, new):
+    """
+    Move the ledger from a transaction's old ledger_values() to its new ones;
+    None stands for "does not exist". Must run in the transaction that writes
+    the Transaction row.
+
+    The day itself is one indexed update, later days of the same asset
+    source and unit are shifted by a single UPDATE.
+    """
+    changes = defaultdict(lambda: [0, 0])
+    for sign, values in ((-1, old), (1, new)):
+        for key, (amount, count) in ledger_entries(values).items():
+            changes[key][0] += sign * amount
+            changes[key][1] += sign * count
+
+    for (asset_source_id, unit_id, day), (amount, count) in sorted(changes.items()):
+        if amount or count:
+            _apply(asset_source_id, unit_id, day, amount, count)
+
+
+def apply_transactions(transactions, sign=1):
+    """
+    Record transactions written with bulk_create(), which skips save(), in
+    the same transaction. Deletes are covered by post_delete, also for
+    querysets; after a queryset update() of LEDGER_FIELDS, rebuild.
+    """
+    series = defaultdict(lambda: defaultdict(lambda: [0, 0]))
+    for txn in transactions:
+        for (asset_source_id, unit_id, day), (amount, count) in ledger_entries(
+            ledger_values(txn)
+        ).items():
+            totals = series[(asset_source_id, unit_id)][day]
+            totals[0] += sign * amount
+            totals[1] += sign * count
+    for (asset_source_id, unit_id), days in sorted(series.items()):
+        if len(days) == 1:
+            [(day, (amount, count))] = days.items()
+            _apply(asset_source_id, unit_id, day, amount, count)
+        else:
+            _merge(asset_source_id, unit_id, days)
+
+
+def _merge(asset_source_id, unit_id, days):
+    """
+    Apply many days of one asset source and unit at once: the rows from the
+    earliest day on are read, recomputed in Python and written back with
+    one executemany(), instead of one shifting UPDATE per day.
+    """
+    rows = DailyBalance.objects.filter(asset_source_id=asset_source_id, unit_id=unit_id)
+    start = min(days)
+    balance = (
+        rows.filter(date__lt=start)
+        .order_by("-date")
+        .values_list("balance_minor", flat=True)
+        .first()
+    ) or 0
+    stored = {
+        day: (pk, delta, stored_balance, count)
+        for pk, day, delta, stored_balance, count in rows.filter(date__gte=start)
+        .select_for_update()
+        .values_list("pk", "date", "delta_minor", "balance_minor", "transactions")
+    }
+
+    changed, created, emptied = [], [], []
+    for day in sorted(stored.keys() | days.keys()):
+        amount, count = days.get(day, (0, 0))
+        if day not in stored:
+            if count <= 0:
+                continue  # see _apply
+            balance += amount
+            created.append(
+                DailyBalance(
+                    asset_source_id=asset_source_id,
+                    unit_id=unit_id,
+                    date=day,
+                    delta_minor=amount,
+                    balance_minor=balance,
+                    transactions=count,
+                )
+            )
+            continue
+        pk, delta, old_balance, transactions = stored[day]
+        delta, transactions = delta + amount, transactions + count
+        if transactions <= 0:
+            emptied.append(pk)
+            continue
+        balance += delta
+        if amount or count or old_balance != balance:
+            changed.append((delta, balance, transactions, pk))
+
+    if emptied:
+        DailyBalance.objects.filter(pk__in=emptied).delete()
+    if changed:
+        _update_rows(changed)
+    DailyBalance.objects.bulk_create(created, batch_size=1000)
+
+
+def _update_rows(values):
+    """UPDATE (delta_minor, balance_minor, transactions) by pk for many rows at once."""
+    connection = connections[router.db_for_write(DailyBalance)]
+    opts = DailyBalance._meta
+    fields = [
+        opts.get_field(name) for name in ("delta_minor", "balance_minor", "transactions")
+    ]
+    quote = connection.ops.quote_name
+    sql = "UPDATE {} SET {} WHERE {} = %s".format(
+        quote(opts.db_table),
+        ", ".join(f"{quote(field.column)} = %s" for field in fields),
+        quote(opts.pk.column),
+    )
+    params = [
+        [field.get_db_prep_save(value, connection) for field, value in zip(fields, row)]
+        + [pk]
+        for *row, pk in values
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def balance_as_of(asset_source, day, unit=None):
+    """
+    Closing balance of asset_source on day, in unit (default: the asset
+    source's own). One index seek on (asset_source, unit, date).
+    """
+    unit_id = getattr(unit, "pk", unit) or asset_source.unit_id
+    row = (
+        DailyBalance.objects.filter(asset_source=asset_source, unit_id=unit_id, date__lte=day)
+        .order_by("-date")
+        .values_list("balance_minor", "unit__decimals")
+        .first()
+    )
+    return ZERO if row is None else from_minor(*row)
+
+
+def balances_as_of(asset_source, day):
+    """{unit_id: balance} over every unit asset_source has ever held."""
+    unit_ids = (
+        DailyBalance.objects.filter(asset_source=asset_source)
+        .values_list("unit_id", flat=True)
+        .distinct()
+    )
+    return {unit_id: balance_as_of(asset_source, day, unit_id) for unit_id in unit_ids}
+
+
+def balance_history(asset_source, start, end, unit=None):
+    """
+    [(date, closing balance)] from start to end: the opening point on start,
+    then one point per day with transactions. Balances between two points
+    stay at the earlier one.
+    """
+    unit_id = getattr(unit, "pk", unit) or asset_source.unit_id
+    rows = list(
+        DailyBalance.objects.filter(
+            asset_source=asset_source, unit_id=unit_id, date__range=(start, end)
+        )
+        .order_by("date")
+        .values_list("date", "balance_minor", "unit__decimals")
+    )
+    rows = [(date, from_minor(balance, places)) for date, balance, places in rows]
+    if not rows or rows[0][0] != start:
+        rows.insert(0, (start, balance_as_of(asset_source, start, unit_id)))
+    return rows
+
+
+def _transactions_touching(asset_source_ids):
+    transactions = Transaction.objects.all()
+    if asset_source_ids is not None:
+        transactions = transactions.filter(
+            Q(from_asset_source__in=asset_source_ids)
+            | Q(to_asset_source__in=asset_source_ids)
+        )
+    return transactions
+
+
+def iter_daily_balances(rows, asset_source_ids=None):
+    """
+    (asset_source_id, unit_id, date, delta, balance, transactions) from
+    ledger_values() dicts, summed as integer minor units and ordered by
+    asset source, unit and date.
+    """
+    days = defaultdict(lambda: [0, 0])
+    for row in rows:
+        for key, (amount, count) in ledger_entries(row).items():
+            if asset_source_ids is None or key[0] in asset_source_ids:
+                days[key][0] += amount
+                days[key][1] += count
+
+    balance, previous = 0, None
+    for (asset_source_id, unit_id, day), (amount, count) in sorted(days.items()):
+        if (asset_source_id, unit_id) != previous:
+            balance, previous = 0, (asset_source_id, unit_id)
+        balance += amount
+        yield asset_source_id, unit_id, day, amount, balance, count
+
+
+def compute_daily_balances(asset_source_ids=None):
+    """The ledger as it should be: unsaved DailyBalance rows."""
+    values = _transactions_touching(asset_source_ids).values(*LEDGER_FIELDS)
+    for asset_source_id, unit_id, day, delta, balance, count in iter_daily_balances(
+        values.iterator(chunk_size=5000), asset_source_ids
+    ):
+        yield DailyBalance(
+            asset_source_id=asset_source_id,
+            unit_id=unit_id,
+            date=day,
+            delta_minor=delta,
+            balance_minor=balance,
+            transactions=count,
+        )
+
+
+def _ledger_rows(asset_source_ids):
+    rows = DailyBalance.objects.all()
+    if asset_source_ids is not None:
+        rows = rows.filter(asset_source__in=asset_source_ids)
+    return rows
+
+
+def rebuild_balances(asset_source_ids=None, batch_size=1000):
+    """Replace the ledger (of some asset sources) with recomputed rows."""
+    with transaction.atomic():
+        _ledger_rows(asset_source_ids).delete()
+        rows = DailyBalance.objects.bulk_create(
+            compute_daily_balances(asset_source_ids), batch_size=batch_size
+        )
+    return len(rows)
+
+
+@dataclass
+class LedgerReport:
+    checked: int = 0
+    mismatched: int = 0
+    asset_source_ids: set = field(default_factory=set)
+    # (asset_source_id, unit_id, date, expected, stored), both as
+    # (delta_minor, balance_minor, transactions) or None for a missing row.
+    mismatches: list = field(default_factory=list)
+    # Transactions whose amount_minor is not their amount, and the first
+    # of them as (transaction id, amount, amount_minor).
+    transaction_ids: set = field(default_factory=set)
+    amount_mismatches: list = field(default_factory=list)
+
+
+def check_balances(asset_source_ids=None, report_limit=1000):
+    """
+    Compare the stored ledger with compute_daily_balances(), and the
+    transactions' amount_minor with their amount.
+    """
+    stored = {
+        (row[0], row[1], row[2]): row[3:]
+        for row in _ledger_rows(asset_source_ids)
+        .values_list(
+            "asset_source_id", "unit_id", "date", "delta_minor", "balance_minor", "transactions"
+        )
+        .iterator(chunk_size=5000)
+    }
+    report = LedgerReport()
+
+    def mismatch(key, expected, actual):
+        report.mismatched += 1
+        report.asset_source_ids.add(key[0])
+        if len(report.mismatches) < report_limit:
+            report.mismatches.append((*key, expected, actual))
+
+    for row in compute_daily_balances(asset_source_ids):
+        key = (row.asset_source_id, row.unit_id, row.date)
+        expected = (row.delta_minor, row.balance_minor, row.transactions)
+        actual = stored.pop(key, None)
+        report.checked += 1
+        if actual is None or tuple(actual) != expected:
+            mismatch(key, expected, actual)
+    for key, actual in sorted(stored.items()):
+        report.checked += 1
+        mismatch(key, None, actual)
+
+    for row in mismatched_amounts(_transactions_touching(asset_source_ids)):
+        report.transaction_ids.add(row[0])
+        if len(report.amount_mismatches) < report_limit:
+            report.amount_mismatches.append(row)
+    return report
+
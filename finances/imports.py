@@ -0,0 +1,633 @@
+import csv
+import datetime
+import hashlib
+import html
+import io
+import itertools
+import os
+import re
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .amounts import check_minor
+from .balances import apply_transactions
+from .models import AssetSource, Project, Transaction, Unit
+from .rollups import apply_rollups
+
+IMPORT_FORMATS = ("csv", "ofx", "mt940")
+IMPORT_BATCH_SIZE = 1000
+READ_SIZE = 64 * 1024
+
+_FORMAT_EXTENSIONS = {
+    ".csv": "csv",
+    ".ofx": "ofx",
+    ".qfx": "ofx",
+    ".sta": "mt940",
+    ".mt940": "mt940",
+}
+
+
+class ImportRowError(ValueError):
+    pass
+
+
+@dataclass
+class ImportRow:
+    """
+    One statement entry before resolution. Without type, the sign of
+    amount decides between INCOME to and EXPENSE from the account.
+    position is the line number, or the entry number for OFX.
+    """
+
+    position: int
+    occurred_at: datetime.datetime | None = None
+    amount: Decimal | None = None
+    unit: str | None = None
+    title: str = ""
+    description: str = ""
+    type: str | None = None
+    category: str | None = None
+    project: str | None = None
+    from_asset_source: str | None = None
+    to_asset_source: str | None = None
+    account: str | None = None
+    reference: str | None = None
+    error: str = ""
+
+
+@dataclass
+class ImportReport:
+    rows: int = 0
+    created: int = 0
+    duplicates: int = 0
+    failed: int = 0
+    # (position, message), the first report_limit of them.
+    errors: list = field(default_factory=list)
+    report_limit: int = 1000
+
+    def error(self, position, message):
+        self.failed += 1
+        if len(self.errors) < self.report_limit:
+            self.errors.append((position, message))
+
+    def summary(self):
+        return {
+            "rows": self.rows,
+            "created": self.created,
+            "duplicates": self.duplicates,
+            "failed": self.failed,
+            "errors": [list(error) for error in self.errors[:100]],
+        }
+
+
+# ---------------------------------------------------------------------
+#  Values
+# ---------------------------------------------------------------------
+
+
+def parse_amount(value):
+    """Decimal of "1234.5", "-1 234,50", "1,234.50" or "1.234,50"."""
+    text = re.sub(r"[\s\u00a0']", "", str(value))
+    if "," in text and "." in text:
+        thousands = "," if text.rfind(",") < text.rfind(".") else "."
+        text = text.replace(thousands, "")
+    text = text.replace(",", ".")
+    try:
+        amount = Decimal(text)
+    except InvalidOperation:
+        raise ImportRowError(f"Invalid amount {value!r}.") from None
+    if not amount.is_finite():
+        raise ImportRowError(f"Invalid amount {value!r}.")
+    return amount
+
+
+_DATE_FORMATS = ("%Y-%m-%d", "%d.%m.%Y", "%d/%m/%Y", "%Y/%m/%d", "%Y%m%d")
+
+
+def parse_datetime(value, tz=None):
+    """Aware datetime of an ISO timestamp or a date; naive values are in tz."""
+    text = str(value).strip()
+    try:
+        moment = datetime.datetime.fromisoformat(text)
+    except ValueError:
+        for date_format in _DATE_FORMATS:
+            try:
+                moment = datetime.datetime.strptime(text, date_format)
+                break
+            except ValueError:
+                continue
+        else:
+            raise ImportRowError(f"Invalid date {value!r}.") from None
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment, tz)
+    return moment
+
+
+def _clean_text(value):
+    return re.sub(r"\s+", " ", html.unescape(value or "")).strip()
+
+
+# ---------------------------------------------------------------------
+#  Parsers: text stream -> ImportRow
+# ---------------------------------------------------------------------
+
+_CSV_ALIASES = {
+    "date": "occurred_at",
+    "booking_date": "occurred_at",
+    "currency": "unit",
+    "name": "title",
+    "memo": "description",
+    "asset_source": "account",
+}
+_CSV_FIELDS = {
+    "occurred_at",
+    "amount",
+    "unit",
+    "title",
+    "description",
+    "type",
+    "category",
+    "project",
+    "from_asset_source",
+    "to_asset_source",
+    "account",
+    "reference",
+}
+
+
+def _csv_column(header):
+    name = re.sub(r"\W+", "_", header.strip().lower()).strip("_")
+    return _CSV_ALIASES.get(name, name)
+
+
+def parse_csv(stream, tz=None):
+    """
+    Rows of a CSV file with a header. Columns are Transaction's own
+    (occurred_at, type, amount, unit, title, description, category,
+    project, from_asset_source, to_asset_source) plus account and
+    reference; asset sources are given by name or external id. The
+    delimiter (, ; or tab) is taken from the header line.
+    """
+    header = stream.readline()
+    if not header.strip():
+        return
+    try:
+        dialect = csv.Sniffer().sniff(header, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.reader(itertools.chain([header], stream), dialect)
+    columns = [_csv_column(column) for column in next(reader)]
+    if "occurred_at" not in columns or "amount" not in columns:
+        raise ImportRowError("A CSV import needs occurred_at (or date) and amount columns.")
+
+    for values in reader:
+        position = reader.line_num
+        if not any(value.strip() for value in values):
+            continue
+        data = {
+            column: value.strip()
+            for column, value in zip(columns, values)
+            if column in _CSV_FIELDS and value.strip()
+        }
+        try:
+            yield ImportRow(
+                position=position,
+                occurred_at=parse_datetime(data.pop("occurred_at", ""), tz),
+                amount=parse_amount(data.pop("amount", "")),
+                type=data.pop("type", "").upper() or None,
+                **data,
+            )
+        except ImportRowError as exc:
+            yield ImportRow(position=position, error=str(exc))
+
+
+_OFX_TOKEN_RE = re.compile(r"<(/?)([A-Za-z0-9._]+)>([^<]*)")
+_OFX_DATE_RE = re.compile(
+    r"^(\d{8})(\d{6})?(?:\.\d+)?(?:\[([+-]?\d+(?:\.\d+)?)(?::[^\]]*)?\])?"
+)
+
+
+def _ofx_tokens(stream):
+    buffer = ""
+    while True:
+        chunk = stream.read(READ_SIZE)
+        buffer += chunk
+        # Keep the last, possibly incomplete, tag for the next round.
+        cut = len(buffer) if not chunk else buffer.rfind("<")
+        for match in _OFX_TOKEN_RE.finditer(buffer, 0, max(cut, 0)):
+            yield match.group(1) == "/", match.group(2).upper(), match.group(3)
+        if not chunk:
+            return
+        buffer = buffer[max(cut, 0):]
+
+
+def parse_ofx_datetime(value, tz=None):
+    match = _OFX_DATE_RE.match(value.strip())
+    if match is None:
+        raise ImportRowError(f"Invalid OFX date {value!r}.")
+    day = datetime.datetime.strptime(match.group(1), "%Y%m%d")
+    if match.group(2) is None:
+        # A bare date is the bank's local day.
+        return timezone.make_aware(day, tz)
+    moment = datetime.datetime.strptime(match.group(1) + match.group(2), "%Y%m%d%H%M%S")
+    # Times without an offset are GMT by the OFX spec.
+    offset = datetime.timedelta(hours=float(match.group(3) or 0))
+    return moment.replace(tzinfo=datetime.timezone(offset))
+
+
+def parse_ofx(stream, tz=None):
+    """STMTTRN entries of an OFX 1.x (SGML) or 2.x (XML) file."""
+    currency = account = None
+    entry = None
+    number = 0
+    for closing, tag, text in _ofx_tokens(stream):
+        text = text.strip()
+        if tag == "STMTTRN":
+            if not closing:
+                entry = {}
+                number += 1
+                continue
+            if entry is None:
+                continue
+            data, entry = entry, None
+            try:
+                title = _clean_text(data.get("NAME") or data.get("PAYEE") or data.get("MEMO"))
+                yield ImportRow(
+                    position=number,
+                    occurred_at=parse_ofx_datetime(data.get("DTPOSTED", ""), tz),
+                    amount=parse_amount(data.get("TRNAMT", "")),
+                    unit=data.get("CURRENCY") or currency,
+                    title=title or data.get("TRNTYPE", "").title(),
+                    description=_clean_text(data.get("MEMO")),
+                    account=account,
+                    reference=data.get("FITID") or None,
+                )
+            except ImportRowError as exc:
+                yield ImportRow(position=number, error=str(exc))
+        elif closing:
+            continue
+        elif entry is not None:
+            if text and tag not in entry:
+                entry[tag] = text
+        elif tag == "CURDEF":
+            currency = text
+        elif tag == "ACCTID":
+            account = text
+
+
+_MT940_TAG_RE = re.compile(r"^:(\d{2}[A-Z]?):(.*)$")
+_MT940_LINE_RE = re.compile(
+    r"^(\d{6})(\d{4})?(RC|RD|C|D)([A-Z])?(\d+,\d*)(\w{4})?([^/]*)(?://(.*))?$"
+)
+_MT940_BALANCE_RE = re.compile(r"^[CD]\d{6}([A-Z]{3})")
+_MT940_SUBFIELD_RE = re.compile(r"[~?](\d{2})")
+# Structured :86: subfields holding the payment title.
+_MT940_TITLE_FIELDS = {str(number) for number in range(20, 30)}
+
+
+def _mt940_information(text):
+    parts = _MT940_SUBFIELD_RE.split(text)
+    if len(parts) < 3:
+        return _clean_text(text)
+    subfields = zip(parts[1::2], parts[2::2])
+    title = "".join(value for number, value in subfields if number in _MT940_TITLE_FIELDS)
+    return _clean_text(title or text)
+
+
+def parse_mt940(stream, tz=None):
+    """:61: statement lines of an MT940 file, titled by the following :86:."""
+    currency = account = None
+    pending = None  # (position, :61: value, :86: lines)
+    tag = None
+
+    def flush():
+        position, line, information = pending
+        match = _MT940_LINE_RE.match(line.replace(" ", ""))
+        if match is None:
+            return ImportRow(position=position, error=f"Invalid :61: line {line!r}.")
+        value_date, _, mark, _, amount, _, customer_reference, bank_reference = (
+            match.groups()
+        )
+        try:
+            amount = parse_amount(amount)
+            day = datetime.datetime.strptime(value_date, "%y%m%d")
+        except (ImportRowError, ValueError) as exc:
+            return ImportRow(position=position, error=str(exc))
+        # Debits and reversed credits take money out of the account.
+        if mark in ("D", "RC"):
+            amount = -amount
+        text = " ".join(information)
+        reference = bank_reference or customer_reference
+        return ImportRow(
+            position=position,
+            occurred_at=timezone.make_aware(day, tz),
+            amount=amount,
+            unit=currency,
+            title=_mt940_information(text)[:200],
+            description=_clean_text(text),
+            account=account,
+            reference=None if not reference or reference == "NONREF" else reference,
+        )
+
+    for position, line in enumerate(stream, start=1):
+        line = line.rstrip("\r\n")
+        match = _MT940_TAG_RE.match(line)
+        if match is None:
+            if line.startswith("-"):
+                tag = None  # end of a message
+            elif tag == "86" and pending is not None:
+                pending[2].append(line)
+            continue
+
+        tag, value = match.groups()
+        if tag == "86" and pending is not None:
+            pending[2].append(value)
+            continue
+        if pending is not None:
+            yield flush()
+            pending = None
+        if tag == "25":
+            account = value.strip().lstrip("/")
+        elif tag in ("60F", "60M"):
+            balance = _MT940_BALANCE_RE.match(value)
+            if balance:
+                currency = balance.group(1)
+        elif tag == "61":
+            pending = (position, value, [])
+    if pending is not None:
+        yield flush()
+
+
+PARSERS = {"csv": parse_csv, "ofx": parse_ofx, "mt940": parse_mt940}
+
+
+def detect_format(fileobj, name=""):
+    """Guess the format of a seekable binary file from its name and first bytes."""
+    extension = os.path.splitext(name)[1].lower()
+    if extension in _FORMAT_EXTENSIONS:
+        return _FORMAT_EXTENSIONS[extension]
+    head = fileobj.read(1024).lstrip(b"\xef\xbb\xbf \r\n\t")
+    fileobj.seek(0)
+    if head.startswith((b"OFXHEADER", b"<?xml", b"<OFX")) or b"<OFX>" in head:
+        return "ofx"
+    if head.startswith((b":20:", b"{1:", b":940:")) or b"\n:20:" in head:
+        return "mt940"
+    return "csv"
+
+
+# ---------------------------------------------------------------------
+#  Import
+# ---------------------------------------------------------------------
+
+
+def _lookup_key(value):
+    return re.sub(r"\s+", "", str(value)).casefold()
+
+
+class TransactionImporter:
+    """
+    Resolves ImportRows of one subject into Transactions and inserts them
+    with bulk_create in batches, each batch in its own savepoint together
+    with its balance ledger and rollup cube updates.
+
+    Units, asset sources, projects and categories are looked up in maps
+    loaded once. The from/to rules of transaction_from_to_by_type are
+    checked before insert, so a bad row is reported instead of failing
+    its batch. Every row gets an import_hash; rows whose hash the subject
+    already has are skipped, so importing a file twice is harmless.
+    """
+
+    def __init__(self, subject, asset_source=None, batch_size=IMPORT_BATCH_SIZE, dry_run=False):
+        self.subject = subject
+        self.asset_source = asset_source
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.report = ImportReport()
+
+        self.units = {}
+        self.unit_decimals = {}
+        for unit_id, code, places in Unit.objects.values_list("id", "code", "decimals"):
+            self.units[code.upper()] = unit_id
+            self.unit_decimals[unit_id] = places
+        self.asset_sources = {}
+        for source in AssetSource.objects.filter(subject=subject).select_related("unit"):
+            self.asset_sources[str(source.pk)] = source
+            self.asset_sources[_lookup_key(source.name)] = source
+            if source.external_id:
+                self.asset_sources[_lookup_key(source.external_id)] = source
+        self.projects = {}
+        for project_id, name in Project.objects.filter(subject=subject).values_list("id", "name"):
+            self.projects[str(project_id)] = project_id
+            self.projects[_lookup_key(name)] = project_id
+        self.categories = {}
+        for value, label in Transaction.Category.choices:
+            self.categories[_lookup_key(value)] = value
+            self.categories[_lookup_key(label)] = value
+        # Occurrences of equal rows, so that two identical card payments on
+        # one day stay two transactions and still dedupe on re-import.
+        self._occurrences = {}
+
+    def _source(self, reference, what):
+        if not reference:
+            return None
+        source = self.asset_sources.get(_lookup_key(reference))
+        if source is None:
+            raise ImportRowError(f"Unknown {what} {reference!r}.")
+        return source
+
+    def resolve(self, row):
+        """The unsaved Transaction for an ImportRow, or ImportRowError."""
+        if row.error:
+            raise ImportRowError(row.error)
+        account = self._source(row.account, "account") or self.asset_source
+        from_source = self._source(row.from_asset_source, "from_asset_source")
+        to_source = self._source(row.to_asset_source, "to_asset_source")
+        amount = row.amount
+
+        if row.type is None:
+            if account is None:
+                raise ImportRowError("No account to book the entry on.")
+            if amount > 0:
+                kind, to_source = Transaction.Type.INCOME, account
+            elif amount < 0:
+                kind, from_source = Transaction.Type.EXPENSE, account
+            else:
+                raise ImportRowError("Amount is zero.")
+        else:
+            if row.type not in Transaction.Type.values:
+                raise ImportRowError(f"Unknown type {row.type!r}.")
+            kind = row.type
+            if kind == Transaction.Type.INCOME:
+                to_source = to_source or account
+            elif kind == Transaction.Type.EXPENSE:
+                from_source = from_source or account
+        amount = abs(amount)
+
+        if kind == Transaction.Type.INCOME and (to_source is None or from_source is not None):
+            raise ImportRowError("INCOME needs to_asset_source and no from_asset_source.")
+        if kind == Transaction.Type.EXPENSE and (from_source is None or to_source is not None):
+            raise ImportRowError("EXPENSE needs from_asset_source and no to_asset_source.")
+        if kind == Transaction.Type.TRANSFER:
+            if from_source is None or to_source is None:
+                raise ImportRowError("TRANSFER needs both asset sources.")
+            if from_source == to_source:
+                raise ImportRowError("TRANSFER needs two different asset sources.")
+        if amount != amount.quantize(Decimal("1e-8")) or amount.adjusted() >= 12:
+            raise ImportRowError(f"Amount {row.amount} does not fit the amount column.")
+
+        unit_code = row.unit or (account or from_source or to_source).unit.code
+        unit_id = self.units.get(unit_code.upper())
+        if unit_id is None:
+            raise ImportRowError(f"Unknown unit {unit_code!r}.")
+        try:
+            amount_minor = check_minor(amount, self.unit_decimals[unit_id], unit_code)
+        except ValueError as exc:
+            raise ImportRowError(f"Amount {row.amount}: {exc}") from None
+        project_id = None
+        if row.project:
+            project_id = self.projects.get(_lookup_key(row.project))
+            if project_id is None:
+                raise ImportRowError(f"Unknown project {row.project!r}.")
+        category = Transaction.Category.OTHER
+        if row.category:
+            category = self.categories.get(_lookup_key(row.category))
+            if category is None:
+                raise ImportRowError(f"Unknown category {row.category!r}.")
+
+        txn = Transaction(
+            subject=self.subject,
+            title=(row.title or row.description or kind.title())[:200],
+            description=row.description if row.description != row.title else "",
+            type=kind,
+            amount=amount,
+            amount_minor=amount_minor,
+            unit_id=unit_id,
+            occurred_at=row.occurred_at,
+            category=category,
+            project_id=project_id,
+            from_asset_source=from_source,
+            to_asset_source=to_source,
+        )
+        txn.import_hash = self.import_hash(txn, row.reference)
+        return txn
+
+    def import_hash(self, txn, reference=None):
+        content = "\x1f".join(
+            str(part)
+            for part in (
+                txn.subject_id,
+                txn.type,
+                txn.from_asset_source_id,
+                txn.to_asset_source_id,
+                txn.occurred_at.astimezone(datetime.UTC).isoformat(),
+                txn.amount.normalize(),
+                txn.unit_id,
+                reference or txn.title,
+            )
+        )
+        base = hashlib.sha256(content.encode()).digest()
+        occurrence = self._occurrences.get(base, 0) + 1
+        self._occurrences[base] = occurrence
+        return hashlib.sha256(base + occurrence.to_bytes(4, "big")).hexdigest()
+
+    def _insert(self, batch):
+        """[(position, Transaction)] -> number inserted."""
+        hashes = [txn.import_hash for _, txn in batch]
+        # Unordered, so that the (subject, import_hash) index is used.
+        existing = set(
+            Transaction.objects.filter(subject=self.subject, import_hash__in=hashes)
+            .order_by()
+            .values_list("import_hash", flat=True)
+        )
+        fresh = [(position, txn) for position, txn in batch if txn.import_hash not in existing]
+        self.report.duplicates += len(batch) - len(fresh)
+        if not fresh or self.dry_run:
+            return 0
+        try:
+            with transaction.atomic():
+                created = Transaction.objects.bulk_create([txn for _, txn in fresh])
+                apply_transactions(created)
+                apply_rollups(created)
+            return len(created)
+        except IntegrityError:
+            pass
+
+        # Something in the batch broke a constraint (or another import won a
+        # race for a hash): insert row by row to pin it down.
+        inserted = 0
+        for position, txn in fresh:
+            try:
+                with transaction.atomic():
+                    txn.pk = None
+                    txn._state.adding = True
+                    Transaction.objects.bulk_create([txn])
+                    apply_transactions([txn])
+                    apply_rollups([txn])
+                inserted += 1
+            except IntegrityError as exc:
+                if Transaction.objects.filter(
+                    subject=self.subject, import_hash=txn.import_hash
+                ).exists():
+                    self.report.duplicates += 1
+                else:
+                    self.report.error(position, str(exc))
+        return inserted
+
+    def run(self, rows, on_batch=None):
+        """Import an iterable of ImportRows and return the ImportReport."""
+        batch = []
+        for row in rows:
+            self.report.rows += 1
+            try:
+                batch.append((row.position, self.resolve(row)))
+            except ImportRowError as exc:
+                self.report.error(row.position, str(exc))
+            if len(batch) >= self.batch_size:
+                self.report.created += self._insert(batch)
+                batch = []
+                if on_batch is not None:
+                    on_batch(self.report)
+        if batch:
+            self.report.created += self._insert(batch)
+        if on_batch is not None:
+            on_batch(self.report)
+        return self.report
+
+
+def import_transactions(
+    fileobj,
+    subject,
+    *,
+    fmt=None,
+    name="",
+    asset_source=None,
+    encoding="utf-8-sig",
+    tz=None,
+    batch_size=IMPORT_BATCH_SIZE,
+    dry_run=False,
+    on_batch=None,
+):
+    """
+    Import a CSV, OFX or MT940 statement from a binary file object.
+    The file is decoded and parsed as a stream, never read as a whole.
+    Dates without a time zone are taken in tz (default: the current one).
+    """
+    fmt = fmt or detect_format(fileobj, name)
+    if fmt not in PARSERS:
+        raise ValueError(f"Unknown import format {fmt!r}")
+    stream = io.TextIOWrapper(fileobj, encoding=encoding, errors="replace", newline="")
+    importer = TransactionImporter(
+        subject, asset_source=asset_source, batch_size=batch_size, dry_run=dry_run
+    )
+    try:
+        rows = PARSERS[fmt](stream, tz)
+        return importer.run(rows, on_batch=on_batch)
+    except ImportRowError as exc:
+        # The file as a whole is unreadable, e.g. a CSV without the needed columns.
+        importer.report.error(0, str(exc))
+        return importer.report
+    finally:
+        stream.detach()
@@ -0,0 +1,253 @@
+import datetime
+import heapq
+import itertools
+from collections import defaultdict
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from django.core import signing
+from django.db.models import Q
+from django.utils import timezone
+
+from .amounts import from_minor, totals_by_unit
+from .balances import balance_as_of, ledger_date
+from .models import Transaction
+
+TRANSACTION_PAGE_SIZE = 50
+CURSOR_SALT = "finances.listing.cursor"
+
+ZERO = Decimal(0)
+
+
+@dataclass
+class Cursor:
+    """
+    Keyset position in the (-occurred_at, -id) ordering: the boundary row,
+    the direction to read from it and the running totals at the boundary,
+    so no page ever needs the rows before it.
+    """
+
+    occurred_at: datetime.datetime
+    id: int
+    backwards: bool = False
+    page: int = 1  # number of the page this cursor leads to
+    totals: dict = field(default_factory=dict)  # {unit_id: Decimal}
+
+    def dumps(self):
+        return signing.dumps(
+            {
+                "at": self.occurred_at.isoformat(),
+                "id": self.id,
+                "back": self.backwards,
+                "page": self.page,
+                "totals": {
+                    str(unit_id): str(total) for unit_id, total in self.totals.items()
+                },
+            },
+            salt=CURSOR_SALT,
+            compress=True,
+        )
+
+    @classmethod
+    def loads(cls, value):
+        """The cursor of dumps(), None for a missing or tampered one."""
+        if not value:
+            return None
+        try:
+            data = signing.loads(value, salt=CURSOR_SALT)
+            return cls(
+                occurred_at=datetime.datetime.fromisoformat(data["at"]),
+                id=int(data["id"]),
+                backwards=bool(data["back"]),
+                page=max(int(data["page"]), 1),
+                totals={
+                    int(unit_id): Decimal(total) for unit_id, total in data["totals"].items()
+                },
+            )
+        except (signing.BadSignature, KeyError, TypeError, ValueError, ArithmeticError):
+            return None
+
+    def after(self):
+        """Q of the rows past the boundary in the reading direction."""
+        if self.backwards:
+            return Q(occurred_at__gte=self.occurred_at) & (
+                Q(occurred_at__gt=self.occurred_at) | Q(id__gt=self.id)
+            )
+        # The plain range on occurred_at is what the index scan starts from.
+        return Q(occurred_at__lte=self.occurred_at) & (
+            Q(occurred_at__lt=self.occurred_at) | Q(id__lt=self.id)
+        )
+
+
+@dataclass
+class TransactionPage:
+    transactions: list  # each with .running_total in its unit
+    number: int
+    next_cursor: Cursor | None
+    previous_cursor: Cursor | None
+    # Running totals are closing balances of the asset source (from the
+    # daily ledger) rather than sums of the listed rows.
+    balances: bool = False
+
+
+def transaction_querysets(
+    subject_ids=None,
+    asset_source=None,
+    category=None,
+    project=None,
+    start=None,
+    end=None,
+):
+    """
+    Querysets whose merged (-occurred_at, -id) order is the filtered list.
+
+    Each one is a single index range scan: a subject__in over several
+    subjects would have to sort all of their rows for every page, so there
+    is one queryset per subject, and two (outgoing, incoming) for an asset
+    source. subject_ids None means all subjects.
+    """
+    transactions = Transaction.objects.select_related("unit", "subject", "project")
+    if category:
+        transactions = transactions.filter(category=category)
+    if project is not None:
+        transactions = transactions.filter(project=project)
+    if start is not None:
+        transactions = transactions.filter(occurred_at__gte=start)
+    if end is not None:
+        transactions = transactions.filter(occurred_at__lt=end)
+
+    if asset_source is not None:
+        if subject_ids is not None:
+            transactions = transactions.filter(subject__in=subject_ids)
+        return [
+            transactions.filter(from_asset_source=asset_source),
+            transactions.filter(to_asset_source=asset_source),
+        ]
+    if subject_ids is None:
+        return [transactions]
+    return [transactions.filter(subject=subject_id) for subject_id in subject_ids]
+
+
+def _order_key(txn):
+    return txn.occurred_at, txn.pk
+
+
+def _fetch(querysets, cursor, limit):
+    backwards = cursor is not None and cursor.backwards
+    ordering = ("occurred_at", "id") if backwards else ("-occurred_at", "-id")
+    parts = []
+    for transactions in querysets:
+        if cursor is not None:
+            transactions = transactions.filter(cursor.after())
+        parts.append(list(transactions.order_by(*ordering)[:limit]))
+    merged = heapq.merge(*parts, key=_order_key, reverse=not backwards)
+    return list(itertools.islice(merged, limit))
+
+
+def signed_amount(txn, asset_source_id=None):
+    """
+    What txn adds to a running total: of asset_source_id when given,
+    otherwise income minus expenses (transfers add nothing). Taken from
+    amount_minor, like the ledger.
+    """
+    amount = from_minor(txn.amount_minor, txn.unit.decimals)
+    if asset_source_id is not None:
+        if txn.to_asset_source_id == asset_source_id:
+            return amount
+        return -amount
+    if txn.type == Transaction.Type.INCOME:
+        return amount
+    if txn.type == Transaction.Type.EXPENSE:
+        return -amount
+    return ZERO
+
+
+def _balances_after(asset_source_id, txn, unit_ids):
+    """
+    {unit_id: balance of the asset source right after txn}: the ledger's
+    closing balance of txn's day, less what came after txn that same day.
+    """
+    day = ledger_date(txn.occurred_at)
+    day_end = datetime.datetime.combine(
+        day + datetime.timedelta(days=1),
+        datetime.time(),
+        tzinfo=timezone.get_default_timezone(),
+    )
+    later = Cursor(txn.occurred_at, txn.pk, backwards=True).after() & Q(
+        occurred_at__lt=day_end
+    )
+    later = Transaction.objects.filter(later, unit_id__in=unit_ids)
+    incoming = totals_by_unit(later.filter(to_asset_source=asset_source_id))
+    outgoing = totals_by_unit(later.filter(from_asset_source=asset_source_id))
+    return {
+        unit_id: balance_as_of(asset_source_id, day, unit_id)
+        - incoming.get(unit_id, ZERO)
+        + outgoing.get(unit_id, ZERO)
+        for unit_id in unit_ids
+    }
+
+
+def transaction_page(
+    querysets, cursor=None, size=TRANSACTION_PAGE_SIZE, asset_source=None, balances=False
+):
+    """
+    One page of transaction_querysets(), at most size rows after cursor
+    (the first page without one). Reads size + 1 rows per queryset and
+    never counts: whether there is a next page is whether the extra row
+    came back.
+
+    Every row gets .running_total, per unit: with balances and an asset
+    source, its balance after the row; otherwise the total of all rows
+    from the top of the list down to it, carried over in the cursors.
+    """
+    asset_source_id = getattr(asset_source, "pk", asset_source)
+    backwards = cursor is not None and cursor.backwards
+    rows = _fetch(querysets, cursor, size + 1)
+    more = len(rows) > size
+    rows = rows[:size]
+    if backwards:
+        rows.reverse()
+    number = cursor.page if cursor is not None else 1
+
+    if backwards:
+        # The cursor holds the totals after this page.
+        totals = defaultdict(lambda: ZERO, cursor.totals)
+        for txn in rows:
+            totals[txn.unit_id] -= signed_amount(txn, asset_source_id)
+    else:
+        totals = defaultdict(lambda: ZERO, cursor.totals if cursor is not None else {})
+    start_totals = dict(totals)
+
+    if balances and asset_source_id is not None and rows:
+        running = _balances_after(asset_source_id, rows[0], {txn.unit_id for txn in rows})
+        for txn in rows:
+            txn.running_total = running[txn.unit_id]
+            running[txn.unit_id] -= signed_amount(txn, asset_source_id)
+    for txn in rows:
+        totals[txn.unit_id] += signed_amount(txn, asset_source_id)
+        if not balances or asset_source_id is None:
+            txn.running_total = totals[txn.unit_id]
+
+    has_next = more if not backwards else bool(rows)
+    has_previous = more if backwards else cursor is not None
+    return TransactionPage(
+        transactions=rows,
+        number=number,
+        next_cursor=(
+            Cursor(rows[-1].occurred_at, rows[-1].pk, page=number + 1, totals=dict(totals))
+            if has_next and rows
+            else None
+        ),
+        previous_cursor=(
+            Cursor(
+                rows[0].occurred_at,
+                rows[0].pk,
+                backwards=True,
+                page=max(number - 1, 1),
+                totals=start_totals,
+            )
+            if has_previous and rows
+            else None
+        ),
+        balances=balances and asset_source_id is not None,
+    )
@@ -0,0 +1,81 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from finances.amounts import mismatched_amounts, sync_amount_minor
+from finances.balances import check_balances, rebuild_balances
+from finances.models import Transaction
+from finances.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the daily balance ledger with the transactions, and the "
+        "transactions' amount_minor with their amount, and report rows that "
+        "differ."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            help=(
+                "Recompute stale amount_minor values and rebuild the ledger of "
+                "asset sources with differences."
+            ),
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=50,
+            help="Differences to print.",
+        )
+
+    def handle(self, *args, **options):
+        report = check_balances(report_limit=options["limit"])
+        for asset_source_id, unit_id, day, expected, stored in report.mismatches:
+            self.stdout.write(
+                f"asset source {asset_source_id}, unit {unit_id}, {day}: "
+                f"expected {expected}, stored {stored}"
+            )
+        for pk, amount, minor in report.amount_mismatches:
+            self.stdout.write(f"transaction {pk}: amount {amount}, amount_minor {minor}")
+
+        if not report.mismatched and not report.transaction_ids:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{report.checked} daily balances and all amounts are consistent."
+                )
+            )
+            return
+        if options["fix"]:
+            self._fix(report)
+            return
+        raise CommandError(
+            f"{report.mismatched} of {report.checked} daily balances and "
+            f"{len(report.transaction_ids)} amounts differ, run with --fix to "
+            "rebuild them."
+        )
+
+    def _fix(self, report):
+        asset_source_ids = set(report.asset_source_ids)
+        rounded = 0
+        if report.transaction_ids:
+            transactions = Transaction.objects.filter(pk__in=report.transaction_ids)
+            fixed = sync_amount_minor(transactions)
+            rounded = sum(1 for _ in mismatched_amounts(transactions))
+            for pair in transactions.values_list("from_asset_source_id", "to_asset_source_id"):
+                asset_source_ids.update(pk for pk in pair if pk is not None)
+            rebuild_rollups(
+                subject_ids=list(transactions.values_list("subject_id", flat=True).distinct())
+            )
+            self.stdout.write(f"Recomputed {fixed} amount_minor values.")
+        rows = rebuild_balances(asset_source_ids)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt {len(asset_source_ids)} asset sources ({rows} daily balances)."
+            )
+        )
+        if rounded:
+            raise CommandError(
+                f"{rounded} transactions have more decimal places than their unit "
+                "allows, correct their amounts or raise the unit's decimals."
+            )
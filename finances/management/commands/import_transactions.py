@@ -0,0 +1,77 @@
+import zoneinfo
+
+from django.core.management.base import BaseCommand, CommandError
+
+from finances.imports import IMPORT_BATCH_SIZE, IMPORT_FORMATS, import_transactions
+from finances.models import AssetSource, OwningSubject
+
+
+class Command(BaseCommand):
+    help = (
+        "Import transactions from a CSV, OFX or MT940 statement. Entries "
+        "imported before are skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--subject", type=int, required=True, help="Owning subject id.")
+        parser.add_argument(
+            "--asset-source",
+            type=int,
+            help="Account to book entries on when the file does not name one.",
+        )
+        parser.add_argument("--format", choices=IMPORT_FORMATS, help="Default: guessed.")
+        parser.add_argument("--encoding", default="utf-8-sig")
+        parser.add_argument(
+            "--timezone",
+            help="Zone of dates without one (default: TIME_ZONE).",
+        )
+        parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Parse and validate only.",
+        )
+
+    def handle(self, *args, **options):
+        subject = OwningSubject.objects.filter(pk=options["subject"]).first()
+        if subject is None:
+            raise CommandError(f"No owning subject {options['subject']}.")
+        asset_source = None
+        if options["asset_source"]:
+            asset_source = AssetSource.objects.filter(
+                pk=options["asset_source"], subject=subject
+            ).first()
+            if asset_source is None:
+                raise CommandError(f"{subject} has no asset source {options['asset_source']}.")
+        try:
+            tz = zoneinfo.ZoneInfo(options["timezone"]) if options["timezone"] else None
+        except zoneinfo.ZoneInfoNotFoundError:
+            raise CommandError(f"Unknown time zone {options['timezone']!r}.") from None
+
+        def on_batch(report):
+            if options["verbosity"] > 1:
+                self.stdout.write(f"{report.rows} rows, {report.created} imported")
+
+        with open(options["path"], "rb") as fileobj:
+            report = import_transactions(
+                fileobj,
+                subject,
+                fmt=options["format"],
+                name=options["path"],
+                asset_source=asset_source,
+                encoding=options["encoding"],
+                tz=tz,
+                batch_size=options["batch_size"],
+                dry_run=options["dry_run"],
+                on_batch=on_batch,
+            )
+
+        for position, message in report.errors:
+            self.stderr.write(f"{options['path']}:{position}: {message}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{report.rows} rows: imported {report.created}, "
+                f"skipped {report.duplicates} duplicates, {report.failed} errors."
+            )
+        )
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from finances.balances import rebuild_balances
+from finances.models import AssetSource
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily balance ledger from the transactions."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--asset-source",
+            type=int,
+            action="append",
+            dest="asset_sources",
+            help="Only this asset source (repeatable).",
+        )
+        parser.add_argument(
+            "--subject",
+            type=int,
+            help="Only the asset sources of this owning subject.",
+        )
+
+    def handle(self, *args, **options):
+        asset_source_ids = None
+        if options["asset_sources"] or options["subject"]:
+            sources = AssetSource.objects.all()
+            if options["asset_sources"]:
+                sources = sources.filter(pk__in=options["asset_sources"])
+            if options["subject"]:
+                sources = sources.filter(subject_id=options["subject"])
+            asset_source_ids = set(sources.values_list("id", flat=True))
+
+        rows = rebuild_balances(asset_source_ids)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {rows} daily balances."))
@@ -0,0 +1,66 @@
+import zoneinfo
+
+from django.core.management.base import BaseCommand, CommandError
+
+from finances.models import ReportZone
+from finances.rollups import ensure_zone, rebuild_rollups, wanted_zones
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the monthly rollup cube used by finance reports, for "
+        "TIME_ZONE and every time zone in user preferences."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--zone",
+            action="append",
+            dest="zones",
+            help="Only this time zone (repeatable), added if missing.",
+        )
+        parser.add_argument("--subject", type=int, help="Only this owning subject.")
+        parser.add_argument(
+            "--prune",
+            action="store_true",
+            help="Drop zones no user prefers any more.",
+        )
+        parser.add_argument(
+            "--queue-missing",
+            action="store_true",
+            help="Only add missing zones (e.g. after TIME_ZONE changed) and "
+            "queue their builds.",
+        )
+
+    def handle(self, *args, **options):
+        if options["queue_missing"]:
+            missing = set(wanted_zones()) - set(
+                ReportZone.objects.values_list("name", flat=True)
+            )
+            for name in sorted(missing):
+                try:
+                    ensure_zone(name)
+                except (KeyError, ValueError):
+                    self.stderr.write(f"Skipped unknown time zone {name!r}.")
+            self.stdout.write(f"Checked {len(missing)} missing zones.")
+            return
+        names = options["zones"] or wanted_zones()
+        zones = []
+        for name in names:
+            try:
+                zoneinfo.ZoneInfo(name)
+            except (KeyError, ValueError):
+                raise CommandError(f"Unknown time zone {name!r}.") from None
+            zones.append(ReportZone.objects.get_or_create(name=name)[0])
+        if options["prune"]:
+            _, deleted = ReportZone.objects.exclude(
+                name__in={*wanted_zones(), *names}
+            ).delete()
+            pruned = deleted.get(ReportZone._meta.label, 0)
+            self.stdout.write(f"Dropped {pruned} unused zones.")
+
+        subject_ids = [options["subject"]] if options["subject"] else None
+        rows = rebuild_rollups(zones, subject_ids=subject_ids)
+        self.stdout.write(
+            self.style.SUCCESS(f"Wrote {rows} rollup cells for {len(zones)} zones.")
+        )
@@ -0,0 +1,72 @@
+# Generated by Django 6.1.2 on 2026-10-18 15:32
+
+from collections import defaultdict
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def build_balances(apps, schema_editor):
+    # The ledger as of this migration: per asset source, unit and day (in
+    # TIME_ZONE), money leaving from_asset_source and entering
+    # to_asset_source, with running balances.
+    Transaction = apps.get_model('finances', 'Transaction')
+    DailyBalance = apps.get_model('finances', 'DailyBalance')
+    days = defaultdict(lambda: [Decimal(0), 0])
+    rows = Transaction.objects.order_by().values_list(
+        'amount', 'unit_id', 'occurred_at', 'from_asset_source_id', 'to_asset_source_id'
+    )
+    for amount, unit_id, occurred_at, from_id, to_id in rows.iterator(chunk_size=5000):
+        if timezone.is_naive(occurred_at):
+            occurred_at = timezone.make_aware(occurred_at)
+        day = timezone.localdate(occurred_at)
+        for asset_source_id, signed in ((from_id, -amount), (to_id, amount)):
+            if asset_source_id is not None:
+                days[(asset_source_id, unit_id, day)][0] += signed
+                days[(asset_source_id, unit_id, day)][1] += 1
+
+    def ledger():
+        balance, previous = Decimal(0), None
+        for (asset_source_id, unit_id, day), (delta, count) in sorted(days.items()):
+            if (asset_source_id, unit_id) != previous:
+                balance, previous = Decimal(0), (asset_source_id, unit_id)
+            balance += delta
+            yield DailyBalance(
+                asset_source_id=asset_source_id,
+                unit_id=unit_id,
+                date=day,
+                delta=delta,
+                balance=balance,
+                transactions=count,
+            )
+
+    DailyBalance.objects.bulk_create(ledger(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finances', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('delta', models.DecimalField(decimal_places=8, help_text='Net change over the day.', max_digits=28)),
+                ('balance', models.DecimalField(decimal_places=8, help_text='Balance at the end of the day.', max_digits=28)),
+                ('transactions', models.PositiveIntegerField(default=0)),
+                ('asset_source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_balances', to='finances.assetsource')),
+                ('unit', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='daily_balances', to='finances.unit')),
+            ],
+            options={
+                'ordering': ['asset_source', 'unit', 'date'],
+                'constraints': [models.UniqueConstraint(fields=('asset_source', 'unit', 'date'), name='daily_balance_source_unit_date_uniq')],
+            },
+        ),
+        migrations.RunPython(build_balances, migrations.RunPython.noop),
+    ]
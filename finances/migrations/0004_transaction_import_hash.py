@@ -0,0 +1,22 @@
+# Generated by Django 6.1.2 on 2026-10-18 15:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finances', '0003_daily_balance'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='import_hash',
+            field=models.CharField(blank=True, editable=False, help_text='Content hash of the imported statement entry, see finances.imports.', max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='transaction',
+            constraint=models.UniqueConstraint(fields=('subject', 'import_hash'), name='transaction_subject_import_hash_uniq'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 6.1.2 on 2026-10-18 16:00
+
+import django.db.models.deletion
+import django.db.models.functions.comparison
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finances', '0004_transaction_import_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportZone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, unique=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='MonthlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month.')),
+                ('type', models.CharField(choices=[('INCOME', 'Income'), ('EXPENSE', 'Expense'), ('TRANSFER', 'Transfer')], max_length=8)),
+                ('category', models.CharField(choices=[('HOME_MAINTENANCE', 'Home & maintenance'), ('FOOD_GROCERIES', 'Food & groceries'), ('HOUSEHOLD_UTILITIES', 'Household & utilities'), ('CLOTHES_EDC', 'Clothes & EDC'), ('MOBILITY_TRANSPORT', 'Mobility & Transport'), ('FUN_TRAVEL', 'Fun & Travel'), ('LIFESTYLE_HOBBY', 'Lifestyle & Hobby'), ('WORK_EDUCATION', 'Work & Education'), ('BUSINESS_FINANCE', 'Business & Finance'), ('TAX_FEES', 'Tax & Fees'), ('GIFTS_FAMILY', 'Gifts & Family'), ('OTHER', 'Other')], max_length=32)),
+                ('amount', models.DecimalField(decimal_places=8, max_digits=28)),
+                ('transactions', models.PositiveIntegerField(default=0)),
+                ('project', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='monthly_rollups', to='finances.project')),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_rollups', to='finances.owningsubject')),
+                ('unit', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='monthly_rollups', to='finances.unit')),
+                ('zone', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='finances.reportzone')),
+            ],
+            options={
+                'ordering': ['zone', 'subject', 'month'],
+                'constraints': [models.UniqueConstraint(models.F('zone'), models.F('subject'), models.F('month'), models.F('type'), models.F('category'), django.db.models.functions.comparison.Coalesce(models.F('project'), models.Value(0)), models.F('unit'), name='monthly_rollup_key_uniq')],
+            },
+        ),
+    ]
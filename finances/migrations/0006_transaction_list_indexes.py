@@ -0,0 +1,49 @@
+# Generated by Django 6.1.2 on 2026-10-18 16:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finances', '0005_monthly_rollup'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='transaction',
+            name='finances_tr_subject_56e587_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='transaction',
+            name='finances_tr_categor_0d5e70_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='transaction',
+            name='finances_tr_project_5d93fd_idx',
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['subject', 'occurred_at', 'id'], name='finances_tr_subject_f268da_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['occurred_at', 'id'], name='finances_tr_occurre_c2859c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['category', 'occurred_at', 'id'], name='finances_tr_categor_725579_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['project', 'occurred_at', 'id'], name='finances_tr_project_49451e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['from_asset_source', 'occurred_at', 'id'], name='finances_tr_from_as_c20c03_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['to_asset_source', 'occurred_at', 'id'], name='finances_tr_to_asse_90ca4f_idx'),
+        ),
+    ]
@@ -0,0 +1,122 @@
+# Generated by Django 6.1.2 on 2026-10-18 16:12
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fill_amount_minor(apps, schema_editor):
+    # Against the models of this migration: amount_minor is amount in units
+    # of 10 ** -Unit.decimals, the ledger is rebuilt in those (per asset
+    # source, unit and TIME_ZONE day) and the cube again on first use.
+    Transaction = apps.get_model('finances', 'Transaction')
+    DailyBalance = apps.get_model('finances', 'DailyBalance')
+    ReportZone = apps.get_model('finances', 'ReportZone')
+    connection = schema_editor.connection
+    quote = connection.ops.quote_name
+    sql = 'UPDATE {} SET {} = %s WHERE {} = %s'.format(
+        quote(Transaction._meta.db_table), quote('amount_minor'), quote('id')
+    )
+    rows = Transaction.objects.order_by().values_list(
+        'id',
+        'amount',
+        'unit__decimals',
+        'unit_id',
+        'occurred_at',
+        'from_asset_source_id',
+        'to_asset_source_id',
+    )
+    updates, rounded = [], []
+    days = defaultdict(lambda: [0, 0])
+    for pk, amount, places, unit_id, occurred_at, from_id, to_id in rows.iterator(
+        chunk_size=5000
+    ):
+        minor = int(amount.scaleb(places).to_integral_value())
+        if Decimal(minor).scaleb(-places) != amount or abs(minor) > 2**63 - 1:
+            rounded.append(f'#{pk} ({amount}, {places} places)')
+        updates.append((minor, pk))
+        if timezone.is_naive(occurred_at):
+            occurred_at = timezone.make_aware(occurred_at)
+        day = timezone.localdate(occurred_at)
+        for asset_source_id, signed in ((from_id, -minor), (to_id, minor)):
+            if asset_source_id is not None:
+                days[(asset_source_id, unit_id, day)][0] += signed
+                days[(asset_source_id, unit_id, day)][1] += 1
+    if rounded:
+        # Storing these would silently round them, and every total after.
+        raise RuntimeError(
+            f'{len(rounded)} transactions have more decimal places than their '
+            f'unit allows or are too large, e.g. {", ".join(rounded[:10])}. '
+            'Correct their amounts or raise the decimals of their units, then '
+            'migrate again.'
+        )
+    with connection.cursor() as cursor:
+        for start in range(0, len(updates), 5000):
+            cursor.executemany(sql, updates[start : start + 5000])
+
+    def ledger():
+        balance, previous = 0, None
+        for (asset_source_id, unit_id, day), (delta, count) in sorted(days.items()):
+            if (asset_source_id, unit_id) != previous:
+                balance, previous = 0, (asset_source_id, unit_id)
+            balance += delta
+            yield DailyBalance(
+                asset_source_id=asset_source_id,
+                unit_id=unit_id,
+                date=day,
+                delta_minor=delta,
+                balance_minor=balance,
+                transactions=count,
+            )
+
+    DailyBalance.objects.all().delete()
+    DailyBalance.objects.bulk_create(ledger(), batch_size=1000)
+    ReportZone.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finances', '0006_transaction_list_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='dailybalance',
+            name='balance',
+        ),
+        migrations.RemoveField(
+            model_name='dailybalance',
+            name='delta',
+        ),
+        migrations.RemoveField(
+            model_name='monthlyrollup',
+            name='amount',
+        ),
+        migrations.AddField(
+            model_name='dailybalance',
+            name='balance_minor',
+            field=models.BigIntegerField(default=0, help_text='Balance at the end of the day, in minor units of unit.'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='dailybalance',
+            name='delta_minor',
+            field=models.BigIntegerField(default=0, help_text='Net change over the day, in minor units of unit.'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='monthlyrollup',
+            name='amount_minor',
+            field=models.BigIntegerField(default=0, help_text='Sum in minor units of unit.'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='amount_minor',
+            field=models.BigIntegerField(default=0, editable=False, help_text='amount in minor units of unit, set on save, see finances.amounts.'),
+        ),
+        migrations.RunPython(fill_amount_minor, migrations.RunPython.noop),
+    ]
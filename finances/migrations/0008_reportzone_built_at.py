@@ -0,0 +1,26 @@
+# Generated by Django 6.1.2 on 2026-10-18 16:43
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def mark_built(apps, schema_editor):
+    # Zones so far were built when they were added.
+    ReportZone = apps.get_model('finances', 'ReportZone')
+    ReportZone.objects.update(built_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finances', '0007_amount_minor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportzone',
+            name='built_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(mark_built, migrations.RunPython.noop),
+    ]
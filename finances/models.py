@@ -1,9 +1,12 @@
 from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.db import models
-from django.db.models import Q, F
+from django.db import models, transaction as db_transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
+from .amounts import check_minor, check_places, from_minor, to_minor
+
 
 class Unit(models.Model):
     code = models.CharField(max_length=8, unique=True)
@@ -20,6 +23,29 @@ class Unit(models.Model):
     def __str__(self):
         return self.code
 
+    def clean(self):
+        """decimals may not drop below the places its transactions use."""
+        from django.core.exceptions import ValidationError
+
+        try:
+            self.check_decimals()
+        except ValueError as exc:
+            raise ValidationError({"decimals": str(exc)}) from None
+
+    def check_decimals(self):
+        """ValueError when lowering decimals would round some transaction."""
+        if self.pk is None or self.decimals is None:
+            return
+        stored = Unit.objects.filter(pk=self.pk).values_list("decimals", flat=True).first()
+        if stored is not None and self.decimals < stored:
+            check_places(
+                Transaction.objects.filter(unit=self)
+                .values_list("amount", flat=True)
+                .iterator(chunk_size=5000),
+                self.decimals,
+                self.code,
+            )
+
 
 class OwningSubject(models.Model):
     class Type(models.TextChoices):
@@ -149,6 +175,11 @@ class Transaction(models.Model):
         validators=[MinValueValidator(0.00000001)],
         help_text="Always positive. Direction is implied by type.",
     )
+    amount_minor = models.BigIntegerField(
+        default=0,
+        editable=False,
+        help_text="amount in minor units of unit, set on save, see finances.amounts.",
+    )
     unit = models.ForeignKey(
         Unit, on_delete=models.PROTECT, related_name="transactions"
     )
@@ -179,14 +210,26 @@ class Transaction(models.Model):
         blank=True,
         related_name="incoming_transactions",
     )
+    import_hash = models.CharField(
+        max_length=64,
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Content hash of the imported statement entry, see finances.imports.",
+    )
 
     class Meta:
         ordering = ["-occurred_at", "-id"]
+        # Every list filter has an index ending in the ordering, so keyset
+        # pages are index range scans (see finances.listing).
         indexes = [
-            models.Index(fields=["subject", "occurred_at"]),
+            models.Index(fields=["subject", "occurred_at", "id"]),
+            models.Index(fields=["occurred_at", "id"]),
             models.Index(fields=["type"]),
-            models.Index(fields=["category"]),
-            models.Index(fields=["project"]),
+            models.Index(fields=["category", "occurred_at", "id"]),
+            models.Index(fields=["project", "occurred_at", "id"]),
+            models.Index(fields=["from_asset_source", "occurred_at", "id"]),
+            models.Index(fields=["to_asset_source", "occurred_at", "id"]),
         ]
         constraints = [
             models.CheckConstraint(
@@ -212,6 +255,11 @@ class Transaction(models.Model):
                     )
                 ),
             ),
+            # NULLs never collide, so hand-entered rows are unaffected.
+            models.UniqueConstraint(
+                fields=["subject", "import_hash"],
+                name="transaction_subject_import_hash_uniq",
+            ),
             models.CheckConstraint(
                 name="transaction_transfer_from_ne_to",
                 condition=(~Q(type="TRANSFER"))
@@ -245,10 +293,158 @@ class Transaction(models.Model):
                 "project must belong to the same subject as the transaction."
             )
 
+        if self.amount is not None and self.unit_id is not None:
+            try:
+                check_minor(self.amount, self.unit.decimals, self.unit.code)
+            except ValueError as exc:
+                raise ValidationError({"amount": str(exc)}) from None
+
+    def save(self, *args, **kwargs):
+        """
+        Sets amount_minor, saves and updates the DailyBalance ledger and the
+        MonthlyRollup cube in one transaction. Queryset update() and
+        bulk_create() bypass this, see finances.amounts, finances.balances
+        and finances.rollups.
+        """
+        from .balances import LEDGER_FIELDS, record_ledger_change
+        from .rollups import ROLLUP_FIELDS, record_rollup_change
+
+        tracked = list(dict.fromkeys(LEDGER_FIELDS + ROLLUP_FIELDS))
+        self.amount_minor = to_minor(self.amount, self.unit.decimals)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"amount", "unit", "unit_id"} & set(update_fields):
+            kwargs["update_fields"] = [*update_fields, "amount_minor"]
+        with db_transaction.atomic(using=kwargs.get("using")):
+            old = None
+            if not self._state.adding and self.pk is not None:
+                old = (
+                    Transaction.objects.select_for_update()
+                    .filter(pk=self.pk)
+                    .values(*tracked)
+                    .first()
+                )
+            super().save(*args, **kwargs)
+            new = {name: getattr(self, name) for name in tracked}
+            update_fields = kwargs.get("update_fields")
+            if old is not None and update_fields is not None:
+                # Fields that were not written keep their stored value.
+                written = {self._meta.get_field(name).attname for name in update_fields}
+                new = {name: new[name] if name in written else old[name] for name in new}
+            record_ledger_change(old, new)
+            record_rollup_change(old, new)
+
     def __str__(self):
         return f"{self.get_type_display()} {self.amount} {self.unit.code} \u2014 {self.title}"
 
 
+class DailyBalance(models.Model):
+    """
+    Closing balance of an asset source in one unit at the end of a day
+    (settings.TIME_ZONE). Only days with transactions have a row; other days
+    carry the balance of the latest earlier row. Maintained by finances.balances.
+    """
+
+    asset_source = models.ForeignKey(
+        AssetSource, on_delete=models.CASCADE, related_name="daily_balances"
+    )
+    unit = models.ForeignKey(
+        Unit, on_delete=models.PROTECT, related_name="daily_balances"
+    )
+    date = models.DateField()
+    delta_minor = models.BigIntegerField(
+        help_text="Net change over the day, in minor units of unit.",
+    )
+    balance_minor = models.BigIntegerField(
+        help_text="Balance at the end of the day, in minor units of unit.",
+    )
+    transactions = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["asset_source", "unit", "date"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["asset_source", "unit", "date"],
+                name="daily_balance_source_unit_date_uniq",
+            ),
+        ]
+
+    @property
+    def delta(self):
+        return from_minor(self.delta_minor, self.unit.decimals)
+
+    @property
+    def balance(self):
+        return from_minor(self.balance_minor, self.unit.decimals)
+
+    def __str__(self):
+        return f"{self.asset_source} {self.date}: {self.balance} {self.unit.code}"
+
+
+class ReportZone(models.Model):
+    """A time zone the MonthlyRollup cube is kept for."""
+
+    name = models.CharField(max_length=64, unique=True)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+    # Set once rebuild_rollups has filled in the cube for this zone.
+    built_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        ordering = ["name"]
+
+    def __str__(self):
+        return self.name
+
+
+class MonthlyRollup(models.Model):
+    """
+    Sum and count of transactions per subject, month (in zone), type,
+    category, project and unit. Maintained by finances.rollups.
+    """
+
+    zone = models.ForeignKey(ReportZone, on_delete=models.CASCADE, related_name="rollups")
+    subject = models.ForeignKey(
+        OwningSubject, on_delete=models.CASCADE, related_name="monthly_rollups"
+    )
+    month = models.DateField(help_text="First day of the month.")
+    type = models.CharField(max_length=8, choices=Transaction.Type.choices)
+    category = models.CharField(max_length=32, choices=Transaction.Category.choices)
+    project = models.ForeignKey(
+        Project,
+        on_delete=models.CASCADE,
+        related_name="monthly_rollups",
+        null=True,
+        blank=True,
+    )
+    unit = models.ForeignKey(
+        Unit, on_delete=models.PROTECT, related_name="monthly_rollups"
+    )
+    amount_minor = models.BigIntegerField(help_text="Sum in minor units of unit.")
+    transactions = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["zone", "subject", "month"]
+        constraints = [
+            # Coalesce: rows without a project must collide as well.
+            models.UniqueConstraint(
+                F("zone"),
+                F("subject"),
+                F("month"),
+                F("type"),
+                F("category"),
+                Coalesce(F("project"), Value(0)),
+                F("unit"),
+                name="monthly_rollup_key_uniq",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} {self.month:%Y-%m} {self.type} {self.category}: {self.amount}"
+
+    @property
+    def amount(self):
+        return from_minor(self.amount_minor, self.unit.decimals)
+
+
 class UserPreferences(models.Model):
     user = models.OneToOneField(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="preferences"
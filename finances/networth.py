@@ -0,0 +1,216 @@
+import datetime
+import zoneinfo
+from dataclasses import dataclass, field
+
+import numpy as np
+from django.conf import settings
+
+from .models import Transaction
+from .rates import epoch_us, get_rate_table
+
+FREQUENCIES = ("day", "week", "month")
+# Last day a period may start on: the day after the end of its period
+# must still be a date.
+LAST_PERIOD_DAY = datetime.date.max - datetime.timedelta(days=32)
+
+
+@dataclass
+class LedgerStream:
+    """
+    A subject's transactions as columns of legs, one per asset source a
+    transaction takes money out of or puts money into, in time order.
+    Amounts are signed integers in minor units (10 ** -Unit.decimals).
+    """
+
+    at: np.ndarray  # int64 microseconds since the epoch
+    amounts: np.ndarray  # int64 minor units
+    unit_ids: np.ndarray  # int64
+    asset_source_ids: np.ndarray  # int64
+
+    def __len__(self):
+        return len(self.at)
+
+
+@dataclass
+class NetWorthSeries:
+    unit_id: int
+    frequency: str
+    periods: list  # first day of each period
+    totals: np.ndarray  # float64 in unit_id, NaN where a rate is missing
+    # {(asset_source_id, unit_id): holdings converted to unit_id}
+    accounts: dict = field(default_factory=dict)
+
+
+def load_stream(subject):
+    """
+    LedgerStream of subject from one values_list() query; amounts come
+    straight from Transaction.amount_minor, no Decimal is built.
+    """
+    rows = list(
+        Transaction.objects.filter(subject=subject)
+        .order_by()
+        .values_list(
+            "occurred_at",
+            "amount_minor",
+            "unit_id",
+            "from_asset_source_id",
+            "to_asset_source_id",
+        )
+        .iterator(chunk_size=5000)
+    )
+    if not rows:
+        empty = np.empty(0, dtype=np.int64)
+        return LedgerStream(empty, empty, empty, empty)
+
+    occurred, amounts, unit_ids, from_ids, to_ids = zip(*rows)
+    at = epoch_us(occurred)
+    amounts = np.array(amounts, dtype=np.int64)
+    unit_ids = np.array(unit_ids, dtype=np.int64)
+    from_ids = np.array([source or 0 for source in from_ids], dtype=np.int64)
+    to_ids = np.array([source or 0 for source in to_ids], dtype=np.int64)
+
+    outgoing, incoming = from_ids != 0, to_ids != 0
+    at = np.concatenate([at[outgoing], at[incoming]])
+    order = np.argsort(at, kind="stable")
+    return LedgerStream(
+        at=at[order],
+        amounts=np.concatenate([-amounts[outgoing], amounts[incoming]])[order],
+        unit_ids=np.concatenate([unit_ids[outgoing], unit_ids[incoming]])[order],
+        asset_source_ids=np.concatenate([from_ids[outgoing], to_ids[incoming]])[order],
+    )
+
+
+def account_balances(stream, at):
+    """
+    {(asset_source_id, unit_id): minor-unit balances at each moment of at}:
+    one cumulative sum per account, sampled with searchsorted.
+    """
+    if not len(stream):
+        return {}
+    at = epoch_us(at)
+    keys, account_index = np.unique(
+        np.stack([stream.asset_source_ids, stream.unit_ids], axis=1),
+        axis=0,
+        return_inverse=True,
+    )
+    account_index = account_index.ravel()
+    # Stable, so every account keeps the stream's time order.
+    order = np.argsort(account_index, kind="stable")
+    bounds = np.searchsorted(account_index[order], np.arange(len(keys) + 1))
+
+    balances = {}
+    for position, (asset_source_id, unit_id) in enumerate(keys):
+        rows = order[bounds[position] : bounds[position + 1]]
+        running = np.concatenate([[0], np.cumsum(stream.amounts[rows])])
+        index = np.searchsorted(stream.at[rows], at, side="right")
+        balances[(int(asset_source_id), int(unit_id))] = running[index]
+    return balances
+
+
+def _next_period(day, frequency):
+    if frequency == "day":
+        return day + datetime.timedelta(days=1)
+    if frequency == "week":
+        return day + datetime.timedelta(days=7)
+    return (day + datetime.timedelta(days=32)).replace(day=1)
+
+
+def period_count(start, end, frequency):
+    """
+    How many periods period_starts() returns for start..end, computed
+    without building them. ValueError for an end too close to date.max.
+    """
+    if frequency not in FREQUENCIES:
+        raise ValueError(f"Unknown frequency {frequency!r}")
+    if end > LAST_PERIOD_DAY:
+        raise ValueError(f"end must be before {LAST_PERIOD_DAY.isoformat()}")
+    if frequency == "week":
+        start -= datetime.timedelta(days=start.weekday())
+    elif frequency == "month":
+        start = start.replace(day=1)
+    if end < start:
+        return 0
+    if frequency == "day":
+        return (end - start).days + 1
+    if frequency == "week":
+        return (end - start).days // 7 + 1
+    return (end.year - start.year) * 12 + end.month - start.month + 1
+
+
+def first_transaction_date(subject, tz):
+    """Date in tz of subject's first transaction, None if it has none."""
+    first = (
+        Transaction.objects.filter(subject=subject)
+        .order_by("occurred_at", "id")
+        .values_list("occurred_at", flat=True)
+        .first()
+    )
+    return first.astimezone(tz).date() if first is not None else None
+
+
+def period_starts(start, end, frequency):
+    """First days of the day, week (from Monday) or month periods of start..end."""
+    if frequency not in FREQUENCIES:
+        raise ValueError(f"Unknown frequency {frequency!r}")
+    if frequency == "week":
+        start -= datetime.timedelta(days=start.weekday())
+    elif frequency == "month":
+        start = start.replace(day=1)
+    periods = []
+    while start <= end:
+        periods.append(start)
+        start = _next_period(start, frequency)
+    return periods
+
+
+def period_ends(periods, frequency, tz):
+    """Epoch microseconds of the last moment of each period, in tz."""
+    following = [
+        datetime.datetime.combine(_next_period(day, frequency), datetime.time(), tzinfo=tz)
+        for day in periods
+    ]
+    return epoch_us(following) - 1
+
+
+def net_worth_series(subject, unit, start=None, end=None, frequency="month", tz=None):
+    """
+    NetWorthSeries of subject in unit: what all of its asset sources hold
+    at the end of every period from start to end (dates, default: first
+    transaction to today, in the time zone named tz, default TIME_ZONE).
+
+    Holdings per account and unit come from account_balances(), each
+    converted at the rate as of the period end by the RateTable. The
+    transactions are read once, everything after is array arithmetic.
+    """
+    unit_id = getattr(unit, "pk", unit)
+    tz = zoneinfo.ZoneInfo(tz or settings.TIME_ZONE)
+    table = get_rate_table()
+    stream = load_stream(subject)
+
+    if end is None:
+        end = datetime.datetime.now(tz).date()
+    if start is None:
+        start = (
+            datetime.datetime.fromtimestamp(stream.at[0] / 1e6, tz).date()
+            if len(stream)
+            else end
+        )
+    periods = period_starts(start, end, frequency)
+    if not periods:
+        return NetWorthSeries(unit_id, frequency, [], np.empty(0))
+    at = period_ends(periods, frequency, tz)
+
+    totals = np.zeros(len(periods))
+    accounts = {}
+    for (asset_source_id, account_unit_id), balances in account_balances(
+        stream, at
+    ).items():
+        holdings = balances / 10 ** table.decimals.get(account_unit_id, 2)
+        converted = holdings * table.rates(account_unit_id, unit_id, at)
+        # An empty account is worth nothing, rate or not.
+        converted[balances == 0] = 0
+        accounts[(asset_source_id, account_unit_id)] = table.round(converted, unit_id)
+        totals += converted
+    return NetWorthSeries(
+        unit_id, frequency, periods, table.round(totals, unit_id), accounts
+    )
@@ -0,0 +1,191 @@
+from django.contrib import admin
+from django.core.cache import cache
+
+from common.versions import bump_version, get_version
+
+from .models import (
+    AssetSource,
+    DailyBalance,
+    MonthlyRollup,
+    OwningSubject,
+    Project,
+    SubjectUserAccess,
+    Transaction,
+)
+
+Role = SubjectUserAccess.Role
+
+# Each role includes the ones ranked below it.
+ROLE_RANKS = {Role.VIEWER: 1, Role.EDITOR: 2, Role.OWNER: 3}
+
+# Lookup from a model to the OwningSubject its rows belong to.
+SUBJECT_LOOKUPS = {
+    OwningSubject: "pk",
+    AssetSource: "subject",
+    Project: "subject",
+    Transaction: "subject",
+    SubjectUserAccess: "subject",
+    MonthlyRollup: "subject",
+    DailyBalance: "asset_source__subject",
+}
+
+ACCESS_VERSION = "finances:access"
+# Upper bound on how long a cached role map is trusted, for changes that
+# skip the signals (queryset updates, raw SQL).
+ACCESS_CACHE_TIMEOUT = 60
+
+
+def _rank(role):
+    return ROLE_RANKS.get(role, 0)
+
+
+class SubjectAccess:
+    """
+    What one user may do per OwningSubject: their {subject_id: role} map,
+    or everything for superusers. Answers every check in memory, so a
+    list of N rows costs no query per row.
+    """
+
+    def __init__(self, roles, everything=False):
+        self.roles = dict(roles)
+        self.everything = everything
+
+    def role(self, subject_id):
+        return Role.OWNER if self.everything else self.roles.get(subject_id)
+
+    def allows(self, subject_id, role=Role.VIEWER):
+        return self.everything or _rank(self.roles.get(subject_id)) >= _rank(role)
+
+    def subject_ids(self, role=Role.VIEWER):
+        """Ids of the subjects with at least role, None meaning all."""
+        if self.everything:
+            return None
+        return {
+            subject_id
+            for subject_id, granted in self.roles.items()
+            if _rank(granted) >= _rank(role)
+        }
+
+    def any(self, role=Role.VIEWER):
+        return self.everything or bool(self.subject_ids(role))
+
+    def filter(self, queryset, role=Role.VIEWER):
+        """queryset narrowed to rows of subjects with at least role."""
+        if self.everything:
+            return queryset
+        lookup = SUBJECT_LOOKUPS[queryset.model]
+        return queryset.filter(**{f"{lookup}__in": sorted(self.subject_ids(role))})
+
+    def allows_object(self, obj, role=Role.VIEWER):
+        """Whether obj, of a model in SUBJECT_LOOKUPS, is in a subject with role."""
+        if self.everything:
+            return True
+        *path, last = SUBJECT_LOOKUPS[type(obj)].split("__")
+        for name in path:
+            obj = getattr(obj, name)
+        return self.allows(obj.pk if last == "pk" else getattr(obj, f"{last}_id"), role)
+
+
+class SubjectAccessCache:
+    """
+    {subject_id: role} maps per user in the default cache, which all
+    processes share. A change to any SubjectUserAccess bumps a shared
+    version (see finances.signals and common.versions), which retires every
+    cached map at once; a map is never used for longer than ACCESS_CACHE_TIMEOUT.
+    """
+
+    def _shared_version(self):
+        return get_version(ACCESS_VERSION)
+
+    def roles(self, user_id):
+        key = f"finances:access:{self._shared_version()}:{user_id}"
+        roles = cache.get(key)
+        if roles is None:
+            roles = dict(
+                SubjectUserAccess.objects.filter(user_id=user_id)
+                .order_by()
+                .values_list("subject_id", "role")
+            )
+            cache.set(key, roles, ACCESS_CACHE_TIMEOUT)
+        return roles
+
+    def invalidate(self):
+        bump_version(ACCESS_VERSION)
+
+
+subject_access_cache = SubjectAccessCache()
+
+
+def access_for(user):
+    if not user.is_authenticated or not user.is_active:
+        return SubjectAccess({})
+    if user.is_superuser:
+        return SubjectAccess({}, everything=True)
+    return SubjectAccess(subject_access_cache.roles(user.pk))
+
+
+def subject_access(request):
+    """The SubjectAccess of request.user, resolved once per request."""
+    access = getattr(request, "_subject_access", None)
+    if access is None:
+        access = request._subject_access = access_for(request.user)
+    return access
+
+
+class SubjectScopedAdminMixin:
+    """
+    ModelAdmin mixin limiting a model of SUBJECT_LOOKUPS to the subjects of
+    the user, on top of the usual model permissions. subject_roles names
+    the role each permission needs (None: no subject check); foreign keys
+    to subject-scoped models only offer rows of subjects with the role
+    needed to change.
+    """
+
+    subject_roles = {
+        "view": Role.VIEWER,
+        "add": Role.EDITOR,
+        "change": Role.EDITOR,
+        "delete": Role.EDITOR,
+    }
+
+    def get_queryset(self, request):
+        return subject_access(request).filter(
+            super().get_queryset(request), self.subject_roles["view"] or Role.VIEWER
+        )
+
+    def _allows(self, request, permission, obj):
+        access = subject_access(request)
+        role = self.subject_roles[permission]
+        if role is None:
+            return True
+        if obj is None:
+            return access.any(role)
+        return access.allows_object(obj, role)
+
+    def has_view_permission(self, request, obj=None):
+        return super().has_view_permission(request, obj) and self._allows(request, "view", obj)
+
+    def has_add_permission(self, request):
+        return super().has_add_permission(request) and self._allows(request, "add", None)
+
+    def has_change_permission(self, request, obj=None):
+        return super().has_change_permission(request, obj) and self._allows(
+            request, "change", obj
+        )
+
+    def has_delete_permission(self, request, obj=None):
+        return super().has_delete_permission(request, obj) and self._allows(
+            request, "delete", obj
+        )
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        model = db_field.related_model
+        if model in SUBJECT_LOOKUPS and "queryset" not in kwargs:
+            kwargs["queryset"] = subject_access(request).filter(
+                model._default_manager.all(), self.subject_roles["change"] or Role.EDITOR
+            )
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+
+class SubjectScopedAdmin(SubjectScopedAdminMixin, admin.ModelAdmin):
+    pass
@@ -0,0 +1,207 @@
+import datetime
+import threading
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+
+from common.versions import bump_version, get_version
+
+from .models import ExchangeRate, Unit
+
+FINANCE_RATES_SETTINGS = getattr(settings, "FINANCE_RATES", {})
+
+# Code of the unit cross rates are triangulated through; None picks the
+# unit that is quoted against the most others.
+PIVOT_UNIT = FINANCE_RATES_SETTINGS.get("PIVOT_UNIT")
+
+RATES_VERSION = "finances:rates"
+
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.UTC)
+_MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+def epoch_us(values):
+    """Aware datetime(s) as int64 microseconds since the epoch."""
+    if isinstance(values, np.ndarray):
+        return values.astype(np.int64, copy=False)
+    if isinstance(values, datetime.datetime):
+        return np.array([(values - _EPOCH) // _MICROSECOND], dtype=np.int64)
+    return np.fromiter(
+        ((value - _EPOCH) // _MICROSECOND for value in values), dtype=np.int64
+    )
+
+
+class RateTable:
+    """
+    Every ExchangeRate in memory as one sorted (valid_at, rate) series per
+    pair of units, answering "latest rate at or before t" for whole arrays
+    of timestamps with np.searchsorted.
+
+    A pair is stored once, rates quoted the other way round are inverted
+    into it; on equal valid_at the directly quoted rate wins. Pairs without
+    a rate go through the pivot unit. Missing rates come out as NaN.
+    Arithmetic is float64, results are rounded to Unit.decimals.
+    """
+
+    def __init__(self, rows, decimals, pivot_unit_id=None):
+        points = defaultdict(list)
+        for from_unit_id, to_unit_id, valid_at, rate in rows:
+            moment = (valid_at - _EPOCH) // _MICROSECOND
+            if from_unit_id < to_unit_id:
+                points[(from_unit_id, to_unit_id)].append((moment, 1, float(rate)))
+            else:
+                points[(to_unit_id, from_unit_id)].append((moment, 0, 1 / float(rate)))
+
+        self._series = {}
+        for pair, pair_points in points.items():
+            pair_points.sort()
+            self._series[pair] = (
+                np.array([point[0] for point in pair_points], dtype=np.int64),
+                np.array([point[2] for point in pair_points], dtype=np.float64),
+            )
+        self.decimals = dict(decimals)
+
+        if pivot_unit_id is None and self._series:
+            quoted = Counter(unit_id for pair in self._series for unit_id in pair)
+            pivot_unit_id = quoted.most_common(1)[0][0]
+        self.pivot_unit_id = pivot_unit_id
+
+    @classmethod
+    def load(cls):
+        units = Unit.objects.values_list("id", "code", "decimals")
+        decimals = {unit_id: places for unit_id, _, places in units}
+        pivot_unit_id = None
+        if PIVOT_UNIT:
+            pivot_unit_id = next(
+                (unit_id for unit_id, code, _ in units if code == PIVOT_UNIT), None
+            )
+        rows = ExchangeRate.objects.order_by().values_list(
+            "from_unit_id", "to_unit_id", "valid_at", "rate"
+        )
+        return cls(rows.iterator(chunk_size=5000), decimals, pivot_unit_id)
+
+    def __len__(self):
+        return sum(len(times) for times, _ in self._series.values())
+
+    def _direct(self, from_unit_id, to_unit_id, at):
+        if from_unit_id == to_unit_id:
+            return np.ones(len(at))
+        if from_unit_id < to_unit_id:
+            series, invert = self._series.get((from_unit_id, to_unit_id)), False
+        else:
+            series, invert = self._series.get((to_unit_id, from_unit_id)), True
+        if series is None:
+            return np.full(len(at), np.nan)
+        times, rates = series
+        index = np.searchsorted(times, at, side="right") - 1
+        result = rates[np.maximum(index, 0)]
+        if invert:
+            result = 1 / result
+        result[index < 0] = np.nan
+        return result
+
+    def rates(self, from_unit_id, to_unit_id, at):
+        """Rates from one unit to another as of each timestamp in at."""
+        at = epoch_us(at)
+        result = self._direct(from_unit_id, to_unit_id, at)
+        pivot = self.pivot_unit_id
+        missing = np.isnan(result)
+        if missing.any() and pivot is not None and pivot not in (from_unit_id, to_unit_id):
+            at_missing = at[missing]
+            result[missing] = self._direct(from_unit_id, pivot, at_missing) * self._direct(
+                pivot, to_unit_id, at_missing
+            )
+        return result
+
+    def convert(self, amounts, unit_ids, to_unit_id, at):
+        """
+        amounts[i] in unit_ids[i] at moment at[i], converted to to_unit_id
+        and rounded to its decimals; NaN where no rate is known.
+        """
+        amounts = np.asarray(amounts, dtype=np.float64)
+        unit_ids = np.asarray(unit_ids, dtype=np.int64)
+        at = epoch_us(at)
+        rates = np.empty(len(amounts))
+        for unit_id in np.unique(unit_ids):
+            rows = unit_ids == unit_id
+            rates[rows] = self.rates(int(unit_id), to_unit_id, at[rows])
+        return self.round(amounts * rates, to_unit_id)
+
+    def round(self, values, unit_id):
+        return np.round(values, self.decimals.get(unit_id, 2))
+
+    def to_decimal(self, value, unit_id):
+        """One converted amount as a Decimal with the unit's places."""
+        places = self.decimals.get(unit_id, 2)
+        return Decimal(repr(float(value))).quantize(Decimal(1).scaleb(-places))
+
+
+class RateTableCache:
+    """
+    Process-local RateTable. Changes to ExchangeRate or Unit bump a version
+    shared by all web and task worker processes (see finances.signals and
+    common.versions), and each process reloads its table on the next use
+    after seeing a version it has not loaded.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._table = None
+        self._version = None
+
+    def _shared_version(self):
+        return get_version(RATES_VERSION)
+
+    def get(self):
+        version = self._shared_version()
+        with self._lock:
+            if self._table is None or version != self._version:
+                self._table = RateTable.load()
+                self._version = version
+            return self._table
+
+    def invalidate(self):
+        bump_version(RATES_VERSION)
+        with self._lock:
+            self._table = None
+
+
+rate_table_cache = RateTableCache()
+
+
+def get_rate_table():
+    return rate_table_cache.get()
+
+
+def convert_transactions(transactions, to_unit):
+    """
+    (ids, amounts) of a Transaction queryset converted to to_unit as of
+    each occurred_at, as NumPy arrays in queryset order. One query for the
+    rows, none per row.
+    """
+    to_unit_id = getattr(to_unit, "pk", to_unit)
+    rows = list(
+        transactions.values_list("id", "amount_minor", "unit_id", "occurred_at").iterator(
+            chunk_size=5000
+        )
+    )
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    ids, amounts, unit_ids, occurred = zip(*rows)
+    table = get_rate_table()
+    unit_ids = np.array(unit_ids, dtype=np.int64)
+    units, unit_index = np.unique(unit_ids, return_inverse=True)
+    places = np.array([table.decimals.get(int(unit_id), 2) for unit_id in units])
+    scale = (10.0 ** -places)[unit_index]
+    converted = table.convert(
+        np.array(amounts, dtype=np.float64) * scale, unit_ids, to_unit_id, epoch_us(occurred)
+    )
+    return np.array(ids, dtype=np.int64), converted
+
+
+def default_unit_for(user):
+    """The user's UserPreferences.default_unit id, or None."""
+    preferences = getattr(user, "preferences", None)
+    return preferences.default_unit_id if preferences is not None else None
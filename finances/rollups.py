@@ -0,0 +1,339 @@
+import datetime
+import zoneinfo
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .amounts import from_minor
+from .models import MonthlyRollup, ReportZone, Transaction, UserPreferences
+
+# Transaction fields that decide which cube cells a transaction counts in.
+ROLLUP_FIELDS = (
+    "subject_id",
+    "type",
+    "category",
+    "project_id",
+    "unit_id",
+    "amount_minor",
+    "occurred_at",
+)
+# Dimensions reports can group by; "year" is derived from month.
+DIMENSIONS = ("subject", "month", "year", "type", "category", "project", "unit")
+
+
+
+def month_start(occurred_at, tz):
+    return occurred_at.astimezone(tz).date().replace(day=1)
+
+
+def month_bounds(month, tz):
+    """Aware [start, end) of the calendar month containing month, in tz."""
+    start = datetime.datetime.combine(month.replace(day=1), datetime.time(), tzinfo=tz)
+    following = (start.date() + datetime.timedelta(days=32)).replace(day=1)
+    return start, datetime.datetime.combine(following, datetime.time(), tzinfo=tz)
+
+
+def _zones():
+    return [
+        (zone_id, zoneinfo.ZoneInfo(name))
+        for zone_id, name in ReportZone.objects.values_list("id", "name")
+    ]
+
+
+def rollup_entries(values, zones):
+    """{cube key: (minor units, count)} of one transaction in every zone."""
+    if values is None:
+        return {}
+    amount = values["amount_minor"]
+    return {
+        (
+            zone_id,
+            values["subject_id"],
+            month_start(values["occurred_at"], tz),
+            values["type"],
+            values["category"],
+            values["project_id"],
+            values["unit_id"],
+        ): (amount, 1)
+        for zone_id, tz in zones
+    }
+
+
+def _apply(key, amount, count):
+    zone_id, subject_id, month, kind, category, project_id, unit_id = key
+    cell = MonthlyRollup.objects.filter(
+        zone_id=zone_id,
+        subject_id=subject_id,
+        month=month,
+        type=kind,
+        category=category,
+        project_id=project_id,
+        unit_id=unit_id,
+    )
+    if cell.update(
+        amount_minor=F("amount_minor") + amount, transactions=F("transactions") + count
+    ):
+        if count < 0:
+            cell.filter(transactions=0).delete()
+        return
+    if count <= 0:
+        return  # out of sync, see rebuild_rollups
+    try:
+        with transaction.atomic():
+            MonthlyRollup.objects.create(
+                zone_id=zone_id,
+                subject_id=subject_id,
+                month=month,
+                type=kind,
+                category=category,
+                project_id=project_id,
+                unit_id=unit_id,
+                amount_minor=amount,
+                transactions=count,
+            )
+    except IntegrityError:
+        # A concurrent writer created the cell first.
+        _apply(key, amount, count)
+
+
+def _apply_all(changes):
+    for key, (amount, count) in sorted(changes.items(), key=lambda item: str(item[0])):
+        if amount or count:
+            _apply(key, amount, count)
+
+
+def record_rollup_change(old, new):
+    """
+    Move a transaction's contribution in every ReportZone from its old
+    field values to the new ones (None: does not exist). Must run in the
+    transaction that writes the Transaction row.
+    """
+    zones = _zones()
+    changes = defaultdict(lambda: [0, 0])
+    for sign, values in ((-1, old), (1, new)):
+        for key, (amount, count) in rollup_entries(values, zones).items():
+            changes[key][0] += sign * amount
+            changes[key][1] += sign * count
+    _apply_all(changes)
+
+
+def apply_rollups(transactions, sign=1):
+    """Count transactions written with bulk_create() into the cube."""
+    zones = _zones()
+    changes = defaultdict(lambda: [0, 0])
+    for txn in transactions:
+        values = {name: getattr(txn, name) for name in ROLLUP_FIELDS}
+        for key, (amount, count) in rollup_entries(values, zones).items():
+            changes[key][0] += sign * amount
+            changes[key][1] += sign * count
+    _apply_all(changes)
+
+
+def rebuild_rollups(zones=None, subject_ids=None, batch_size=1000):
+    """
+    Recompute the cube from the transactions, for all ReportZones (or the
+    given ones) and all subjects (or the given ones). Rebuilding all
+    subjects marks the zones built.
+    """
+    zones = list(ReportZone.objects.all() if zones is None else zones)
+    transactions = Transaction.objects.order_by()
+    cells = MonthlyRollup.objects.filter(zone__in=zones)
+    if subject_ids is not None:
+        transactions = transactions.filter(subject__in=subject_ids)
+        cells = cells.filter(subject__in=subject_ids)
+
+    zone_infos = [(zone.pk, zoneinfo.ZoneInfo(zone.name)) for zone in zones]
+    with transaction.atomic():
+        # Delete before reading: the write lock taken here keeps writers
+        # (and their incremental record_rollup_change()) out until commit,
+        # so a transaction saved during the rebuild is neither missed nor
+        # counted twice.
+        cells.delete()
+        totals = defaultdict(lambda: [0, 0])
+        for values in transactions.values(*ROLLUP_FIELDS).iterator(chunk_size=5000):
+            for key, (amount, count) in rollup_entries(values, zone_infos).items():
+                totals[key][0] += amount
+                totals[key][1] += count
+        rows = MonthlyRollup.objects.bulk_create(
+            (
+                MonthlyRollup(
+                    zone_id=zone_id,
+                    subject_id=subject_id,
+                    month=month,
+                    type=kind,
+                    category=category,
+                    project_id=project_id,
+                    unit_id=unit_id,
+                    amount_minor=amount,
+                    transactions=count,
+                )
+                for (zone_id, subject_id, month, kind, category, project_id, unit_id), (
+                    amount,
+                    count,
+                ) in totals.items()
+            ),
+            batch_size=batch_size,
+        )
+        if subject_ids is None:
+            ReportZone.objects.filter(
+                pk__in=[zone.pk for zone in zones], built_at__isnull=True
+            ).update(built_at=timezone.now())
+    return len(rows)
+
+
+def ensure_zone(name):
+    """
+    The ReportZone for a time zone name. A new one is built by
+    build_report_zone_task, its cube is incomplete until built_at is set.
+    Called when a zone becomes wanted (see finances.signals and the
+    rebuild_rollups command), never while serving reports.
+    """
+    zoneinfo.ZoneInfo(name)  # ZoneInfoNotFoundError for unknown names
+    zone, created = ReportZone.objects.get_or_create(name=name)
+    if created:
+        from .tasks import build_report_zone_task
+
+        build_report_zone_task.using(
+            dedupe_key=f"finances:report-zone:{zone.pk}"
+        ).enqueue(zone.pk)
+    return zone
+
+
+def report_zone(name):
+    """
+    (zone, built) reports for the time zone name are read from: its own
+    zone once built, until then TIME_ZONE's if that one is; zone is None
+    while neither exists. Only zones in wanted_zones() are accepted
+    (ValueError otherwise). Read-only: zones are added by ensure_zone().
+    """
+    if name not in wanted_zones():
+        raise ValueError(f"Time zone {name!r} is not in use.")
+    zones = {
+        zone.name: zone
+        for zone in ReportZone.objects.filter(name__in={name, settings.TIME_ZONE})
+    }
+    zone = zones.get(name)
+    if zone is None or zone.built_at is None:
+        fallback = zones.get(settings.TIME_ZONE)
+        if fallback is not None and fallback.built_at is not None:
+            zone = fallback
+    return zone, zone is not None and zone.built_at is not None
+
+
+def zone_for(user):
+    """The user's UserPreferences.timezone, or TIME_ZONE."""
+    preferences = UserPreferences.objects.filter(user=user).first()
+    return preferences.timezone if preferences is not None else settings.TIME_ZONE
+
+
+def wanted_zones():
+    """Zones in use: TIME_ZONE and every UserPreferences.timezone."""
+    names = set(UserPreferences.objects.values_list("timezone", flat=True).distinct())
+    names.add(settings.TIME_ZONE)
+    return sorted(names)
+
+
+def _cell_filter(subject_ids, zone, start=None, end=None, **filters):
+    cells = MonthlyRollup.objects.filter(zone=zone, subject__in=subject_ids)
+    if start is not None:
+        cells = cells.filter(month__gte=start.replace(day=1))
+    if end is not None:
+        cells = cells.filter(month__lte=end)
+    for dimension, values in filters.items():
+        if values:
+            cells = cells.filter(**{f"{dimension}__in": values})
+    return cells
+
+
+def _dimension_value(row, dimension):
+    if dimension == "year":
+        return row["month"].year
+    value = row[dimension]
+    return value.isoformat() if isinstance(value, datetime.date) else value
+
+
+def pivot(subject_ids, zone, rows=("month",), columns=("category",), to_unit=None, **filters):
+    """
+    Sums from the cube, grouped by the rows and columns dimensions (see
+    DIMENSIONS). Without to_unit, unit is always grouped by too; with it,
+    every cell is converted at the rate of its month's last moment.
+    filters: start, end (dates), type, category, project, unit (lists).
+
+    Cost depends on the number of cube cells, not of transactions.
+    """
+    dimensions = list(dict.fromkeys([*rows, *columns]))
+    unknown = set(dimensions) - set(DIMENSIONS)
+    if unknown:
+        raise ValueError(f"Unknown dimensions {sorted(unknown)}")
+    fields = ["month" if dimension == "year" else dimension for dimension in dimensions]
+    # Conversion needs each cell's unit and month.
+    fields += ["unit", "unit__decimals"]
+    if to_unit is not None:
+        fields.append("month")
+    cells = list(
+        _cell_filter(subject_ids, zone, **filters)
+        .order_by()
+        .values(*dict.fromkeys(fields))
+        .annotate(total=Sum("amount_minor"), count=Sum("transactions"))
+    )
+    for cell in cells:
+        # Integers up to here, so the sums are exact.
+        cell["total"] = from_minor(cell["total"], cell["unit__decimals"])
+
+    if to_unit is not None:
+        from .rates import get_rate_table
+
+        table = get_rate_table()
+        tz = zoneinfo.ZoneInfo(zone.name)
+        ends = [
+            month_bounds(cell["month"], tz)[1] - datetime.timedelta(microseconds=1)
+            for cell in cells
+        ]
+        converted = table.convert(
+            [cell["total"] for cell in cells], [cell["unit"] for cell in cells], to_unit, ends
+        )
+        for cell, amount in zip(cells, converted):
+            cell["total"] = None if amount != amount else table.to_decimal(amount, to_unit)
+
+    row_keys, column_keys, values = {}, {}, defaultdict(dict)
+    for cell in cells:
+        row = tuple(_dimension_value(cell, dimension) for dimension in rows)
+        column = tuple(_dimension_value(cell, dimension) for dimension in columns)
+        if to_unit is None:
+            column += (cell["unit"],)
+        row_keys[row] = column_keys[column] = True
+        current = values[row].get(column, {"amount": Decimal(0), "transactions": 0})
+        if cell["total"] is None or current["amount"] is None:
+            current["amount"] = None  # no rate for some of it
+        else:
+            current["amount"] += cell["total"]
+        current["transactions"] += cell["count"]
+        values[row][column] = current
+
+    def ordered(keys):
+        return sorted(keys, key=lambda key: tuple((part is None, str(part)) for part in key))
+
+    return {
+        "rows": ordered(row_keys),
+        "columns": ordered(column_keys),
+        "values": values,
+    }
+
+
+def drilldown(subject_ids, zone, month, **filters):
+    """
+    Transactions behind one cube cell (or a set of cells): those of month
+    in zone, narrowed by type, category, project or unit lists.
+    """
+    start, end = month_bounds(month, zoneinfo.ZoneInfo(zone.name))
+    transactions = Transaction.objects.filter(
+        subject__in=subject_ids, occurred_at__gte=start, occurred_at__lt=end
+    )
+    for dimension, values in filters.items():
+        if values:
+            transactions = transactions.filter(**{f"{dimension}__in": values})
+    return transactions
@@ -0,0 +1,87 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .amounts import sync_amount_minor
+from .balances import ledger_values, rebuild_balances, record_ledger_change
+from .models import (
+    ExchangeRate,
+    Project,
+    SubjectUserAccess,
+    Transaction,
+    Unit,
+    UserPreferences,
+)
+from .permissions import subject_access_cache
+from .rates import rate_table_cache
+from .rollups import ROLLUP_FIELDS, ensure_zone, rebuild_rollups, record_rollup_change
+
+
+@receiver(post_delete, sender=Transaction)
+def transaction_deleted_recv(sender, instance, **kwargs):
+    # Sent inside the deletion's transaction, also for queryset deletes.
+    record_ledger_change(ledger_values(instance), None)
+    record_rollup_change({name: getattr(instance, name) for name in ROLLUP_FIELDS}, None)
+
+
+@receiver(post_delete, sender=Project)
+def project_deleted_recv(sender, instance, **kwargs):
+    # Its transactions were moved to "no project" by a queryset update.
+    rebuild_rollups(subject_ids=[instance.subject_id])
+
+
+@receiver(pre_save, sender=Unit)
+def unit_saving_recv(sender, instance, raw=False, **kwargs):
+    instance._stored_decimals = (
+        None
+        if raw or instance.pk is None
+        else Unit.objects.filter(pk=instance.pk).values_list("decimals", flat=True).first()
+    )
+    if not raw:
+        # Rescaling rounds amounts with more places, refuse that.
+        instance.check_decimals()
+
+
+@receiver(post_save, sender=Unit)
+def unit_saved_recv(sender, instance, created, **kwargs):
+    stored = getattr(instance, "_stored_decimals", None)
+    if created or stored is None or stored == instance.decimals:
+        return
+    # Minor units of this unit changed size: rescale everything counted in them.
+    transactions = Transaction.objects.filter(unit=instance).order_by()
+    sync_amount_minor(transactions)
+    sources = transactions.values_list("from_asset_source_id", "to_asset_source_id").distinct()
+    rebuild_balances({source for pair in sources for source in pair if source is not None})
+    rebuild_rollups(
+        subject_ids=list(transactions.values_list("subject_id", flat=True).distinct())
+    )
+
+
+@receiver(post_save, sender=ExchangeRate)
+@receiver(post_delete, sender=ExchangeRate)
+@receiver(post_save, sender=Unit)
+@receiver(post_delete, sender=Unit)
+def rates_changed_recv(sender, **kwargs):
+    transaction.on_commit(rate_table_cache.invalidate)
+
+
+@receiver(post_save, sender=SubjectUserAccess)
+@receiver(post_delete, sender=SubjectUserAccess)
+def subject_access_changed_recv(sender, **kwargs):
+    transaction.on_commit(subject_access_cache.invalidate)
+
+
+@receiver(post_save, sender=UserPreferences)
+def preferences_saved_recv(sender, instance, raw=False, **kwargs):
+    # Start building a newly preferred zone before its first report.
+    if raw:
+        return
+    name = instance.timezone
+
+    def ensure():
+        try:
+            ensure_zone(name)
+        except (KeyError, ValueError):
+            pass  # not a time zone, reports fall back to TIME_ZONE's
+
+    transaction.on_commit(ensure)
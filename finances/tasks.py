@@ -0,0 +1,77 @@
+import zoneinfo
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.tasks import task
+
+from jobs.models import Job
+from jobs.progress import report_progress
+
+from .imports import import_transactions
+from .models import AssetSource, OwningSubject, ReportZone
+from .rollups import rebuild_rollups
+
+# Private to the web and task worker processes, see FINANCE_IMPORT_DIR.
+import_storage = FileSystemStorage(location=settings.FINANCE_IMPORT_DIR, base_url=None)
+
+
+@task(takes_context=True, max_attempts=3, timeout=3600)
+def import_transactions_task(
+    context, name, subject_id, asset_source_id=None, fmt=None, encoding="utf-8-sig", tz=None
+):
+    """
+    Import an uploaded statement from import_storage and delete it when
+    done, or when the last attempt fails. Entries a failed attempt already
+    inserted are skipped as duplicates.
+    """
+    try:
+        summary = _import_upload(
+            context, name, subject_id, asset_source_id, fmt, encoding, tz
+        )
+    except Exception:
+        attempts, max_attempts = Job.objects.values_list("attempts", "max_attempts").get(
+            pk=context.task_result.id
+        )
+        if attempts >= max_attempts:
+            import_storage.delete(name)
+        raise
+    import_storage.delete(name)
+    return summary
+
+
+@task(max_attempts=3, timeout=3600)
+def build_report_zone_task(zone_id):
+    """Fill in the cube of a ReportZone added by ensure_zone."""
+    zone = ReportZone.objects.filter(pk=zone_id, built_at__isnull=True).first()
+    if zone is not None:
+        rebuild_rollups([zone])
+
+
+def _import_upload(context, name, subject_id, asset_source_id, fmt, encoding, tz):
+    subject = OwningSubject.objects.get(pk=subject_id)
+    asset_source = None
+    if asset_source_id is not None:
+        asset_source = AssetSource.objects.get(pk=asset_source_id, subject=subject)
+    size = import_storage.size(name)
+
+    with import_storage.open(name, "rb") as fileobj:
+
+        def on_batch(report):
+            report_progress(
+                context,
+                fileobj.tell(),
+                size,
+                f"Imported {report.created} transactions, {report.failed} errors",
+            )
+
+        report = import_transactions(
+            fileobj,
+            subject,
+            fmt=fmt,
+            name=name,
+            asset_source=asset_source,
+            encoding=encoding,
+            tz=zoneinfo.ZoneInfo(tz) if tz else None,
+            on_batch=on_batch,
+        )
+    return report.summary()
@@ -1,3 +1,390 @@
-from django.test import TestCase
+import datetime
+import io
+import json
+import zipfile
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.tasks import task_backends
+from django.tasks.base import TaskContext
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from jobs.models import Job
+
+from .balances import apply_transactions, balance_as_of, check_balances
+from .models import (
+    AssetSource,
+    DailyBalance,
+    OwningSubject,
+    ReportZone,
+    SubjectUserAccess,
+    Transaction,
+    Unit,
+    UserPreferences,
+)
+from .tasks import build_report_zone_task
+
+
+class TwoSubjectsTestCase(TestCase):
+    """Subjects A and B with three transactions each, a VIEWER of A."""
+
+    @classmethod
+    def setUpTestData(cls):
+        unit = Unit.objects.create(code="PLN", symbol="zł", name="Zloty", decimals=2)
+        cls.subjects = []
+        for name in ("A", "B"):
+            subject = OwningSubject.objects.create(name=name)
+            source = AssetSource.objects.create(
+                subject=subject, name=name, type="BANK_ACCOUNT", unit=unit
+            )
+            for day in range(1, 4):
+                Transaction.objects.create(
+                    subject=subject,
+                    title=f"{name}{day}",
+                    type="INCOME",
+                    amount=Decimal("1.00"),
+                    unit=unit,
+                    occurred_at=datetime.datetime(2025, 1, day, tzinfo=datetime.UTC),
+                    category="OTHER",
+                    to_asset_source=source,
+                )
+            cls.subjects.append(subject)
+        cls.user = get_user_model().objects.create_user("viewer", is_staff=True)
+        cls.user.user_permissions.set(
+            Permission.objects.filter(codename="view_transaction")
+        )
+        SubjectUserAccess.objects.create(
+            user=cls.user, subject=cls.subjects[0], role=SubjectUserAccess.Role.VIEWER
+        )
+
+    def setUp(self):
+        # Cached role maps would outlive the test's SubjectUserAccess rows.
+        cache.clear()
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class SubjectScopedExportTests(TwoSubjectsTestCase):
+    def test_export_matches_changelist(self):
+        self.client.force_login(self.user)
+        changelist = self.client.get(reverse("admin:finances_transaction_changelist"))
+        listed = set(changelist.context["cl"].queryset.values_list("id", flat=True))
+
+        response = self.client.get(
+            reverse("admin:export"), {"models": "finances.transaction"}
+        )
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+        exported = {
+            json.loads(line)["id"]
+            for name in archive.namelist()
+            if name != "manifest.json"
+            for line in archive.read(name).splitlines()
+            if line.strip()
+        }
+
+        self.assertEqual(exported, listed)
+        self.assertEqual(
+            listed,
+            set(
+                Transaction.objects.filter(subject=self.subjects[0]).values_list(
+                    "id", flat=True
+                )
+            ),
+        )
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class SubjectScopedBackgroundDeleteTests(TwoSubjectsTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user.user_permissions.add(
+            *Permission.objects.filter(codename="delete_transaction")
+        )
+        cls.editor = SubjectUserAccess.objects.create(
+            user=cls.user, subject=cls.subjects[1], role=SubjectUserAccess.Role.EDITOR
+        )
+
+    def run_jobs(self):
+        for job in Job.objects.order_by("pk"):
+            result = task_backends[job.backend].to_task_result(job)
+            yield result.task.call(TaskContext(task_result=result), *job.args, **job.kwargs)
+
+    def test_only_rows_with_the_delete_role_are_queued_and_deleted(self):
+        self.client.force_login(self.user)
+        editable = set(
+            Transaction.objects.filter(subject=self.subjects[1]).values_list("pk", flat=True)
+        )
+        self.client.post(
+            reverse("admin:finances_transaction_changelist"),
+            {
+                "action": "delete_selected_in_background",
+                "_selected_action": list(Transaction.objects.values_list("pk", flat=True)),
+            },
+        )
+        job = Job.objects.get()
+        self.assertEqual({int(pk) for pk in job.args[1]}, editable)
+        self.assertEqual(job.args[2], self.user.pk)
+
+        # Checked again when the job runs.
+        self.editor.role = SubjectUserAccess.Role.VIEWER
+        with self.captureOnCommitCallbacks(execute=True):
+            self.editor.save()
+        self.assertEqual(list(self.run_jobs()), [{"deleted": 0, "skipped": 3}])
+        self.assertEqual(Transaction.objects.count(), 6)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    TIME_ZONE="UTC",
+)
+class ReportZoneTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser("admin")
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def report(self, **params):
+        return self.client.get(reverse("finances:report_pivot_api"), params)
+
+    def test_unwanted_zone_is_rejected(self):
+        self.assertEqual(self.report(timezone="Asia/Tokyo").status_code, 400)
+        self.assertFalse(ReportZone.objects.filter(name="Asia/Tokyo").exists())
+
+    def test_report_does_not_add_zones(self):
+        self.assertEqual(self.report(timezone="UTC").status_code, 503)
+        self.assertFalse(ReportZone.objects.exists())
+        self.assertFalse(Job.objects.exists())
+
+        call_command("rebuild_rollups", "--queue-missing", stdout=io.StringIO())
+        zone = ReportZone.objects.get(name="UTC")
+        self.assertTrue(
+            Job.objects.filter(dedupe_key=f"finances:report-zone:{zone.pk}").exists()
+        )
+
+    def test_new_zone_is_built_in_the_background(self):
+        call_command("rebuild_rollups", stdout=io.StringIO())
+        with self.captureOnCommitCallbacks(execute=True):
+            UserPreferences.objects.create(user=self.user, timezone="Asia/Tokyo")
+        zone = ReportZone.objects.get(name="Asia/Tokyo")
+        self.assertIsNone(zone.built_at)
+        self.assertTrue(
+            Job.objects.filter(dedupe_key=f"finances:report-zone:{zone.pk}").exists()
+        )
+
+        self.assertEqual(self.report().json()["timezone"], "UTC")
+        build_report_zone_task.call(zone.pk)
+        self.assertEqual(self.report().json()["timezone"], "Asia/Tokyo")
+
+
+@override_settings(TIME_ZONE="UTC")
+class LedgerTestCase(TestCase):
+    """A PLN wallet and bank account of one subject."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.unit = Unit.objects.create(code="PLN", symbol="zł", name="Zloty", decimals=2)
+        cls.subject = OwningSubject.objects.create(name="A")
+        cls.wallet, cls.bank = (
+            AssetSource.objects.create(
+                subject=cls.subject, name=name, type="BANK_ACCOUNT", unit=cls.unit
+            )
+            for name in ("wallet", "bank")
+        )
+
+    def transaction(self, day, amount, kind="INCOME", **fields):
+        return Transaction(
+            subject=self.subject,
+            title=f"{kind} {amount}",
+            type=kind,
+            amount=Decimal(amount),
+            unit=self.unit,
+            occurred_at=datetime.datetime(2025, 1, day, 12, tzinfo=datetime.UTC),
+            category="OTHER",
+            **fields,
+        )
+
+    def income(self, day, amount, source=None):
+        txn = self.transaction(day, amount, to_asset_source=source or self.wallet)
+        txn.save()
+        return txn
+
+    def ledger(self, source):
+        return list(
+            DailyBalance.objects.filter(asset_source=source).values_list(
+                "date__day", "delta_minor", "balance_minor", "transactions"
+            )
+        )
+
+
+class DailyBalanceTests(LedgerTestCase):
+    def tearDown(self):
+        # Every change must leave the ledger as a rebuild would.
+        report = check_balances()
+        self.assertEqual((report.mismatched, report.mismatches), (0, []))
+
+    def test_create_shifts_later_days(self):
+        self.income(5, "10.00")
+        self.income(3, "1.00")
+        self.income(5, "0.50")
+        self.assertEqual(self.ledger(self.wallet), [(3, 100, 100, 1), (5, 1050, 1150, 2)])
+        self.assertEqual(balance_as_of(self.wallet, datetime.date(2025, 1, 4)), Decimal("1.00"))
+
+    def test_edit_moves_amount_and_day(self):
+        self.income(3, "1.00")
+        txn = self.income(5, "10.00")
+        txn.amount = Decimal("2.00")
+        txn.occurred_at = datetime.datetime(2025, 1, 1, tzinfo=datetime.UTC)
+        txn.save()
+        self.assertEqual(self.ledger(self.wallet), [(1, 200, 200, 1), (3, 100, 300, 1)])
+
+    def test_delete_drops_emptied_days(self):
+        txn = self.income(3, "1.00")
+        self.income(5, "10.00")
+        txn.delete()
+        self.assertEqual(self.ledger(self.wallet), [(5, 1000, 1000, 1)])
+
+    def test_moving_to_another_asset_source(self):
+        txn = self.income(3, "1.00")
+        txn.to_asset_source = self.bank
+        txn.save()
+        self.assertEqual(self.ledger(self.wallet), [])
+        self.assertEqual(self.ledger(self.bank), [(3, 100, 100, 1)])
+
+        transfer = self.transaction(
+            4, "0.40", "TRANSFER", from_asset_source=self.bank, to_asset_source=self.wallet
+        )
+        transfer.save()
+        self.assertEqual(self.ledger(self.bank), [(3, 100, 100, 1), (4, -40, 60, 1)])
+        self.assertEqual(self.ledger(self.wallet), [(4, 40, 40, 1)])
+
+    def test_bulk_created_transactions(self):
+        self.income(4, "1.00")
+        created = Transaction.objects.bulk_create(
+            [
+                self.transaction(day, "1.00", to_asset_source=self.wallet, amount_minor=100)
+                for day in (2, 4, 6)
+            ]
+        )
+        apply_transactions(created)
+        self.assertEqual(
+            self.ledger(self.wallet), [(2, 100, 100, 1), (4, 200, 300, 2), (6, 100, 400, 1)]
+        )
+
+
+class AmountMinorTests(LedgerTestCase):
+    def test_amount_with_more_places_than_its_unit_is_refused(self):
+        txn = self.transaction(3, "1.005", to_asset_source=self.wallet)
+        with self.assertRaisesMessage(ValidationError, "PLN allows at most 2 decimal places"):
+            txn.full_clean()
+
+    def test_lowering_decimals_that_would_round_is_refused(self):
+        self.income(3, "1.50")
+        self.unit.decimals = 0
+        with self.assertRaisesMessage(ValueError, "more than 0 decimal places"):
+            self.unit.save()
+        self.assertEqual(Unit.objects.get(pk=self.unit.pk).decimals, 2)
+        self.assertEqual(Transaction.objects.get().amount_minor, 150)
+
+    def test_rescale_round_trip(self):
+        self.income(3, "1.50")
+        day = datetime.date(2025, 1, 3)
+        for decimals, minor in ((4, 15000), (2, 150)):
+            self.unit.decimals = decimals
+            self.unit.save()
+            self.assertEqual(Transaction.objects.get().amount_minor, minor)
+            self.assertEqual(DailyBalance.objects.get().balance_minor, minor)
+            self.assertEqual(balance_as_of(self.wallet, day), Decimal("1.50"))
+            self.assertEqual(check_balances().mismatched, 0)
+
+
+@override_settings(TIME_ZONE="UTC")
+class AmountMinorMigrationTests(TransactionTestCase):
+    """0007 fills amount_minor and rebuilds the ledger in minor units."""
+
+    migrate_from = [("finances", "0006_transaction_list_indexes")]
+    migrate_to = [("finances", "0007_amount_minor")]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_from)
+        self.apps = executor.loader.project_state(self.migrate_from).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def migrate(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_to)
+        return executor.loader.project_state(self.migrate_to).apps
+
+    def seed(self, *amounts):
+        Unit = self.apps.get_model("finances", "Unit")
+        AssetSource = self.apps.get_model("finances", "AssetSource")
+        Transaction = self.apps.get_model("finances", "Transaction")
+        unit = Unit.objects.create(code="PLN", symbol="zł", name="Zloty", decimals=2)
+        subject = self.apps.get_model("finances", "OwningSubject").objects.create(name="A")
+        wallet, bank = (
+            AssetSource.objects.create(subject=subject, name=name, type="BANK_ACCOUNT", unit=unit)
+            for name in ("wallet", "bank")
+        )
+        kinds = {
+            "INCOME": {"to_asset_source": wallet},
+            "TRANSFER": {"from_asset_source": wallet, "to_asset_source": bank},
+            "EXPENSE": {"from_asset_source": wallet},
+        }
+        for day, (kind, amount) in enumerate(amounts, start=1):
+            Transaction.objects.create(
+                subject=subject,
+                title=kind,
+                type=kind,
+                amount=Decimal(amount),
+                unit=unit,
+                occurred_at=datetime.datetime(2025, 1, day, 12, tzinfo=datetime.UTC),
+                category="OTHER",
+                **kinds[kind],
+            )
+        return wallet.pk, bank.pk
+
+    def test_backfill_matches_the_amounts(self):
+        wallet, bank = self.seed(("INCOME", "10.50"), ("TRANSFER", "2.25"), ("EXPENSE", "1.01"))
+        apps = self.migrate()
+        self.assertEqual(
+            list(
+                apps.get_model("finances", "Transaction")
+                .objects.order_by("occurred_at")
+                .values_list("amount_minor", flat=True)
+            ),
+            [1050, 225, 101],
+        )
+        self.assertEqual(
+            list(
+                apps.get_model("finances", "DailyBalance")
+                .objects.order_by("asset_source", "date")
+                .values_list("asset_source", "date__day", "delta_minor", "balance_minor")
+            ),
+            [
+                (wallet, 1, 1050, 1050),
+                (wallet, 2, -225, 825),
+                (wallet, 3, -101, 724),
+                (bank, 2, 225, 225),
+            ],
+        )
+
+    def test_amounts_that_would_round_stop_the_migration(self):
+        self.seed(("INCOME", "10.50"), ("EXPENSE", "1.005"))
+        with self.assertRaisesMessage(RuntimeError, "1 transactions have more decimal places"):
+            self.migrate()
+        # Fixed by hand, so tearDown can migrate forward.
+        self.apps.get_model("finances", "Transaction").objects.filter(
+            amount=Decimal("1.005")
+        ).update(amount=Decimal("1.01"))
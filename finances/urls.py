@@ -6,4 +6,13 @@ from . import views
 
 app_name = "finance"
 
-urlpatterns = []
+urlpatterns = [
+    path("transactions/", views.transaction_list, name="transaction_list"),
+    path("api/report/", views.report_pivot_api, name="report_pivot_api"),
+    path("api/net-worth/", views.net_worth_api, name="net_worth_api"),
+    path(
+        "api/report/transactions/",
+        views.report_transactions_api,
+        name="report_transactions_api",
+    ),
+]
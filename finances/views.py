@@ -0,0 +1,334 @@
+import datetime
+import zoneinfo
+
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.template.response import TemplateResponse
+
+from .listing import Cursor, transaction_page, transaction_querysets
+from .networth import FREQUENCIES, first_transaction_date, net_worth_series, period_count
+from .models import AssetSource, OwningSubject, Project, Transaction, Unit
+from .permissions import subject_access
+from .rates import default_unit_for
+from .rollups import DIMENSIONS, drilldown, pivot, report_zone, zone_for
+
+DRILLDOWN_LIMIT = 500
+# Points a net worth series may have, e.g. about 27 years of days.
+NET_WORTH_MAX_POINTS = 10000
+
+
+def _subject_ids(request):
+    """Subjects the user may see, narrowed by ?subject=1&subject=2."""
+    visible = subject_access(request).subject_ids()
+    if visible is None:
+        visible = OwningSubject.objects.values_list("id", flat=True)
+    visible = set(visible)
+    wanted = {int(value) for value in request.GET.getlist("subject") if value.isdigit()}
+    return sorted(visible & wanted if wanted else visible)
+
+
+def _month(value):
+    """date of "2025-03" or "2025-03-17", None when missing."""
+    if not value:
+        return None
+    return datetime.date.fromisoformat(value if len(value) > 7 else f"{value}-01")
+
+
+def _int_list(request, name):
+    return [int(value) for value in request.GET.getlist(name) if value.isdigit()]
+
+
+def _report_args(request):
+    """Zone, whether it is built and cube filters shared by the report endpoints."""
+    zone, built = report_zone(request.GET.get("timezone") or zone_for(request.user))
+    filters = {
+        "type": request.GET.getlist("type"),
+        "category": request.GET.getlist("category"),
+        "project": _int_list(request, "project"),
+        "unit": _int_list(request, "unit"),
+    }
+    return zone, built, filters
+
+
+def _bad_request(message):
+    return JsonResponse({"error": message}, status=400)
+
+
+@login_required
+def report_pivot_api(request) -> JsonResponse:
+    """
+    Finance report from the monthly rollup cube.
+
+    ?rows=month&columns=category (any of subject, month, year, type,
+    category, project, unit; repeatable), ?start=2025-01&end=2025-12,
+    ?type= ?category= ?project= ?unit= ?subject= filters, ?to_unit=<id> to
+    convert everything to one unit, ?timezone= to bucket months in another
+    zone some user prefers. A zone is answered from TIME_ZONE's cube until
+    its own is built, and with a 503 while neither is.
+    Returns:
+        {
+        "timezone": "Europe/Warsaw",
+        "rows": [["2025-01-01"], ...],
+        "columns": [["FOOD_GROCERIES", 1], ...],
+        "cells": [[{"amount": "12.50", "transactions": 3} | null, ...], ...]
+        }
+    Without to_unit, each column key ends with the unit id.
+    """
+    rows = request.GET.getlist("rows") or ["month"]
+    columns = request.GET.getlist("columns") or ["category"]
+    if not set(rows + columns) <= set(DIMENSIONS):
+        return _bad_request(f"Dimensions are {', '.join(DIMENSIONS)}.")
+    try:
+        zone, built, filters = _report_args(request)
+        start, end = _month(request.GET.get("start")), _month(request.GET.get("end"))
+    except (KeyError, ValueError):
+        return _bad_request("Invalid timezone or month.")
+    if not built:
+        response = JsonResponse({"error": "The report is being prepared."}, status=503)
+        response["Retry-After"] = "30"
+        return response
+    to_unit = request.GET.get("to_unit")
+
+    report = pivot(
+        _subject_ids(request),
+        zone,
+        rows=rows,
+        columns=columns,
+        to_unit=int(to_unit) if to_unit and to_unit.isdigit() else None,
+        start=start,
+        end=end,
+        **filters,
+    )
+    cells = []
+    for row in report["rows"]:
+        values = report["values"][row]
+        line = []
+        for column in report["columns"]:
+            cell = values.get(column)
+            if cell is not None:
+                amount = cell["amount"]
+                cell = {
+                    "amount": None if amount is None else str(amount),
+                    "transactions": cell["transactions"],
+                }
+            line.append(cell)
+        cells.append(line)
+    return JsonResponse(
+        {
+            "timezone": zone.name,
+            "rows": report["rows"],
+            "columns": report["columns"],
+            "cells": cells,
+        }
+    )
+
+
+@login_required
+def report_transactions_api(request) -> JsonResponse:
+    """
+    Drill-down: the transactions behind report cells.
+
+    ?month=2025-03 (required) plus the filters of report_pivot_api and
+    ?limit= (at most DRILLDOWN_LIMIT), newest first.
+    """
+    try:
+        zone, _, filters = _report_args(request)
+        month = _month(request.GET.get("month"))
+    except (KeyError, ValueError):
+        return _bad_request("Invalid timezone or month.")
+    if month is None:
+        return _bad_request("month is required.")
+    limit = request.GET.get("limit", "")
+    limit = min(int(limit), DRILLDOWN_LIMIT) if limit.isdigit() else 100
+
+    tz = zoneinfo.ZoneInfo(zone.name)
+    transactions = drilldown(_subject_ids(request), zone, month, **filters).values(
+        "id",
+        "title",
+        "type",
+        "category",
+        "amount",
+        "unit_id",
+        "project_id",
+        "occurred_at",
+        "from_asset_source_id",
+        "to_asset_source_id",
+    )[: limit + 1]
+    items = [
+        dict(
+            item,
+            amount=str(item["amount"]),
+            occurred_at=item["occurred_at"].astimezone(tz).isoformat(),
+        )
+        for item in transactions
+    ]
+    return JsonResponse(
+        {"timezone": zone.name, "transactions": items[:limit], "more": len(items) > limit}
+    )
+
+
+def _int(value):
+    return int(value) if value and value.isdigit() else None
+
+
+def _date(value):
+    try:
+        return datetime.date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+@login_required
+def transaction_list(request):
+    """
+    Transactions newest first, filtered by ?subject_id= ?asset_source_id=
+    ?category= ?project_id= ?start= ?end= (dates, inclusive, in the user's
+    time zone), paged with a keyset ?cursor=.
+
+    Every page costs the same few index range scans however deep it is,
+    and nothing is counted. Running totals are carried in the cursor, or
+    for a single asset source read from its daily ledger.
+    """
+    access = subject_access(request)
+    subjects = access.filter(OwningSubject.objects.all())
+    projects = access.filter(Project.objects.order_by("name"))
+    asset_sources = access.filter(AssetSource.objects.order_by("name"))
+
+    visible = access.subject_ids()
+    subject_ids = None if visible is None else sorted(visible)
+    subject_id = _int(request.GET.get("subject_id"))
+    if subject_id is not None:
+        subject_ids = [subject_id] if access.allows(subject_id) else []
+    project_id = _int(request.GET.get("project_id"))
+    project = projects.filter(pk=project_id).first() if project_id else None
+    asset_source_id = _int(request.GET.get("asset_source_id"))
+    asset_source = asset_sources.filter(pk=asset_source_id).first() if asset_source_id else None
+    category = request.GET.get("category")
+    if category not in Transaction.Category.values:
+        category = None
+
+    tz = zoneinfo.ZoneInfo(zone_for(request.user))
+    start, end = _date(request.GET.get("start")), _date(request.GET.get("end"))
+    if start is not None:
+        start = datetime.datetime.combine(start, datetime.time(), tzinfo=tz)
+    if end is not None:
+        end = datetime.datetime.combine(
+            end + datetime.timedelta(days=1), datetime.time(), tzinfo=tz
+        )
+
+    unknown = (project_id and project is None) or (asset_source_id and asset_source is None)
+    querysets = (
+        []
+        if unknown
+        else transaction_querysets(
+            subject_ids,
+            asset_source=asset_source,
+            category=category,
+            project=project,
+            start=start,
+            end=end,
+        )
+    )
+    page = transaction_page(
+        querysets,
+        Cursor.loads(request.GET.get("cursor")),
+        asset_source=asset_source,
+        # Balances only make sense over all of the asset source's rows.
+        balances=category is None and project is None,
+    )
+
+    def page_url(cursor):
+        if cursor is None:
+            return None
+        query = request.GET.copy()
+        query["cursor"] = cursor.dumps()
+        return f"?{query.urlencode()}"
+
+    return TemplateResponse(
+        request,
+        "finance/transaction_list.html",
+        {
+            "subjects": subjects.order_by("name"),
+            "projects": projects,
+            "asset_sources": asset_sources,
+            "categories": Transaction.Category.choices,
+            "transactions": page.transactions,
+            "page": page,
+            "next_url": page_url(page.next_cursor),
+            "previous_url": page_url(page.previous_cursor),
+        },
+    )
+
+
+def _chart_values(values):
+    return [None if value != value else float(value) for value in values]
+
+
+@login_required
+def net_worth_api(request) -> JsonResponse:
+    """
+    Net worth of one owning subject over time, for charting.
+
+    ?subject=<id> (required), ?unit=<id> (default: the user's default
+    unit), ?frequency=day|week|month, ?start=&end= (dates in the user's
+    time zone), ?accounts=1 for a series per asset source and unit too.
+    Returns:
+        {
+        "unit": "PLN",
+        "frequency": "month",
+        "periods": ["2025-01-01", ...],
+        "total": [1234.5, null, ...],
+        "accounts": [{"asset_source": 3, "name": "Main", "unit": "EUR",
+                      "values": [...]}, ...]
+        }
+    Values are as of each period's end; null where a rate is missing.
+    """
+    subject_id = _int(request.GET.get("subject"))
+    if subject_id is None or not subject_access(request).allows(subject_id):
+        return _bad_request("subject is required.")
+    subject = OwningSubject.objects.filter(pk=subject_id).first()
+    if subject is None:
+        return _bad_request("subject is required.")
+    unit = Unit.objects.filter(
+        pk=_int(request.GET.get("unit")) or default_unit_for(request.user)
+    ).first()
+    if unit is None:
+        return _bad_request("unit is required.")
+    frequency = request.GET.get("frequency") or "month"
+    if frequency not in FREQUENCIES:
+        return _bad_request(f"frequency is one of {', '.join(FREQUENCIES)}.")
+    tz = zone_for(request.user)
+    start, end = _date(request.GET.get("start")), _date(request.GET.get("end"))
+    # Defaults of net_worth_series(), resolved here to size the series first.
+    if end is None:
+        end = datetime.datetime.now(zoneinfo.ZoneInfo(tz)).date()
+    if start is None:
+        start = first_transaction_date(subject, zoneinfo.ZoneInfo(tz)) or end
+    try:
+        points = period_count(start, end, frequency)
+    except ValueError as exc:
+        return _bad_request(str(exc))
+    if points > NET_WORTH_MAX_POINTS:
+        return _bad_request("Too many points, use a coarser frequency.")
+
+    series = net_worth_series(subject, unit, start=start, end=end, frequency=frequency, tz=tz)
+
+    data = {
+        "unit": unit.code,
+        "frequency": frequency,
+        "periods": [day.isoformat() for day in series.periods],
+        "total": _chart_values(series.totals),
+    }
+    if request.GET.get("accounts"):
+        names = dict(AssetSource.objects.filter(subject=subject).values_list("id", "name"))
+        codes = dict(Unit.objects.values_list("id", "code"))
+        data["accounts"] = [
+            {
+                "asset_source": asset_source_id,
+                "name": names.get(asset_source_id, ""),
+                "unit": codes.get(unit_id, ""),
+                "values": _chart_values(values),
+            }
+            for (asset_source_id, unit_id), values in sorted(series.accounts.items())
+        ]
+    return JsonResponse(data)
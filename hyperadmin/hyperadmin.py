@@ -5,6 +5,8 @@ from django.template.response import TemplateResponse
 from django.http import JsonResponse
 from django.urls import reverse
 
+from hyperadmin.search import AdminSearchEngine
+
 logger = logging.getLogger(__name__)
 
 
@@ -39,6 +41,7 @@ class HyperadminSite(AdminSite):
         self._extra_sidebar_modules = []  # add_module()
         self._realms = []
         self._global_search_providers: list = []
+        self.search_engine = AdminSearchEngine(self)
 
     # ---------------------------------------------------------
     #  HOOK #1: EXTRA ADMIN VIEWS (custom URLs)
@@ -200,15 +203,9 @@ class HyperadminSite(AdminSite):
     def _get_object_content(self, obj):
         """
         Try to extract a reasonable 'content' snippet for an object.
-        Adjust this to your needs (add fields, etc.).
+        See AdminSearchEngine.get_object_content.
         """
-        candidate_fields = ["description", "content", "body", "text"]
-        for field in candidate_fields:
-            if hasattr(obj, field):
-                val = getattr(obj, field)
-                if isinstance(val, str) and val.strip():
-                    return val[:500]
-        return str(obj)
+        return self.search_engine.get_object_content(obj)
 
     def global_search_api(self, request):
         """
@@ -234,34 +231,14 @@ class HyperadminSite(AdminSite):
             return JsonResponse({"results": []})
 
         # 1) Search in all admin-registered models with search_fields
-        for model, model_admin in self._registry.items():
-            search_fields = model_admin.get_search_fields(request)
-            if not search_fields:
-                continue
-
-            qs = model_admin.get_queryset(request)
-            qs, use_distinct = model_admin.get_search_results(request, qs, query)
-            if use_distinct:
-                qs = qs.distinct()
-
-            if not qs.exists():
-                continue
-
-            opts = model._meta
-            change_url_name = f"admin:{opts.app_label}_{opts.model_name}_change"
-
-            for obj in qs[:5]:  # limit per model
-                title = opts.object_name
-                content = self._get_object_content(obj)
-                url = reverse(change_url_name, args=[obj.pk])
-
-                results.append(
-                    {
-                        "title": title,
-                        "content": content,
-                        "url": url,
-                    }
-                )
+        for item in self.search_engine.search(request, query):
+            results.append(
+                {
+                    "title": item["title"],
+                    "content": item["content"],
+                    "url": item["url"],
+                }
+            )
 
         # 2) Extra providers for non-admin search (optional)
         for provider in getattr(self, "_global_search_providers", []):
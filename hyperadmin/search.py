@@ -0,0 +1,280 @@
+import inspect
+import logging
+import re
+from dataclasses import dataclass, field
+
+from django.db import models
+from django.db.models import Case, IntegerField, Value, When
+from django.db.models.functions import Greatest, Substr
+from django.urls import NoReverseMatch, reverse
+
+logger = logging.getLogger(__name__)
+
+SNIPPET_FIELDS = ["description", "content", "body", "text"]
+SNIPPET_LENGTH = 500
+SNIPPET_ANNOTATION = "_hyperadmin_snippet"
+RANK_ANNOTATION = "_hyperadmin_rank"
+
+_SELF_ATTR_RE = re.compile(r"self\.(\w+)")
+_DISPLAY_RE = re.compile(r"^get_(\w+)_display$")
+
+
+@dataclass
+class SearchPlan:
+    """
+    How to load a model for search results: which FKs to join, which local
+    columns are needed by __str__ and the search fields, where the snippet
+    comes from and which text columns rank rows in SQL. only is None when
+    __str__ could not be analysed, in which case every column is loaded.
+    """
+
+    related: list = field(default_factory=list)
+    only: list | None = None
+    snippet_field: str | None = None
+    snippet_in_sql: bool = False
+    search_columns: list = field(default_factory=list)
+    rank_columns: list = field(default_factory=list)
+
+
+def _str_references(model, depth=2, prefix=""):
+    """
+    Inspect model.__str__ and return (local_field_names, related_paths) it
+    touches, or None if the method can't be read or uses attributes that are
+    not plain fields (properties, helper methods).
+    """
+    method = model.__str__
+    if method is models.Model.__str__:
+        return set(), set()
+    try:
+        source = inspect.getsource(method)
+    except (OSError, TypeError):
+        return None
+
+    local = set()
+    related = set()
+    for attr in set(_SELF_ATTR_RE.findall(source)):
+        if attr == "pk":
+            continue
+        display = _DISPLAY_RE.match(attr)
+        if display:
+            attr = display.group(1)
+        try:
+            model_field = model._meta.get_field(attr)
+        except Exception:
+            return None
+        if not model_field.concrete:
+            return None
+        local.add(model_field.name)
+        if model_field.is_relation and (
+            model_field.many_to_one or model_field.one_to_one
+        ):
+            path = f"{prefix}{model_field.name}"
+            related.add(path)
+            if depth > 1:
+                nested = _str_references(
+                    model_field.related_model, depth - 1, prefix=f"{path}__"
+                )
+                if nested is not None:
+                    related.update(nested[1])
+    return local, related
+
+
+def _local_search_fields(model, search_fields):
+    names = set()
+    for search_field in search_fields:
+        name = search_field.lstrip("^=@")
+        if "__" in name:
+            continue
+        try:
+            model_field = model._meta.get_field(name)
+        except Exception:
+            continue
+        if model_field.concrete and not model_field.is_relation:
+            names.add(model_field.name)
+    return names
+
+
+def _is_text_field(model, name):
+    return isinstance(model._meta.get_field(name), (models.CharField, models.TextField))
+
+
+def _snippet_field(model):
+    for name in SNIPPET_FIELDS:
+        try:
+            model_field = model._meta.get_field(name)
+        except Exception:
+            continue
+        if isinstance(model_field, (models.CharField, models.TextField)):
+            return name
+    return None
+
+
+def rank_expression(columns, query):
+    """
+    SQL approximation of score_match(): exact > prefix > substring match in
+    any of columns, so the best rows survive the per-model cap.
+    """
+    ranks = [
+        Case(
+            When(**{f"{column}__iexact": query}, then=Value(3)),
+            When(**{f"{column}__istartswith": query}, then=Value(2)),
+            When(**{f"{column}__icontains": query}, then=Value(1)),
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+        for column in columns
+    ]
+    return ranks[0] if len(ranks) == 1 else Greatest(*ranks)
+
+
+def score_match(query: str, texts) -> float:
+    """
+    Cheap relevance score shared by all models, so results from different
+    models can be merged into one order. Exact > prefix > word > substring,
+    earlier and shorter matches rank higher.
+    """
+    needle = query.lower()
+    best = 0.0
+    for text in texts:
+        if not text:
+            continue
+        haystack = str(text).lower()
+        position = haystack.find(needle)
+        if position < 0:
+            continue
+        if haystack == needle:
+            score = 100.0
+        elif position == 0:
+            score = 60.0
+        elif not haystack[position - 1].isalnum():
+            score = 40.0
+        else:
+            score = 20.0
+        score += 10.0 * len(needle) / len(haystack)
+        score -= min(position, 500) / 100.0
+        best = max(best, score)
+    return best
+
+
+class AdminSearchEngine:
+    """
+    Global search over every model registered on an admin site that defines
+    search_fields. Each model gets one bounded query (no exists() pre-check),
+    loads only the columns needed to render the result, joins the FKs used
+    by __str__ and returns results merged across models by relevance.
+    """
+
+    def __init__(self, admin_site, per_model_limit=5, total_limit=200):
+        self.admin_site = admin_site
+        self.per_model_limit = per_model_limit
+        self.total_limit = total_limit
+        self._plans = {}
+
+    def get_plan(self, model, search_fields) -> SearchPlan:
+        key = (model, tuple(search_fields))
+        plan = self._plans.get(key)
+        if plan is not None:
+            return plan
+
+        plan = SearchPlan(
+            snippet_field=_snippet_field(model),
+            search_columns=sorted(_local_search_fields(model, search_fields)),
+        )
+        plan.rank_columns = [
+            name for name in plan.search_columns if _is_text_field(model, name)
+        ]
+        references = _str_references(model)
+        if references is not None:
+            local, related = references
+            plan.related = sorted(related)
+            only = {model._meta.pk.name}
+            only |= local
+            only |= set(plan.search_columns)
+            # A column loaded anyway (for __str__ or scoring) is cut in
+            # Python; otherwise only the snippet's prefix leaves the DB.
+            plan.snippet_in_sql = (
+                plan.snippet_field is not None and plan.snippet_field not in only
+            )
+            plan.only = sorted(only)
+        else:
+            logger.debug(
+                "[Hyperadmin] cannot analyse %s.__str__, loading all columns",
+                model._meta.label,
+            )
+
+        self._plans[key] = plan
+        return plan
+
+    def get_object_content(self, obj, plan: SearchPlan | None = None, text=None):
+        if plan is not None and plan.snippet_in_sql:
+            value = getattr(obj, SNIPPET_ANNOTATION, None)
+        elif plan is not None and plan.snippet_field:
+            value = getattr(obj, plan.snippet_field, None)
+        else:
+            value = None
+            for name in SNIPPET_FIELDS:
+                candidate = getattr(obj, name, None)
+                if isinstance(candidate, str) and candidate.strip():
+                    value = candidate
+                    break
+        if isinstance(value, str) and value.strip():
+            return value[:SNIPPET_LENGTH]
+        return text if text is not None else str(obj)
+
+    def search_model(self, request, model, model_admin, query):
+        search_fields = model_admin.get_search_fields(request)
+        if not search_fields:
+            return []
+
+        qs = model_admin.get_queryset(request)
+        qs, use_distinct = model_admin.get_search_results(request, qs, query)
+        if use_distinct:
+            qs = qs.distinct()
+
+        plan = self.get_plan(model, search_fields)
+        if plan.related:
+            qs = qs.select_related(*plan.related)
+        if plan.only is not None:
+            qs = qs.only(*plan.only)
+        if plan.snippet_in_sql:
+            qs = qs.annotate(
+                **{SNIPPET_ANNOTATION: Substr(plan.snippet_field, 1, SNIPPET_LENGTH)}
+            )
+        if plan.rank_columns:
+            # Best matches first, so the cap below keeps them.
+            qs = qs.annotate(
+                **{RANK_ANNOTATION: rank_expression(plan.rank_columns, query)}
+            ).order_by(
+                f"-{RANK_ANNOTATION}", *(qs.query.order_by or model._meta.ordering), "pk"
+            )
+
+        opts = model._meta
+        change_url_name = f"admin:{opts.app_label}_{opts.model_name}_change"
+
+        results = []
+        for obj in qs[: self.per_model_limit]:
+            text = str(obj)
+            content = self.get_object_content(obj, plan, text)
+            try:
+                url = reverse(change_url_name, args=[obj.pk])
+            except NoReverseMatch:
+                continue
+            results.append(
+                {
+                    "title": opts.object_name,
+                    "content": content,
+                    "url": url,
+                    "score": score_match(
+                        query, [text, *(getattr(obj, f) for f in plan.search_columns)]
+                    ),
+                }
+            )
+        return results
+
+    def search(self, request, query):
+        results = []
+        for model, model_admin in self.admin_site._registry.items():
+            results.extend(self.search_model(request, model, model_admin, query))
+        # sort() is stable: ties keep registry order.
+        results.sort(key=lambda item: item["score"], reverse=True)
+        return results[: self.total_limit]
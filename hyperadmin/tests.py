@@ -1,3 +1,41 @@
-from django.test import TestCase
+from django.contrib import admin
+from django.test import RequestFactory, TestCase
 
-# Create your tests here.
+from common.models import CustomizedUser
+from infobjects.models import Note
+
+from .admin import hyperadmin as site
+from .search import AdminSearchEngine
+
+
+class NoteSearchAdmin(admin.ModelAdmin):
+    search_fields = ("title", "content")
+
+
+class AdminSearchEngineTests(TestCase):
+    def setUp(self):
+        self.request = RequestFactory().get("/")
+        self.request.user = CustomizedUser.objects.create_superuser(
+            "admin", "admin@example.com", "pw"
+        )
+        self.engine = AdminSearchEngine(site, per_model_limit=2)
+        self.model_admin = NoteSearchAdmin(Note, site)
+
+    def search(self, query):
+        return self.engine.search_model(self.request, Note, self.model_admin, query)
+
+    def test_searched_snippet_column_is_loaded_with_the_rows(self):
+        for i in range(3):
+            Note.objects.create(title=f"note {i}", content=f"apple {i}")
+        with self.assertNumQueries(1):
+            results = self.search("apple")
+        self.assertEqual(len(results), 2)
+
+    def test_best_matches_survive_the_per_model_cap(self):
+        for i in range(5):
+            Note.objects.create(title=f"note {i}", content=f"a pear and apple {i}")
+        exact = Note.objects.create(title="apple", content="x")
+        # Older than every substring match, so last in the default order.
+        Note.objects.filter(pk=exact.pk).update(updated_at="2000-01-01T00:00Z")
+        results = self.search("apple")
+        self.assertEqual(results[0]["url"].rstrip("/").split("/")[-2], str(exact.pk))
@@ -1,13 +1,22 @@
 from django.contrib import admin
 from hyperadmin.admin import hyperadmin
+from .autosave import note_write_buffer
 from .models import Note, NoteAttachment
 
 
 class NoteAttachmentInline(admin.TabularInline):
     model = NoteAttachment
     extra = 1
-    fields = ("file", "original_name", "mime_type")
-    readonly_fields = ("uploaded_at",)
+    fields = (
+        "file",
+        "original_name",
+        "mime_type",
+        "size",
+        "width",
+        "height",
+        "text_status",
+    )
+    readonly_fields = ("uploaded_at", "size", "width", "height", "text_status")
 
 
 class InfobjectAdmin(admin.ModelAdmin):
@@ -19,5 +28,11 @@ class InfobjectAdmin(admin.ModelAdmin):
 
     short_content.short_description = "Content"
 
+    def get_object(self, request, object_id, from_field=None):
+        # Edit what autosaves left, not what the last flush did.
+        if from_field is None and str(object_id).isdigit():
+            note_write_buffer.flush_note(int(object_id))
+        return super().get_object(request, object_id, from_field)
+
 
 hyperadmin.register(Note, InfobjectAdmin)
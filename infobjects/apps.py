@@ -1,12 +1,18 @@
 from django.apps import AppConfig
+from django.contrib import messages
 from django.template.response import TemplateResponse
 from iommi import Style, register_style
 from iommi.path import register_path_decoding
 from iommi.style_base import base
 from hyperadmin.hooks import register_admin_action, register_admin_view
+from search.providers import register_global_search_provider
 
 def make_system_dashboard_view(admin_site):
     def view(request):
+        from jobs.models import Job
+
+        from .autosave import note_write_buffer
+
         context = dict(
             admin_site.each_context(request),
             title="System dashboard",
@@ -14,6 +20,8 @@ def make_system_dashboard_view(admin_site):
                 "users": 123,
                 "orders": 456,
             },
+            autosave=note_write_buffer.metrics(),
+            jobs=Job.objects.summary(),
         )
         return TemplateResponse(
             request,
@@ -24,8 +32,83 @@ def make_system_dashboard_view(admin_site):
     return view
 
 
+def make_export_view(admin_site):
+    def view(request):
+        """
+        Pick registered models and stream all their rows as a zip;
+        ?models=app.model&models=...&format=csv&compress=1 downloads directly.
+        """
+        from common.export import EXPORT_FORMATS, export_response
+
+        exportable = {
+            model._meta.label_lower: model_admin
+            for model, model_admin in admin_site._registry.items()
+            if model_admin.has_view_permission(request)
+        }
+        selected = [
+            label for label in request.GET.getlist("models") if label in exportable
+        ]
+        if selected:
+            fmt = request.GET.get("format")
+            return export_response(
+                request,
+                # The changelist's rows, so per-row scoping applies too; pk
+                # order walks the primary key index instead of sorting.
+                [
+                    exportable[label].get_queryset(request).order_by("pk")
+                    for label in selected
+                ],
+                fmt=fmt if fmt in EXPORT_FORMATS else "ndjson",
+                compress=bool(request.GET.get("compress")),
+                model_admins={
+                    exportable[label].model: exportable[label] for label in selected
+                },
+            )
+
+        context = dict(
+            admin_site.each_context(request),
+            title="Export data",
+            models=sorted(
+                (
+                    (
+                        label,
+                        model_admin.model._meta.app_config.verbose_name,
+                        model_admin.model._meta.verbose_name_plural,
+                    )
+                    for label, model_admin in exportable.items()
+                ),
+                key=lambda item: (str(item[1]), str(item[2])),
+            ),
+            formats=EXPORT_FORMATS,
+        )
+        return TemplateResponse(request, "hyperadmin/export.html", context)
+
+    return view
+
+
+def _export_selected(modeladmin, request, queryset, fmt):
+    from common.export import export_response
+
+    if not modeladmin.has_view_permission(request):
+        modeladmin.message_user(request, "You may not view these objects.", messages.ERROR)
+        return None
+    return export_response(
+        request, [queryset], fmt=fmt, model_admins={queryset.model: modeladmin}
+    )
+
+
 def export_everything(modeladmin, request, queryset):
-    pass
+    return _export_selected(modeladmin, request, queryset, "ndjson")
+
+
+export_everything.short_description = "Export selected %(verbose_name_plural)s (NDJSON, zip)"
+
+
+def export_everything_csv(modeladmin, request, queryset):
+    return _export_selected(modeladmin, request, queryset, "csv")
+
+
+export_everything_csv.short_description = "Export selected %(verbose_name_plural)s (CSV, zip)"
 
 
 class InfobjectsConfig(AppConfig):
@@ -33,11 +116,20 @@ class InfobjectsConfig(AppConfig):
     name = "infobjects"
 
     def ready(self):
+        from . import signals
         from .models import Category
+        from .search_index import (
+            attachment_text_search_provider,
+            note_fts_search_provider,
+        )
 
         register_admin_view("dashboard/", make_system_dashboard_view, name="dashboard")
+        register_admin_view("export/", make_export_view, name="export")
         register_admin_action(export_everything, name="export_all")
+        register_admin_action(export_everything_csv, name="export_all_csv")
         register_path_decoding(
             category_pk=Category,
         )
         register_style("infobjects_style", Style(base, base_template='infobjects/infobjects_layout.html'))
+        register_global_search_provider(note_fts_search_provider)
+        register_global_search_provider(attachment_text_search_provider)
@@ -0,0 +1,176 @@
+import hashlib
+import mimetypes
+import struct
+from dataclasses import dataclass
+
+# Enough for magic numbers and for the image headers below; JPEG frame
+# headers after a large EXIF block may be further in, then dimensions stay
+# unknown.
+HEAD_SIZE = 256 * 1024
+
+# (offset, magic, mime type), first match wins.
+_MAGIC = [
+    (0, b"\x89PNG\r\n\x1a\n", "image/png"),
+    (0, b"\xff\xd8\xff", "image/jpeg"),
+    (0, b"GIF87a", "image/gif"),
+    (0, b"GIF89a", "image/gif"),
+    (0, b"BM", "image/bmp"),
+    (0, b"II*\x00", "image/tiff"),
+    (0, b"MM\x00*", "image/tiff"),
+    (0, b"%PDF-", "application/pdf"),
+    (0, b"PK\x03\x04", "application/zip"),
+    (0, b"\x1f\x8b", "application/gzip"),
+    (0, b"7z\xbc\xaf\x27\x1c", "application/x-7z-compressed"),
+    (0, b"OggS", "audio/ogg"),
+    (0, b"fLaC", "audio/flac"),
+    (0, b"ID3", "audio/mpeg"),
+    (0, b"\x1aE\xdf\xa3", "video/webm"),
+    (4, b"ftyp", "video/mp4"),
+]
+
+# Containers whose real type is better told by the file extension
+# (docx/xlsx/odt are zips, m4a/mov are ISO media).
+_CONTAINER_TYPES = {"application/zip", "video/mp4"}
+
+
+@dataclass
+class FileInfo:
+    size: int
+    content_hash: str
+    mime_type: str
+    width: int | None = None
+    height: int | None = None
+
+
+def sniff_mime_type(head: bytes, name: str = "") -> str:
+    guessed, _ = mimetypes.guess_type(name or "")
+    detected = None
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        detected = "image/webp"
+    elif head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        detected = "audio/wav"
+    else:
+        for offset, magic, mime_type in _MAGIC:
+            if head[offset : offset + len(magic)] == magic:
+                detected = mime_type
+                break
+
+    if detected is None:
+        if guessed:
+            return guessed
+        return "text/plain" if _looks_like_text(head) else "application/octet-stream"
+    if detected in _CONTAINER_TYPES and guessed:
+        return guessed
+    return detected
+
+
+def _looks_like_text(head: bytes) -> bool:
+    if b"\x00" in head:
+        return False
+    try:
+        head.decode("utf-8")
+    except UnicodeDecodeError as exc:
+        # A multi-byte sequence cut at the end of the head is still text.
+        return exc.start >= len(head) - 3
+    return True
+
+
+def image_dimensions(head: bytes, mime_type: str) -> tuple[int, int] | None:
+    """
+    (width, height) read from the image header, without decoding the image.
+    None if the format is not handled or the header is not in `head`.
+    """
+    try:
+        if mime_type == "image/png":
+            if head[12:16] == b"IHDR":
+                return struct.unpack(">II", head[16:24])
+        elif mime_type == "image/gif":
+            return struct.unpack("<HH", head[6:10])
+        elif mime_type == "image/bmp":
+            width, height = struct.unpack("<ii", head[18:26])
+            return width, abs(height)
+        elif mime_type == "image/webp":
+            return _webp_dimensions(head)
+        elif mime_type == "image/jpeg":
+            return _jpeg_dimensions(head)
+    except struct.error:
+        return None
+    return None
+
+
+def _webp_dimensions(head):
+    chunk = head[12:16]
+    if chunk == b"VP8 ":
+        width, height = struct.unpack("<HH", head[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L":
+        bits = int.from_bytes(head[21:25], "little")
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X":
+        width = int.from_bytes(head[24:27], "little") + 1
+        height = int.from_bytes(head[27:30], "little") + 1
+        return width, height
+    return None
+
+
+# Start-of-frame markers; 0xC4 (DHT), 0xC8 (JPG) and 0xCC (DAC) share the range.
+_JPEG_SOF = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def _jpeg_dimensions(head):
+    position = 2
+    while position + 4 <= len(head):
+        if head[position] != 0xFF:
+            return None
+        marker = head[position + 1]
+        if marker == 0xFF:
+            position += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            position += 2
+            continue
+        (length,) = struct.unpack(">H", head[position + 2 : position + 4])
+        if marker in _JPEG_SOF:
+            height, width = struct.unpack(">HH", head[position + 5 : position + 9])
+            return width, height
+        position += 2 + length
+    return None
+
+
+def inspect_file(fileobj, name: str = "", chunk_size=64 * 1024) -> FileInfo:
+    """
+    Size, SHA-256, sniffed MIME type and image dimensions of an open binary
+    file, in a single streaming pass. The caller rewinds/closes the file.
+    """
+    digest = hashlib.sha256()
+    head = bytearray()
+    size = 0
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            break
+        digest.update(chunk)
+        size += len(chunk)
+        if len(head) < HEAD_SIZE:
+            head += chunk[: HEAD_SIZE - len(head)]
+
+    return describe_file(bytes(head), name, size, digest.hexdigest())
+
+
+def describe_file(head: bytes, name: str, size: int, content_hash: str) -> FileInfo:
+    """
+    FileInfo from the first HEAD_SIZE bytes of a file whose size and hash
+    are already known (e.g. computed while the file was being received).
+    """
+    mime_type = sniff_mime_type(head, name)
+    dimensions = None
+    if mime_type.startswith("image/"):
+        dimensions = image_dimensions(head, mime_type)
+    width, height = dimensions or (None, None)
+    return FileInfo(
+        size=size,
+        content_hash=content_hash,
+        mime_type=mime_type,
+        width=width,
+        height=height,
+    )
@@ -0,0 +1,353 @@
+import atexit
+import datetime
+import logging
+import threading
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .models import Note
+
+logger = logging.getLogger(__name__)
+
+AUTOSAVE_BUFFER_SETTINGS = getattr(settings, "NOTE_AUTOSAVE_BUFFER", {})
+
+
+class TextPatchError(ValueError):
+    pass
+
+
+def parse_text_ops(ops) -> list[tuple[int, int, str]]:
+    """
+    Validate autosave patch operations sent by the note editor:
+        [{"offset": 10, "delete": 3, "insert": "abc"}, ...]
+    Offsets count Unicode code points.
+    """
+    if not isinstance(ops, list) or not ops:
+        raise TextPatchError("ops must be a non-empty list")
+
+    parsed = []
+    for op in ops:
+        if not isinstance(op, dict):
+            raise TextPatchError("every op must be an object")
+        offset = op.get("offset")
+        delete = op.get("delete", 0)
+        insert = op.get("insert", "")
+        if (
+            not isinstance(offset, int)
+            or not isinstance(delete, int)
+            or isinstance(offset, bool)
+            or isinstance(delete, bool)
+            or offset < 0
+            or delete < 0
+        ):
+            raise TextPatchError("offset and delete must be non-negative integers")
+        if not isinstance(insert, str):
+            raise TextPatchError("insert must be a string")
+        parsed.append((offset, delete, insert))
+    return parsed
+
+
+def apply_text_ops(text: str, ops: list[tuple[int, int, str]]) -> str:
+    """
+    Apply (offset, delete, insert) operations in order, each one against the
+    result of the previous one.
+    """
+    for offset, delete, insert in ops:
+        if offset + delete > len(text):
+            raise TextPatchError(
+                f"op ({offset}, {delete}) is out of range for length {len(text)}"
+            )
+        text = text[:offset] + insert + text[offset + delete :]
+    return text
+
+
+@dataclass
+class PendingWrite:
+    note_id: int
+    title: str
+    content: str
+    revision: int
+    staged_at: datetime.datetime
+    writes: int = 1
+    # Stored revision the first of the coalesced writes was made against.
+    base_revision: int = 0
+
+    @property
+    def size(self):
+        return len(self.title) + len(self.content)
+
+
+class NoteWriteBuffer:
+    """
+    Write-behind buffer for autosaves. Keeps the latest title and content per
+    note in memory and writes everything pending in one transaction every
+    FLUSH_INTERVAL seconds, or sooner once MAX_PENDING_BYTES are waiting.
+    Saves wait for that write (see wait_stored), so one transaction commits
+    the saves of all notes made within an interval.
+
+    A note's pending write is flushed before the note is read or saved
+    elsewhere (see flush_note), and a write whose note was saved elsewhere
+    since it was staged is dropped rather than overwriting that save.
+    The buffer is process-local, like the event hub, so it assumes a single
+    app process.
+
+    Hold `lock` while reading the current state of a note and staging a new
+    one, so two saves of the same note can't interleave. The database write
+    itself runs outside it, the notes being written are kept in flight
+    until it commits.
+    """
+
+    def __init__(self, flush_interval, max_pending_bytes, enabled=True):
+        self.flush_interval = flush_interval
+        self.max_pending_bytes = max_pending_bytes
+        self.enabled = enabled
+        self.lock = threading.RLock()
+        self._written = threading.Condition(self.lock)
+        self._pending = {}
+        self._pending_bytes = 0
+        self._in_flight = {}
+        # Note id -> last revision a flush stored.
+        self._stored = {}
+        self._wakeup = threading.Event()
+        self._flusher = None
+        self._stats = {
+            "staged_writes": 0,
+            "coalesced_writes": 0,
+            "flushes": 0,
+            "flushed_notes": 0,
+            "conflicted_notes": 0,
+            "failed_flushes": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0,
+        }
+
+    # -----------------------------------------------------------------
+    #  State
+    # -----------------------------------------------------------------
+
+    def get(self, note_id) -> PendingWrite | None:
+        with self.lock:
+            return self._pending.get(note_id) or self._in_flight.get(note_id)
+
+    def current(self, note_id) -> PendingWrite | None:
+        """
+        Latest state of a note: the pending (or in flight) write if there is
+        one, otherwise what is in the database (writes=0). None if the note
+        doesn't exist.
+        """
+        with self.lock:
+            pending = self.get(note_id)
+            if pending is not None:
+                return pending
+            row = (
+                Note.objects.filter(pk=note_id)
+                .values("title", "content", "revision", "updated_at")
+                .first()
+            )
+            if row is None:
+                return None
+            return PendingWrite(
+                note_id=note_id,
+                title=row["title"],
+                content=row["content"],
+                revision=row["revision"],
+                staged_at=row["updated_at"],
+                writes=0,
+                base_revision=row["revision"],
+            )
+
+    def stage(self, note_id, title, content, revision) -> PendingWrite:
+        """Stage the next state of a note, revision being current().revision + 1."""
+        with self.lock:
+            previous = self._pending.get(note_id)
+            write = PendingWrite(
+                note_id=note_id,
+                title=title,
+                content=content,
+                revision=revision,
+                staged_at=timezone.now(),
+                # On top of the previous write, or of the one in flight.
+                base_revision=revision - 1,
+            )
+            if previous is not None:
+                write.writes = previous.writes + 1
+                write.base_revision = previous.base_revision
+                self._pending_bytes -= previous.size
+                self._stats["coalesced_writes"] += 1
+            self._pending[note_id] = write
+            self._pending_bytes += write.size
+            self._stats["staged_writes"] += 1
+
+            if not self.enabled:
+                self.flush_note(note_id)
+            elif self._pending_bytes >= self.max_pending_bytes:
+                self._wakeup.set()
+        self._ensure_flusher()
+        return write
+
+    def wait_stored(self, write, timeout) -> bool | None:
+        """
+        Wait until a staged write (or a later one of the same note) has been
+        flushed. True once stored, False if it was dropped because the note
+        was saved elsewhere or deleted, None if still waiting after timeout.
+        """
+        deadline = time.monotonic() + timeout
+        with self.lock:
+            while write.note_id in self._pending or write.note_id in self._in_flight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._written.wait(remaining)
+            return self._stored.get(write.note_id, 0) >= write.revision
+
+    def discard(self, note_id):
+        with self.lock:
+            write = self._pending.pop(note_id, None)
+            if write is not None:
+                self._pending_bytes -= write.size
+                self._written.notify_all()
+
+    # -----------------------------------------------------------------
+    #  Flushing
+    # -----------------------------------------------------------------
+
+    def flush_note(self, note_id) -> bool:
+        """Write the note's pending write now, False if there was none."""
+        with self.lock:
+            while note_id in self._in_flight:
+                self._written.wait()
+            write = self._pending.pop(note_id, None)
+            if write is None:
+                return False
+            self._pending_bytes -= write.size
+            self._in_flight[note_id] = write
+        self._write([write])
+        return True
+
+    def flush(self) -> bool:
+        """Write everything pending, False if there was nothing."""
+        with self.lock:
+            batch = [
+                write
+                for note_id, write in self._pending.items()
+                if note_id not in self._in_flight
+            ]
+            if not batch:
+                return False
+            for write in batch:
+                del self._pending[write.note_id]
+                self._pending_bytes -= write.size
+                self._in_flight[write.note_id] = write
+        self._write(batch)
+        return True
+
+    def _write(self, batch):
+        # The batch is in flight: current() answers from it and flush_note()
+        # waits for it until it is committed or put back.
+        started = time.perf_counter()
+        stored, conflicts = [], []
+        try:
+            with transaction.atomic():
+                notes = Note.objects.defer("content").in_bulk(
+                    [write.note_id for write in batch]
+                )
+                for write in batch:
+                    note = notes.get(write.note_id)
+                    if note is None:
+                        continue  # deleted in the meantime
+                    if note.revision != write.base_revision:
+                        conflicts.append(write)  # saved elsewhere since
+                        continue
+                    note.title = write.title
+                    note.content = write.content
+                    note.revision = write.revision
+                    note._autosave_flush = True
+                    note.save(
+                        update_fields=["title", "content", "updated_at"],
+                        bump_revision=False,
+                    )
+                    stored.append(write)
+        except Exception:
+            logger.exception(
+                "[infobjects] autosave flush of %d note(s) failed, will retry",
+                len(batch),
+            )
+            with self.lock:
+                self._stats["failed_flushes"] += 1
+                for write in batch:
+                    del self._in_flight[write.note_id]
+                    newer = self._pending.get(write.note_id)
+                    if newer is None:
+                        self._pending[write.note_id] = write
+                        self._pending_bytes += write.size
+                    else:
+                        # Staged on top of this one, so it carries it along.
+                        newer.base_revision = write.base_revision
+                self._written.notify_all()
+            return
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self.lock:
+            for write in batch:
+                del self._in_flight[write.note_id]
+            for write in stored:
+                self._stored[write.note_id] = write.revision
+            self._stats["flushes"] += 1
+            self._stats["flushed_notes"] += len(stored)
+            self._stats["conflicted_notes"] += len(conflicts)
+            self._stats["last_flush_ms"] = elapsed_ms
+            self._stats["max_flush_ms"] = max(self._stats["max_flush_ms"], elapsed_ms)
+            self._stats["total_flush_ms"] += elapsed_ms
+            self._written.notify_all()
+        for write in conflicts:
+            logger.warning(
+                "[infobjects] dropped autosave of note %s, it was saved elsewhere "
+                "since revision %s",
+                write.note_id,
+                write.base_revision,
+            )
+
+    def _ensure_flusher(self):
+        if not self.enabled or self._flusher is not None:
+            return
+        with self.lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(
+                    target=self._run, name="note-autosave-flusher", daemon=True
+                )
+                self._flusher.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            # An idle pass opens no connection, so there is none to close.
+            if self.flush():
+                connections.close_all()
+
+    # -----------------------------------------------------------------
+    #  Metrics
+    # -----------------------------------------------------------------
+
+    def metrics(self):
+        with self.lock:
+            stats = dict(self._stats)
+            stats["pending_notes"] = len(self._pending)
+            stats["pending_bytes"] = self._pending_bytes
+        stats["avg_flush_ms"] = (
+            stats["total_flush_ms"] / stats["flushes"] if stats["flushes"] else 0.0
+        )
+        return stats
+
+
+note_write_buffer = NoteWriteBuffer(
+    flush_interval=AUTOSAVE_BUFFER_SETTINGS.get("FLUSH_INTERVAL", 0.25),
+    max_pending_bytes=AUTOSAVE_BUFFER_SETTINGS.get("MAX_PENDING_BYTES", 4 * 1024 * 1024),
+    enabled=AUTOSAVE_BUFFER_SETTINGS.get("ENABLED", True),
+)
+atexit.register(note_write_buffer.flush)
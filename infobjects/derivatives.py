@@ -0,0 +1,164 @@
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.db import connections
+
+from .imaging import FORMAT_EXTENSIONS, render_derivatives
+from .models import NoteAttachment
+from .storage import attachment_storage, cas_name
+
+logger = logging.getLogger(__name__)
+
+NOTE_DERIVATIVES_SETTINGS = getattr(settings, "NOTE_DERIVATIVES", {})
+
+# variant -> longest edge in pixels
+DERIVATIVE_SIZES = NOTE_DERIVATIVES_SETTINGS.get(
+    "SIZES", {"thumb": 320, "preview": 1280}
+)
+DERIVATIVE_FORMAT = NOTE_DERIVATIVES_SETTINGS.get("FORMAT", "WEBP")
+DERIVATIVE_QUALITY = NOTE_DERIVATIVES_SETTINGS.get("QUALITY", 80)
+MAX_WORKERS = NOTE_DERIVATIVES_SETTINGS.get("MAX_WORKERS", 2)
+MAX_TASKS_PER_CHILD = NOTE_DERIVATIVES_SETTINGS.get("MAX_TASKS_PER_CHILD", 50)
+MAX_PIXELS = NOTE_DERIVATIVES_SETTINGS.get("MAX_PIXELS", 100_000_000)
+
+SUPPORTED_TYPES = {
+    "image/jpeg",
+    "image/png",
+    "image/gif",
+    "image/webp",
+    "image/bmp",
+    "image/tiff",
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn: forking a process that runs threads (autosave flusher,
+            # search pool) is unsafe, and workers only need PIL.
+            _executor = ProcessPoolExecutor(
+                max_workers=MAX_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                max_tasks_per_child=MAX_TASKS_PER_CHILD,
+            )
+        return _executor
+
+
+def derivative_name(content_hash, variant):
+    """Derivatives live next to the blob: cas/ab/cd/<hash>.<variant>.<ext>."""
+    extension = FORMAT_EXTENSIONS[DERIVATIVE_FORMAT]
+    base = cas_name(content_hash)
+    return f"{base}.{variant}.{extension}"
+
+
+def wants_derivatives(attachment):
+    return (
+        attachment.mime_type in SUPPORTED_TYPES
+        and bool(attachment.content_hash)
+        and attachment.derivatives is None
+    )
+
+
+def _targets(content_hash):
+    return {
+        variant: (attachment_storage.path(derivative_name(content_hash, variant)), edge)
+        for variant, edge in DERIVATIVE_SIZES.items()
+    }
+
+
+def _to_derivatives(content_hash, rendered):
+    return {
+        variant: {"name": derivative_name(content_hash, variant), **info}
+        for variant, info in rendered.items()
+    }
+
+
+def _save(content_hash, derivatives):
+    # Every attachment sharing the blob shares its derivatives too.
+    NoteAttachment.objects.filter(
+        content_hash=content_hash, derivatives__isnull=True
+    ).update(derivatives=derivatives)
+
+
+def _existing(content_hash):
+    return (
+        NoteAttachment.objects.filter(content_hash=content_hash)
+        .exclude(derivatives__isnull=True)
+        .values_list("derivatives", flat=True)
+        .first()
+    )
+
+
+def schedule_derivatives(attachment):
+    """
+    Queue derivative generation for an image attachment in the process
+    pool; the result is written to the row when it is done. Returns the
+    Future, or None if there is nothing to do.
+    """
+    if not wants_derivatives(attachment):
+        return None
+    content_hash = attachment.content_hash
+    existing = _existing(content_hash)
+    if existing is not None:
+        _save(content_hash, existing)
+        return None
+
+    future = _get_executor().submit(
+        render_derivatives,
+        attachment_storage.path(attachment.file.name),
+        _targets(content_hash),
+        DERIVATIVE_FORMAT,
+        DERIVATIVE_QUALITY,
+        MAX_PIXELS,
+    )
+
+    caller = threading.get_ident()
+
+    def done(future):
+        # Normally runs in the executor's management thread, which gets its
+        # own database connection.
+        global _executor
+        try:
+            # {} means the image is small enough as it is.
+            _save(content_hash, _to_derivatives(content_hash, future.result()))
+        except BrokenProcessPool:
+            logger.exception("[infobjects] derivative worker died, restarting pool")
+            with _executor_lock:
+                _executor = None
+        except Exception:
+            logger.exception(
+                "[infobjects] derivatives for %s failed", attachment.file.name
+            )
+        finally:
+            if threading.get_ident() != caller:
+                connections.close_all()
+
+    future.add_done_callback(done)
+    return future
+
+
+def iter_derivative_names(derivatives):
+    for info in (derivatives or {}).values():
+        name = info.get("name")
+        if name:
+            yield name
+
+
+def serialize_derivatives(derivatives):
+    return {
+        variant: {
+            "url": attachment_storage.url(info["name"]),
+            "width": info["width"],
+            "height": info["height"],
+        }
+        for variant, info in (derivatives or {}).items()
+        if info.get("name")
+    }
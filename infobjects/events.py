@@ -0,0 +1,174 @@
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+NOTE_EVENTS_SETTINGS = getattr(settings, "NOTE_EVENTS", {})
+
+BUFFER_SIZE = NOTE_EVENTS_SETTINGS.get("BUFFER_SIZE", 1000)
+SUBSCRIBER_QUEUE_SIZE = NOTE_EVENTS_SETTINGS.get("SUBSCRIBER_QUEUE_SIZE", 256)
+HEARTBEAT_INTERVAL = NOTE_EVENTS_SETTINGS.get("HEARTBEAT_INTERVAL", 20)
+RETRY_MS = NOTE_EVENTS_SETTINGS.get("RETRY_MS", 5000)
+
+
+class NoteSubscription:
+    """
+    One open event stream. Events are pushed from any thread into the
+    subscriber's event loop; a subscriber that falls SUBSCRIBER_QUEUE_SIZE
+    events behind is told to reset instead of buffering without bound.
+    """
+
+    OVERFLOW = object()
+
+    def __init__(self, loop, note_ids=(), category_ids=()):
+        self.loop = loop
+        self.note_ids = set(note_ids)
+        self.category_ids = set(category_ids)
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def matches(self, event):
+        if not self.note_ids and not self.category_ids:
+            return True
+        return (
+            event["note_id"] in self.note_ids
+            or event["category_id"] in self.category_ids
+        )
+
+    def push(self, event):
+        if not self.matches(event):
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(self.OVERFLOW)
+
+
+class NoteEventHub:
+    """
+    In-process fan-out of note change events to every open stream.
+
+    Events get ids "<epoch>-<seq>"; the last BUFFER_SIZE are kept so a client
+    reconnecting with Last-Event-ID gets what it missed. An id from another
+    epoch (process restart) or older than the buffer means the client has to
+    reset and refetch.
+    """
+
+    def __init__(self, buffer_size=BUFFER_SIZE):
+        self._lock = threading.Lock()
+        self._buffer = deque(maxlen=buffer_size)
+        self._subscribers = set()
+        self._seq = 0
+        self.epoch = format(int(time.time() * 1000), "x")
+
+    def publish(self, event_type, note_id, category_id=None, **data):
+        with self._lock:
+            self._seq += 1
+            event = {
+                "id": f"{self.epoch}-{self._seq}",
+                "seq": self._seq,
+                "type": event_type,
+                "note_id": note_id,
+                "category_id": category_id,
+                **data,
+            }
+            self._buffer.append(event)
+            subscribers = list(self._subscribers)
+
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.push, event)
+            except RuntimeError:
+                # Loop already closed, the stream is going away.
+                self.unsubscribe(subscription)
+        return event
+
+    def subscribe(self, subscription):
+        with self._lock:
+            self._subscribers.add(subscription)
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def replay(self, last_event_id):
+        """
+        Buffered events after last_event_id, or None if they are gone.
+        """
+        epoch, _, seq = (last_event_id or "").partition("-")
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        seq = int(seq)
+        with self._lock:
+            if seq > self._seq:
+                return None
+            if seq < self._seq and (not self._buffer or self._buffer[0]["seq"] > seq + 1):
+                return None
+            return [event for event in self._buffer if event["seq"] > seq]
+
+
+note_event_hub = NoteEventHub()
+
+
+def format_sse(event=None, data=None, event_id=None, comment=None):
+    lines = []
+    if comment is not None:
+        lines.append(f": {comment}")
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event is not None:
+        lines.append(f"event: {event}")
+    if data is not None:
+        lines.append(f"data: {json.dumps(data, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def _public(event):
+    return {key: value for key, value in event.items() if key != "seq"}
+
+
+async def stream_note_events(subscription, last_event_id=None):
+    """
+    Async generator of SSE frames for one subscription: retry hint, replay
+    (or a reset event), then live events with heartbeats in between.
+    """
+    hub = note_event_hub
+    hub.subscribe(subscription)
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+
+        last_seq = 0
+        if last_event_id:
+            missed = hub.replay(last_event_id)
+            if missed is None:
+                yield format_sse(event="reset", data={"epoch": hub.epoch})
+            else:
+                for event in missed:
+                    last_seq = event["seq"]
+                    if subscription.matches(event):
+                        yield format_sse(
+                            event=event["type"], data=_public(event), event_id=event["id"]
+                        )
+        else:
+            yield format_sse(event="ready", data={"epoch": hub.epoch})
+
+        while True:
+            try:
+                event = await asyncio.wait_for(
+                    subscription.queue.get(), timeout=HEARTBEAT_INTERVAL
+                )
+            except TimeoutError:
+                yield format_sse(comment="heartbeat")
+                continue
+            if event is NoteSubscription.OVERFLOW:
+                yield format_sse(event="reset", data={"epoch": hub.epoch})
+                return
+            if event["seq"] <= last_seq:
+                continue
+            yield format_sse(event=event["type"], data=_public(event), event_id=event["id"])
+    finally:
+        hub.unsubscribe(subscription)
@@ -0,0 +1,62 @@
+"""
+Image resizing run inside worker processes (see infobjects.derivatives).
+
+Kept free of Django imports so spawned workers start fast and never touch
+the database.
+"""
+
+import os
+import uuid
+
+from PIL import Image, ImageOps
+
+FORMAT_EXTENSIONS = {"WEBP": "webp", "JPEG": "jpg", "PNG": "png"}
+
+
+def _prepare(image, fmt):
+    has_alpha = image.mode in ("RGBA", "LA", "PA") or (
+        image.mode == "P" and "transparency" in image.info
+    )
+    if fmt == "JPEG" or not has_alpha:
+        return image.convert("RGB") if image.mode != "RGB" else image
+    return image.convert("RGBA") if image.mode != "RGBA" else image
+
+
+def render_derivatives(source_path, targets, fmt="WEBP", quality=80, max_pixels=None):
+    """
+    Write downscaled copies of the image at source_path.
+
+    targets: {variant: (target_path, max_edge)}. Variants are rendered from
+    the largest down, each from the previous one, and skipped when the
+    image already fits. Returns {variant: {"width", "height", "size"}}.
+    """
+    if max_pixels:
+        Image.MAX_IMAGE_PIXELS = max_pixels
+
+    results = {}
+    ordered = sorted(targets.items(), key=lambda item: item[1][1], reverse=True)
+    with Image.open(source_path) as image:
+        largest = ordered[0][1][1] if ordered else 0
+        # Lets the JPEG decoder scale down by 1/2..1/8 while decoding.
+        image.draft("RGB", (largest, largest))
+        image = ImageOps.exif_transpose(image)
+        image = _prepare(image, fmt)
+
+        for variant, (target_path, max_edge) in ordered:
+            if max(image.size) <= max_edge:
+                continue
+            resized = image.copy()
+            resized.thumbnail(
+                (max_edge, max_edge), Image.Resampling.LANCZOS, reducing_gap=3.0
+            )
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            temp_path = f"{target_path}.{uuid.uuid4().hex}.tmp"
+            resized.save(temp_path, fmt, quality=quality)
+            os.replace(temp_path, target_path)
+            results[variant] = {
+                "width": resized.width,
+                "height": resized.height,
+                "size": os.path.getsize(target_path),
+            }
+            image = resized
+    return results
@@ -0,0 +1,48 @@
+from concurrent.futures import wait
+
+from django.core.management.base import BaseCommand
+
+from infobjects.derivatives import SUPPORTED_TYPES, schedule_derivatives
+from infobjects.models import NoteAttachment
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate missing image derivatives (thumbnails, previews), e.g. for "
+        "attachments uploaded before derivatives existed or while a worker died."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Regenerate derivatives that already exist.",
+        )
+
+    def handle(self, *args, **options):
+        attachments = NoteAttachment.objects.filter(mime_type__in=SUPPORTED_TYPES)
+        if options["rebuild"]:
+            attachments.update(derivatives=None)
+        attachments = attachments.filter(derivatives__isnull=True).exclude(
+            content_hash=""
+        )
+
+        futures = []
+        seen = set()
+        for attachment in attachments.iterator():
+            # Attachments with the same content share their derivatives.
+            if attachment.content_hash in seen:
+                continue
+            seen.add(attachment.content_hash)
+            future = schedule_derivatives(attachment)
+            if future is not None:
+                futures.append(future)
+
+        wait(futures)
+        failed = sum(1 for future in futures if future.exception() is not None)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Generated derivatives for {len(futures) - failed} images "
+                f"({failed} failed)."
+            )
+        )
@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from infobjects.media_gc import sweep_orphaned_media
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete files under MEDIA_ROOT that no FileField references "
+        "(attachments of deleted notes, abandoned uploads). Dry run by default."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--delete",
+            action="store_true",
+            help="Actually delete orphaned files (default: only report them).",
+        )
+        parser.add_argument(
+            "--grace-hours",
+            type=float,
+            default=24,
+            help="Never touch files modified more recently than this (default: 24).",
+        )
+        parser.add_argument(
+            "--rate",
+            type=float,
+            default=50,
+            help="Maximum deletes per second, 0 for unlimited (default: 50).",
+        )
+        parser.add_argument(
+            "--scan-pause",
+            type=float,
+            default=0.0,
+            help="Seconds to sleep after every 1000 files scanned (default: 0).",
+        )
+
+    def handle(self, *args, **options):
+        dry_run = not options["delete"]
+        verbosity = options["verbosity"]
+
+        def on_orphan(name, stat):
+            if verbosity >= 2:
+                self.stdout.write(f"{name}  {filesizeformat(stat.st_size)}")
+
+        report = sweep_orphaned_media(
+            grace_seconds=options["grace_hours"] * 3600,
+            dry_run=dry_run,
+            deletes_per_second=options["rate"],
+            scan_pause=options["scan_pause"],
+            on_orphan=on_orphan,
+        )
+
+        self.stdout.write(
+            f"Scanned {report.scanned} files: {report.referenced} referenced, "
+            f"{report.too_new} within grace period, {report.orphaned} orphaned "
+            f"({filesizeformat(report.orphaned_bytes)})."
+        )
+        if dry_run:
+            self.stdout.write("Dry run, nothing deleted. Use --delete to remove them.")
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Deleted {report.deleted} files "
+                    f"({filesizeformat(report.deleted_bytes)})."
+                )
+            )
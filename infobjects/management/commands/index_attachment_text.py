@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+
+from infobjects.models import NoteAttachment
+from infobjects.search_index import delete_attachment_text
+from infobjects.text_extraction import extract_attachment_text
+
+
+class Command(BaseCommand):
+    help = (
+        "Extract the text of text-like attachments into the search index. "
+        "Interrupted runs continue where they stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Drop the indexed text and extract every attachment again.",
+        )
+        parser.add_argument(
+            "--retry-failed",
+            action="store_true",
+            help="Also retry attachments whose extraction failed.",
+        )
+
+    def handle(self, *args, **options):
+        Status = NoteAttachment.TextStatus
+        attachments = NoteAttachment.objects.all()
+        if options["rebuild"]:
+            for attachment_id in attachments.values_list("id", flat=True).iterator():
+                delete_attachment_text(attachment_id)
+            attachments.update(text_status=Status.PENDING, text_offset=0, text_chunks=0)
+        if options["retry_failed"]:
+            attachments.filter(text_status=Status.FAILED).update(
+                text_status=Status.PENDING, text_offset=0, text_chunks=0
+            )
+
+        counts = {}
+        for attachment in attachments.filter(text_status__in=[Status.PENDING, Status.PARTIAL]).iterator():
+            try:
+                status = extract_attachment_text(attachment)
+            except Exception as exc:
+                self.stderr.write(f"{attachment}: {exc}")
+                NoteAttachment.objects.filter(pk=attachment.pk).update(
+                    text_status=Status.FAILED
+                )
+                status = Status.FAILED
+            counts[status] = counts.get(status, 0) + 1
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Indexed {counts.get(Status.DONE, 0)} attachments, "
+                f"skipped {counts.get(Status.SKIPPED, 0)}, "
+                f"failed {counts.get(Status.FAILED, 0)}."
+            )
+        )
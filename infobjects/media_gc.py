@@ -0,0 +1,219 @@
+import hashlib
+import os
+import re
+import time
+import uuid
+from array import array
+from contextlib import nullcontext
+from bisect import bisect_left
+from dataclasses import dataclass, field
+
+from django.apps import apps
+from django.conf import settings
+from django.db import models
+
+from .derivatives import iter_derivative_names
+from .models import NoteAttachment, UploadSession
+from .storage import attachment_storage, is_cas_name, last_used, remove_blob
+from .uploads import UPLOAD_TEMP_DIR
+
+
+# cas/ab/cd/<hash>.<variant>.<ext>, see infobjects.derivatives
+_DERIVATIVE_RE = re.compile(r"^([0-9a-f]{64})\.\w+\.\w+$")
+
+
+def _path_key(name: str) -> int:
+    """
+    64-bit key of a storage name. Millions of references fit in a few MB;
+    a collision only keeps a file alive, it can never delete one.
+    """
+    normalized = name.replace("\\", "/").lstrip("/")
+    return int.from_bytes(
+        hashlib.blake2b(normalized.encode(), digest_size=8).digest(), "big"
+    )
+
+
+class ReferenceSet:
+    """Sorted array of path keys, looked up by bisection."""
+
+    def __init__(self, keys):
+        self._keys = array("Q", sorted(keys))
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, name):
+        key = _path_key(name)
+        index = bisect_left(self._keys, key)
+        return index < len(self._keys) and self._keys[index] == key
+
+
+def file_fields():
+    """(model, field name) for every concrete FileField in the project."""
+    for model in apps.get_models():
+        for model_field in model._meta.concrete_fields:
+            if isinstance(model_field, models.FileField):
+                yield model, model_field.name
+
+
+def iter_referenced_names():
+    for model, field_name in file_fields():
+        names = (
+            model._default_manager.exclude(**{field_name: ""})
+            .exclude(**{f"{field_name}__isnull": True})
+            .values_list(field_name, flat=True)
+        )
+        yield from names.iterator(chunk_size=5000)
+
+    # Image derivatives are referenced from the attachment's JSON.
+    with_derivatives = NoteAttachment.objects.exclude(derivatives__isnull=True)
+    for derivatives in with_derivatives.values_list("derivatives", flat=True).iterator(
+        chunk_size=5000
+    ):
+        yield from iter_derivative_names(derivatives)
+
+    # Uploads still in progress own their partial file.
+    open_sessions = UploadSession.objects.filter(status=UploadSession.Status.OPEN)
+    for session in open_sessions.only("id").iterator(chunk_size=5000):
+        yield session.temp_name
+
+
+def load_references() -> ReferenceSet:
+    return ReferenceSet(_path_key(name) for name in iter_referenced_names())
+
+
+def is_referenced(name: str) -> bool:
+    """Exact per-file check, done again right before deleting."""
+    for model, field_name in file_fields():
+        if model._default_manager.filter(**{field_name: name}).exists():
+            return True
+    directory, filename = os.path.split(name)
+    derivative = _DERIVATIVE_RE.match(filename)
+    if derivative and is_cas_name(name):
+        # Derivatives belong to whatever attachment has the same content.
+        return NoteAttachment.objects.filter(content_hash=derivative.group(1)).exists()
+    session_id, extension = os.path.splitext(filename)
+    if directory == UPLOAD_TEMP_DIR and extension == ".part":
+        try:
+            session_id = uuid.UUID(hex=session_id)
+        except ValueError:
+            return False
+        return UploadSession.objects.filter(
+            pk=session_id, status=UploadSession.Status.OPEN
+        ).exists()
+    return False
+
+
+def walk_files(root, pause_every=1000, pause=0.0):
+    """
+    Yield (relative_name, stat) for every regular file below root with an
+    explicit stack of scandir() iterators, so memory stays flat however big
+    the tree is. Dot files and directories are skipped.
+    """
+    seen = 0
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            entries = os.scandir(directory)
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    seen += 1
+                    if pause and seen % pause_every == 0:
+                        time.sleep(pause)
+                    relative = os.path.relpath(entry.path, root).replace(os.sep, "/")
+                    yield relative, entry.stat(follow_symlinks=False)
+
+
+@dataclass
+class SweepReport:
+    scanned: int = 0
+    referenced: int = 0
+    too_new: int = 0
+    orphaned: int = 0
+    orphaned_bytes: int = 0
+    deleted: int = 0
+    deleted_bytes: int = 0
+    orphans: list = field(default_factory=list)
+
+
+def _remove_orphan(root, name, cutoff):
+    """
+    Delete name if it is still unreferenced and old. Blobs are checked
+    under the blob lock, so an upload reusing one in between keeps it.
+    """
+    path = os.path.join(root, name)
+    lock = attachment_storage.blob_lock() if is_cas_name(name) else nullcontext()
+    with lock:
+        used = last_used(path)
+        if used is None or used > cutoff or is_referenced(name):
+            return False
+        try:
+            remove_blob(path)
+        except FileNotFoundError:
+            return False
+    return True
+
+
+def sweep_orphaned_media(
+    grace_seconds=24 * 3600,
+    dry_run=True,
+    deletes_per_second=50,
+    scan_pause=0.0,
+    root=None,
+    report_limit=1000,
+    on_orphan=None,
+):
+    """
+    Delete files under MEDIA_ROOT that no FileField references.
+
+    References are loaded before the walk, and files modified within the
+    grace period are never touched, so uploads in flight and rows created
+    during the sweep are safe. Each candidate is re-checked against the
+    database right before it is removed; deletes are rate limited.
+    """
+    root = root or settings.MEDIA_ROOT
+    references = load_references()
+    cutoff = time.time() - grace_seconds
+    interval = 1.0 / deletes_per_second if deletes_per_second else 0.0
+    next_delete = 0.0
+    report = SweepReport()
+
+    for name, stat in walk_files(root, pause=scan_pause):
+        report.scanned += 1
+        if name in references:
+            report.referenced += 1
+            continue
+        # Blobs count as new while recently reused, see ContentAddressedStorage.claim().
+        used = last_used(os.path.join(root, name)) if is_cas_name(name) else stat.st_mtime
+        if used is None or used > cutoff:
+            report.too_new += 1
+            continue
+
+        report.orphaned += 1
+        report.orphaned_bytes += stat.st_size
+        if len(report.orphans) < report_limit:
+            report.orphans.append((name, stat.st_size))
+        if on_orphan is not None:
+            on_orphan(name, stat)
+        if dry_run:
+            continue
+
+        if interval:
+            now = time.monotonic()
+            if now < next_delete:
+                time.sleep(next_delete - now)
+            next_delete = max(now, next_delete) + interval
+        if not _remove_orphan(root, name, cutoff):
+            continue
+        report.deleted += 1
+        report.deleted_bytes += stat.st_size
+
+    return report
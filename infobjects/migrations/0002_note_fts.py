@@ -0,0 +1,95 @@
+# Generated by Django 6.1.2 on 2026-10-18 09:12
+
+from django.db import migrations
+
+
+# FTS5 is SQLite-only; on other backends the search provider falls back to
+# returning nothing and the admin search covers notes instead.
+CREATE_NOTE_FTS = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS infobjects_note_fts USING fts5(
+        title,
+        content,
+        category_title,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS infobjects_note_fts_ai
+    AFTER INSERT ON infobjects_note BEGIN
+        INSERT INTO infobjects_note_fts(rowid, title, content, category_title)
+        VALUES (
+            new.id,
+            new.title,
+            new.content,
+            (SELECT title FROM infobjects_category WHERE id = new.category_id)
+        );
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS infobjects_note_fts_au
+    AFTER UPDATE OF title, content, category_id ON infobjects_note BEGIN
+        DELETE FROM infobjects_note_fts WHERE rowid = old.id;
+        INSERT INTO infobjects_note_fts(rowid, title, content, category_title)
+        VALUES (
+            new.id,
+            new.title,
+            new.content,
+            (SELECT title FROM infobjects_category WHERE id = new.category_id)
+        );
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS infobjects_note_fts_ad
+    AFTER DELETE ON infobjects_note BEGIN
+        DELETE FROM infobjects_note_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS infobjects_category_fts_au
+    AFTER UPDATE OF title ON infobjects_category BEGIN
+        UPDATE infobjects_note_fts
+        SET category_title = new.title
+        WHERE rowid IN (SELECT id FROM infobjects_note WHERE category_id = new.id);
+    END
+    """,
+    """
+    INSERT INTO infobjects_note_fts(rowid, title, content, category_title)
+    SELECT n.id, n.title, n.content, c.title
+    FROM infobjects_note n
+    LEFT JOIN infobjects_category c ON c.id = n.category_id
+    """,
+]
+
+DROP_NOTE_FTS = [
+    "DROP TRIGGER IF EXISTS infobjects_category_fts_au",
+    "DROP TRIGGER IF EXISTS infobjects_note_fts_ad",
+    "DROP TRIGGER IF EXISTS infobjects_note_fts_au",
+    "DROP TRIGGER IF EXISTS infobjects_note_fts_ai",
+    "DROP TABLE IF EXISTS infobjects_note_fts",
+]
+
+
+def _run_on_sqlite(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != "sqlite":
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('infobjects', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _run_on_sqlite(CREATE_NOTE_FTS),
+            _run_on_sqlite(DROP_NOTE_FTS),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 6.1.2 on 2026-10-18 15:00
+
+from django.db import migrations, models
+
+from infobjects.search_index import create_note_fts_triggers, drop_note_fts_triggers
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('infobjects', '0002_note_fts'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_note_fts_triggers, create_note_fts_triggers),
+        migrations.AddField(
+            model_name='note',
+            name='revision',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Bumped on every save, used as the base for autosave patches.'),
+        ),
+        migrations.RunPython(create_note_fts_triggers, drop_note_fts_triggers),
+    ]
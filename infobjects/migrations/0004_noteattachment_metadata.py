@@ -0,0 +1,54 @@
+# Generated by Django 6.1.2 on 2026-10-18 15:07
+
+from django.db import migrations, models
+
+from infobjects.attachments import inspect_file
+
+
+def backfill_attachment_metadata(apps, schema_editor):
+    NoteAttachment = apps.get_model('infobjects', 'NoteAttachment')
+    for attachment in NoteAttachment.objects.filter(content_hash='').iterator():
+        if not attachment.file:
+            continue
+        try:
+            with attachment.file.open('rb') as fileobj:
+                info = inspect_file(fileobj, name=attachment.original_name or attachment.file.name)
+        except OSError:
+            continue
+        attachment.size = info.size
+        attachment.content_hash = info.content_hash
+        attachment.width = info.width
+        attachment.height = info.height
+        attachment.mime_type = attachment.mime_type or info.mime_type
+        attachment.save(update_fields=['size', 'content_hash', 'width', 'height', 'mime_type'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('infobjects', '0003_note_revision'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='noteattachment',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='SHA-256 of the file content.', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='noteattachment',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='noteattachment',
+            name='size',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='noteattachment',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_attachment_metadata, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 6.1.2 on 2026-10-18 15:10
+
+import os
+
+import infobjects.storage
+from django.db import migrations, models
+
+from infobjects.storage import attachment_storage, cas_name, is_cas_name
+
+
+def move_attachments_to_cas(apps, schema_editor):
+    """
+    Move already stored attachments into the content-addressed store.
+    Duplicates collapse into one blob; the old date-directory copies go.
+    """
+    NoteAttachment = apps.get_model('infobjects', 'NoteAttachment')
+    attachments = NoteAttachment.objects.exclude(content_hash='').exclude(file='')
+    for attachment in attachments.iterator():
+        old_name = attachment.file.name
+        if is_cas_name(old_name):
+            continue
+        new_name = cas_name(attachment.content_hash, attachment.original_name or old_name)
+        old_path = attachment_storage.path(old_name)
+        if os.path.exists(old_path):
+            attachment_storage.store_file(old_path, new_name)
+        elif not attachment_storage.exists(new_name):
+            continue  # file is gone, leave the row as it is
+        NoteAttachment.objects.filter(file=old_name).update(file=new_name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('infobjects', '0005_uploadsession'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='noteattachment',
+            name='file',
+            field=models.FileField(max_length=255, storage=infobjects.storage.get_attachment_storage, upload_to=infobjects.storage.attachment_upload_to),
+        ),
+        migrations.RunPython(move_attachments_to_cas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.1.2 on 2026-10-18 15:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('infobjects', '0006_attachment_cas_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='noteattachment',
+            name='derivatives',
+            field=models.JSONField(blank=True, editable=False, help_text='Downscaled image variants, see infobjects.derivatives. Empty when none are needed, null until generated.', null=True),
+        ),
+    ]
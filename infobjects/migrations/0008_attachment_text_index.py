@@ -0,0 +1,31 @@
+# Generated by Django 6.1.2 on 2026-10-18 15:18
+
+from django.db import migrations, models
+
+from infobjects.search_index import create_attachment_fts, drop_attachment_fts
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('infobjects', '0007_noteattachment_derivatives'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='noteattachment',
+            name='text_chunks',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='noteattachment',
+            name='text_offset',
+            field=models.PositiveBigIntegerField(default=0, editable=False, help_text='Byte offset in the file where extraction resumes.'),
+        ),
+        migrations.AddField(
+            model_name='noteattachment',
+            name='text_status',
+            field=models.CharField(blank=True, choices=[('', 'Pending'), ('PARTIAL', 'Partially extracted'), ('DONE', 'Extracted'), ('SKIPPED', 'Not a text file'), ('FAILED', 'Failed')], default='', editable=False, max_length=10),
+        ),
+        migrations.RunPython(create_attachment_fts, drop_attachment_fts),
+    ]
@@ -1,5 +1,13 @@
+import os
+import uuid
+
+from django.conf import settings
 from django.db import models
+from django.db.models.fields.files import FieldFile
 from django.urls import reverse
+from django.utils.http import urlencode
+
+from .storage import attachment_upload_to, get_attachment_storage
 
 
 class Category(models.Model):
@@ -45,6 +53,19 @@ class Note(models.Model):
         on_delete=models.SET_NULL,
         related_name="notes",
     )
+    revision = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Bumped on every save, used as the base for autosave patches.",
+    )
+
+    def save(self, *args, bump_revision=True, **kwargs):
+        if bump_revision:
+            self.revision = (self.revision or 0) + 1
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "revision" not in update_fields:
+            kwargs["update_fields"] = [*update_fields, "revision"]
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.title} ({self.get_type_display()})"
@@ -53,21 +74,205 @@ class Note(models.Model):
         return reverse("infobjects:note_detail", kwargs={"pk": self.pk})
 
 
+class AttachmentFieldFile(FieldFile):
+    def save(self, name, content, save=True):
+        # The storage name is derived from the content hash, so hash first
+        # (unless NoteAttachment.save() just did for this content).
+        instance = self.instance
+        if not instance.original_name:
+            instance.original_name = os.path.basename(name or "")
+        if getattr(instance, "_hashed_content", None) is not content:
+            instance.refresh_file_metadata(content)
+        instance._hashed_content = None
+        super().save(name, content, save)
+
+
+class AttachmentFileField(models.FileField):
+    attr_class = AttachmentFieldFile
+
+    def deconstruct(self):
+        # Same column as a FileField; migrations need not know the difference.
+        name, path, args, kwargs = super().deconstruct()
+        return name, "django.db.models.FileField", args, kwargs
+
+
 class NoteAttachment(models.Model):
     note = models.ForeignKey(
         Note,
         on_delete=models.CASCADE,
         related_name="attachments",
     )
-    file = models.FileField(upload_to="notes/attachments/%Y/%m/%d/")
+    # Stored by content hash: identical files share one blob.
+    file = AttachmentFileField(
+        upload_to=attachment_upload_to,
+        storage=get_attachment_storage,
+        max_length=255,
+    )
     uploaded_at = models.DateTimeField(auto_now_add=True)
     original_name = models.CharField(max_length=255, blank=True)
     mime_type = models.CharField(max_length=100, blank=True)
+    size = models.PositiveBigIntegerField(null=True, blank=True, editable=False)
+    content_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        editable=False,
+        db_index=True,
+        help_text="SHA-256 of the file content.",
+    )
+    width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    derivatives = models.JSONField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Downscaled image variants, see infobjects.derivatives. "
+        "Empty when none are needed, null until generated.",
+    )
+
+    class TextStatus(models.TextChoices):
+        PENDING = "", "Pending"
+        PARTIAL = "PARTIAL", "Partially extracted"
+        DONE = "DONE", "Extracted"
+        SKIPPED = "SKIPPED", "Not a text file"
+        FAILED = "FAILED", "Failed"
+
+    # Progress of text extraction into the search index (infobjects.text_extraction).
+    text_status = models.CharField(
+        max_length=10,
+        choices=TextStatus.choices,
+        default=TextStatus.PENDING,
+        blank=True,
+        editable=False,
+    )
+    text_offset = models.PositiveBigIntegerField(
+        default=0,
+        editable=False,
+        help_text="Byte offset in the file where extraction resumes.",
+    )
+    text_chunks = models.PositiveIntegerField(default=0, editable=False)
+
+    METADATA_FIELDS = ["size", "content_hash", "mime_type", "width", "height"]
+    TEXT_FIELDS = ["text_status", "text_offset", "text_chunks"]
 
     def save(self, *args, **kwargs):
         if not self.original_name:
             self.original_name = self.file.name
+        if self.file and not self.file._committed:
+            self.refresh_file_metadata()
+        elif self.file and not self.content_hash:
+            try:
+                self.refresh_file_metadata()
+            except OSError:
+                # The stored file is gone; keep the row editable and leave
+                # its metadata empty.
+                pass
+        if getattr(self, "_metadata_refreshed", False):
+            self._metadata_refreshed = False
+            # New content, extract its text again from the start.
+            self.text_status = self.TextStatus.PENDING
+            self.text_offset = self.text_chunks = 0
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None:
+                kwargs["update_fields"] = list(
+                    {*update_fields, *self.METADATA_FIELDS, *self.TEXT_FIELDS}
+                )
         super().save(*args, **kwargs)
 
+    def get_download_url(self):
+        """File URL that downloads under the original name, not the hash."""
+        return f"{self.file.url}?{urlencode({'filename': self.original_name})}"
+
+    def refresh_file_metadata(self, content=None):
+        """
+        Stream the file once to fill size, hash, dimensions and, unless set
+        by the user, the MIME type. Works before the upload is committed,
+        and on content about to be saved as the file.
+        """
+        from .attachments import inspect_file
+
+        fieldfile = self.file
+        if content is None:
+            fieldfile.open("rb")
+            content = fieldfile.file
+            close = fieldfile._committed
+        else:
+            content.seek(0)
+            close = False
+        try:
+            info = inspect_file(content, name=self.original_name or fieldfile.name)
+        finally:
+            if close:
+                fieldfile.close()
+            else:
+                content.seek(0)
+
+        self.size = info.size
+        self.content_hash = info.content_hash
+        self.width = info.width
+        self.height = info.height
+        if not self.mime_type:
+            self.mime_type = info.mime_type
+        self._hashed_content = None if close else content
+        self._metadata_refreshed = True
+
     def __str__(self):
         return self.original_name or self.file.name
+
+
+class UploadSession(models.Model):
+    """
+    A resumable, chunked upload of one note attachment. Chunks are appended
+    to a temp file under MEDIA_ROOT (see infobjects.uploads); on completion
+    the file is moved into place and becomes a NoteAttachment.
+    """
+
+    class Status(models.TextChoices):
+        OPEN = "OPEN", "Open"
+        COMPLETE = "COMPLETE", "Complete"
+        ABORTED = "ABORTED", "Aborted"
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    note = models.ForeignKey(
+        Note,
+        on_delete=models.CASCADE,
+        related_name="upload_sessions",
+    )
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="upload_sessions",
+    )
+    original_name = models.CharField(max_length=255)
+    mime_type = models.CharField(max_length=100, blank=True)
+    total_size = models.PositiveBigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    received_bytes = models.PositiveBigIntegerField(default=0)
+    expected_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        help_text="SHA-256 announced by the client, checked on completion.",
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=Status.choices,
+        default=Status.OPEN,
+    )
+    attachment = models.OneToOneField(
+        NoteAttachment,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="upload_session",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.original_name} ({self.received_bytes}/{self.total_size})"
+
+    @property
+    def temp_name(self):
+        """Path of the partial file, relative to MEDIA_ROOT."""
+        from .uploads import UPLOAD_TEMP_DIR
+
+        return f"{UPLOAD_TEMP_DIR}/{self.id.hex}.part"
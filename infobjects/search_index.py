@@ -0,0 +1,287 @@
+import re
+from collections import OrderedDict
+
+from django.db import connection
+from django.urls import reverse
+from django.utils.html import escape
+
+# Table and triggers are created by migrations/0002_note_fts.py.
+NOTE_FTS_TABLE = "infobjects_note_fts"
+
+# SQLite rebuilds a table for most ALTERs and refuses to rename it while a
+# trigger elsewhere references it, so migrations touching infobjects_note or
+# infobjects_category must wrap their operations with
+# drop_note_fts_triggers / create_note_fts_triggers.
+NOTE_FTS_TRIGGERS = {
+    "infobjects_note_fts_ai": """
+        CREATE TRIGGER IF NOT EXISTS infobjects_note_fts_ai
+        AFTER INSERT ON infobjects_note BEGIN
+            INSERT INTO infobjects_note_fts(rowid, title, content, category_title)
+            VALUES (
+                new.id,
+                new.title,
+                new.content,
+                (SELECT title FROM infobjects_category WHERE id = new.category_id)
+            );
+        END
+    """,
+    "infobjects_note_fts_au": """
+        CREATE TRIGGER IF NOT EXISTS infobjects_note_fts_au
+        AFTER UPDATE OF title, content, category_id ON infobjects_note BEGIN
+            DELETE FROM infobjects_note_fts WHERE rowid = old.id;
+            INSERT INTO infobjects_note_fts(rowid, title, content, category_title)
+            VALUES (
+                new.id,
+                new.title,
+                new.content,
+                (SELECT title FROM infobjects_category WHERE id = new.category_id)
+            );
+        END
+    """,
+    "infobjects_note_fts_ad": """
+        CREATE TRIGGER IF NOT EXISTS infobjects_note_fts_ad
+        AFTER DELETE ON infobjects_note BEGIN
+            DELETE FROM infobjects_note_fts WHERE rowid = old.id;
+        END
+    """,
+    "infobjects_category_fts_au": """
+        CREATE TRIGGER IF NOT EXISTS infobjects_category_fts_au
+        AFTER UPDATE OF title ON infobjects_category BEGIN
+            UPDATE infobjects_note_fts
+            SET category_title = new.title
+            WHERE rowid IN (SELECT id FROM infobjects_note WHERE category_id = new.id);
+        END
+    """,
+}
+
+
+def drop_note_fts_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for name in NOTE_FTS_TRIGGERS:
+        schema_editor.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+
+def create_note_fts_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for statement in NOTE_FTS_TRIGGERS.values():
+        schema_editor.execute(statement)
+
+
+# Text extracted from attachments (infobjects.text_extraction), one row per
+# chunk. No Django model and no triggers: rows are written and deleted
+# explicitly, and rowid encodes (attachment id, chunk number) so deleting an
+# attachment's text is a rowid range delete.
+ATTACHMENT_FTS_TABLE = "infobjects_attachment_fts"
+ATTACHMENT_CHUNK_BITS = 20
+
+CREATE_ATTACHMENT_FTS = f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {ATTACHMENT_FTS_TABLE} USING fts5(
+        text,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+"""
+
+
+def create_attachment_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(CREATE_ATTACHMENT_FTS)
+
+
+def drop_attachment_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(f"DROP TABLE IF EXISTS {ATTACHMENT_FTS_TABLE}")
+
+
+def attachment_chunk_rowid(attachment_id, seq):
+    return (attachment_id << ATTACHMENT_CHUNK_BITS) | seq
+
+
+def index_attachment_chunks(attachment_id, first_seq, texts):
+    if connection.vendor != "sqlite" or not texts:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT OR REPLACE INTO {ATTACHMENT_FTS_TABLE}(rowid, text) VALUES (%s, %s)",
+            [
+                (attachment_chunk_rowid(attachment_id, first_seq + index), text)
+                for index, text in enumerate(texts)
+            ],
+        )
+
+
+def delete_attachment_text(attachment_id):
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {ATTACHMENT_FTS_TABLE} WHERE rowid BETWEEN %s AND %s",
+            [
+                attachment_chunk_rowid(attachment_id, 0),
+                attachment_chunk_rowid(attachment_id + 1, 0) - 1,
+            ],
+        )
+
+
+# bm25() column weights: title, content, category_title
+NOTE_FTS_WEIGHTS = (10.0, 1.0, 3.0)
+NOTE_FTS_LIMIT = 20
+NOTE_FTS_SNIPPET_TOKENS = 16
+
+# Control characters never show up in note text, so they are safe markers
+# for snippet()/highlight() until the text has been HTML-escaped.
+_MARK_START = "\x02"
+_MARK_END = "\x03"
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def build_match_expression(query: str) -> str | None:
+    """
+    Turn free text typed into the search box into an FTS5 MATCH expression.
+
+    Every word becomes a quoted prefix term, so operators and quotes typed by
+    the user can never produce a syntax error, and partially typed words
+    still match (search-as-you-type).
+    """
+    tokens = _TOKEN_RE.findall(query)
+    if not tokens:
+        return None
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def _mark_to_html(text: str) -> str:
+    return (
+        escape(text or "")
+        .replace(_MARK_START, "<mark>")
+        .replace(_MARK_END, "</mark>")
+    )
+
+
+def search_notes(query: str, limit: int = NOTE_FTS_LIMIT) -> list[tuple]:
+    """
+    Returns (note_id, title_html, snippet_html, rank) rows, best match first.
+    """
+    match = build_match_expression(query)
+    if match is None or connection.vendor != "sqlite":
+        return []
+
+    weights = ", ".join(str(weight) for weight in NOTE_FTS_WEIGHTS)
+    sql = f"""
+        SELECT
+            rowid,
+            highlight({NOTE_FTS_TABLE}, 0, %s, %s),
+            snippet({NOTE_FTS_TABLE}, -1, %s, %s, '…', %s),
+            bm25({NOTE_FTS_TABLE}, {weights}) AS rank
+        FROM {NOTE_FTS_TABLE}
+        WHERE {NOTE_FTS_TABLE} MATCH %s
+        ORDER BY rank
+        LIMIT %s
+    """
+    params = [
+        _MARK_START,
+        _MARK_END,
+        _MARK_START,
+        _MARK_END,
+        NOTE_FTS_SNIPPET_TOKENS,
+        match,
+        limit,
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    return [
+        (note_id, _mark_to_html(title), _mark_to_html(snippet), rank)
+        for note_id, title, snippet, rank in rows
+    ]
+
+
+def note_fts_search_provider(request, query):
+    """
+    Global search provider backed by the FTS5 note index.
+    Titles and snippets are HTML-escaped, matches are wrapped in <mark>.
+    """
+    results = []
+    for note_id, title, snippet, rank in search_notes(query):
+        results.append(
+            {
+                "title": title,
+                "content": snippet,
+                "url": reverse("infobjects:note_detail", kwargs={"pk": note_id}),
+                "rank": rank,
+            }
+        )
+    return results
+
+
+ATTACHMENT_FTS_LIMIT = 20
+
+
+def search_attachment_text(query: str, limit: int = ATTACHMENT_FTS_LIMIT) -> list[tuple]:
+    """
+    Returns (attachment_id, snippet_html, rank) rows, best chunk per
+    attachment, best match first.
+    """
+    match = build_match_expression(query)
+    if match is None or connection.vendor != "sqlite":
+        return []
+
+    sql = f"""
+        SELECT
+            rowid,
+            snippet({ATTACHMENT_FTS_TABLE}, 0, %s, %s, '…', %s),
+            bm25({ATTACHMENT_FTS_TABLE}) AS rank
+        FROM {ATTACHMENT_FTS_TABLE}
+        WHERE {ATTACHMENT_FTS_TABLE} MATCH %s
+        ORDER BY rank
+        LIMIT %s
+    """
+    params = [_MARK_START, _MARK_END, NOTE_FTS_SNIPPET_TOKENS, match, limit * 5]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    best = OrderedDict()
+    for rowid, snippet, rank in rows:
+        attachment_id = rowid >> ATTACHMENT_CHUNK_BITS
+        if attachment_id not in best:
+            best[attachment_id] = (attachment_id, _mark_to_html(snippet), rank)
+    return list(best.values())[:limit]
+
+
+def attachment_text_search_provider(request, query):
+    """
+    Global search provider over text extracted from attachments. Results
+    link to the parent note, titled with the note and attachment name.
+    """
+    from .models import NoteAttachment
+
+    rows = search_attachment_text(query)
+    if not rows:
+        return []
+    attachments = NoteAttachment.objects.select_related("note").only(
+        "id", "original_name", "file", "note__id", "note__title"
+    ).in_bulk([attachment_id for attachment_id, _, _ in rows])
+
+    results = []
+    for attachment_id, snippet, rank in rows:
+        attachment = attachments.get(attachment_id)
+        if attachment is None:
+            continue
+        name = attachment.original_name or attachment.file.name
+        results.append(
+            {
+                "title": escape(f"{attachment.note.title} — {name}"),
+                "content": snippet,
+                "url": reverse(
+                    "infobjects:note_detail", kwargs={"pk": attachment.note_id}
+                ),
+                "rank": rank,
+            }
+        )
+    return results
@@ -0,0 +1,237 @@
+import threading
+from collections import deque, namedtuple
+
+from django.urls import reverse
+
+from common.versions import bump_version, get_version
+
+from .models import Category, Note
+
+SidebarRow = namedtuple("SidebarRow", "id title category_id updated_at")
+SidebarCategory = namedtuple("SidebarCategory", "id title")
+
+SIDEBAR_VERSION = "infobjects:sidebar"
+SIDEBAR_CHANGELOG_SIZE = 1000
+
+_URL_SENTINEL = 987654321987
+
+
+class SidebarTree:
+    """
+    Process-local model of the note sidebar: (id, title, category, updated_at)
+    per note, never the content. Notes are loaded per category on first use
+    (or all at once for the "All categories" view) and then patched by the
+    model signals in infobjects.signals instead of being reloaded.
+
+    Every change bumps a version shared through the database (see
+    common.versions). A process that sees a version it did not produce drops
+    its state and reloads lazily, so other workers' writes are picked up at
+    the cost of one primary key lookup per request.
+    The last SIDEBAR_CHANGELOG_SIZE changes are kept so clients can ask for
+    "changes since version N" instead of re-rendering the whole list.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._url_parts = None
+        self._reset(None)
+
+    # -----------------------------------------------------------------
+    #  Versioning
+    # -----------------------------------------------------------------
+
+    def _reset(self, version):
+        self._version = version
+        self._rows = {}
+        self._by_category = {}
+        self._loaded_categories = set()
+        self._complete = False
+        self._categories = None
+        self._menu_cache = {}
+        self._changes = deque(maxlen=SIDEBAR_CHANGELOG_SIZE)
+
+    def _shared_version(self):
+        return get_version(SIDEBAR_VERSION)
+
+    def _sync(self):
+        version = self._shared_version()
+        if version != self._version:
+            self._reset(version)
+
+    def _bump(self):
+        version = bump_version(SIDEBAR_VERSION)
+        if self._version is not None and version == self._version + 1:
+            self._version = version
+            return True
+        # Someone else changed the tree in between, our copy may be stale.
+        self._reset(version)
+        return False
+
+    @property
+    def version(self):
+        with self._lock:
+            self._sync()
+            return self._version
+
+    # -----------------------------------------------------------------
+    #  Loading
+    # -----------------------------------------------------------------
+
+    def _add_row(self, row):
+        self._rows[row.id] = row
+        self._by_category.setdefault(row.category_id, set()).add(row.id)
+
+    def _remove_row(self, note_id):
+        row = self._rows.pop(note_id, None)
+        if row is not None:
+            self._by_category.get(row.category_id, set()).discard(note_id)
+        return row
+
+    def _load(self, category_id=None):
+        qs = Note.objects.order_by().values_list(
+            "id", "title", "category_id", "updated_at"
+        )
+        if category_id is not None:
+            qs = qs.filter(category_id=category_id)
+        for values in qs.iterator(chunk_size=2000):
+            self._add_row(SidebarRow(*values))
+        if category_id is None:
+            self._complete = True
+        else:
+            self._loaded_categories.add(category_id)
+
+    def _ensure_loaded(self, category_id=None):
+        if self._complete:
+            return
+        if category_id is None or category_id not in self._loaded_categories:
+            self._load(category_id)
+
+    # -----------------------------------------------------------------
+    #  Public API
+    # -----------------------------------------------------------------
+
+    def note_url(self, note_id):
+        if self._url_parts is None:
+            url = reverse("infobjects:note_detail", kwargs={"pk": _URL_SENTINEL})
+            self._url_parts = url.split(str(_URL_SENTINEL), 1)
+        prefix, suffix = self._url_parts
+        return f"{prefix}{note_id}{suffix}"
+
+    def serialize_row(self, row):
+        return {
+            "id": row.id,
+            "title": row.title,
+            "category_id": row.category_id,
+            "updated_at": row.updated_at.isoformat(),
+            "url": self.note_url(row.id),
+        }
+
+    def get_categories(self):
+        with self._lock:
+            self._sync()
+            if self._categories is None:
+                self._categories = [
+                    SidebarCategory(*values)
+                    for values in Category.objects.order_by("title").values_list(
+                        "id", "title"
+                    )
+                ]
+            return self._categories
+
+    def get_rows(self, category_id=None):
+        with self._lock:
+            self._sync()
+            self._ensure_loaded(category_id)
+            if category_id is None:
+                rows = self._rows.values()
+            else:
+                ids = self._by_category.get(category_id, ())
+                rows = (self._rows[note_id] for note_id in ids)
+            return sorted(rows, key=lambda r: (r.updated_at, r.id), reverse=True)
+
+    def get_menu_items(self, category_id=None):
+        """
+        Sidebar menu items, same shape as the "sidebar/menu_items.html"
+        template expects. Cached per category until the next change.
+        """
+        with self._lock:
+            self._sync()
+            items = self._menu_cache.get(category_id)
+            if items is None:
+                items = [
+                    {
+                        "label": row.title,
+                        "url": self.note_url(row.id),
+                        "children": [],
+                    }
+                    for row in self.get_rows(category_id)
+                ]
+                self._menu_cache[category_id] = items
+            return items
+
+    def changes_since(self, version):
+        """
+        List of changes after version, or None when they are no longer
+        known (too old, from another cache epoch) and the client must
+        reload the whole list.
+        """
+        with self._lock:
+            self._sync()
+            if version == self._version:
+                return []
+            if version > self._version or not self._changes:
+                return None
+            if self._changes[0]["version"] > version + 1:
+                return None
+            return [change for change in self._changes if change["version"] > version]
+
+    # -----------------------------------------------------------------
+    #  Patching (called from model signals)
+    # -----------------------------------------------------------------
+
+    def note_saved(self, note):
+        row = SidebarRow(note.pk, note.title, note.category_id, note.updated_at)
+        with self._lock:
+            self._sync()
+            if not self._bump():
+                return
+            previous = self._remove_row(row.id)
+            if (
+                self._complete
+                or row.category_id in self._loaded_categories
+                or previous is not None
+            ):
+                self._add_row(row)
+            self._menu_cache.pop(None, None)
+            self._menu_cache.pop(row.category_id, None)
+            if previous is not None:
+                self._menu_cache.pop(previous.category_id, None)
+            self._changes.append(
+                {"version": self._version, "op": "upsert", "note": self.serialize_row(row)}
+            )
+
+    def note_deleted(self, note):
+        with self._lock:
+            self._sync()
+            if not self._bump():
+                return
+            previous = self._remove_row(note.pk)
+            self._menu_cache.pop(None, None)
+            self._menu_cache.pop(note.category_id, None)
+            if previous is not None:
+                self._menu_cache.pop(previous.category_id, None)
+            self._changes.append(
+                {"version": self._version, "op": "delete", "note": {"id": note.pk}}
+            )
+
+    def categories_changed(self):
+        """
+        Category edits are rare, and deleting one re-parents its notes with a
+        bulk UPDATE that sends no Note signals, so just start over.
+        """
+        with self._lock:
+            self._bump()
+            self._reset(self._version)
+
+
+sidebar_tree = SidebarTree()
@@ -0,0 +1,95 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .autosave import note_write_buffer
+from .events import note_event_hub
+from .models import Category, Note, NoteAttachment
+from .derivatives import iter_derivative_names, schedule_derivatives
+from .search_index import delete_attachment_text
+from .storage import attachment_storage
+from .tasks import schedule_text_extraction
+from .sidebar import sidebar_tree
+
+
+def _publish_note_event(event_type, note):
+    data = {
+        "title": note.title,
+        "revision": note.revision,
+        "updated_at": note.updated_at.isoformat() if note.updated_at else None,
+    }
+    note_id, category_id = note.pk, note.category_id
+    # Only announce what other clients can already read.
+    transaction.on_commit(
+        lambda: note_event_hub.publish(event_type, note_id, category_id, **data)
+    )
+
+
+@receiver(pre_save, sender=Note)
+def note_saving_recv(sender, instance, raw=False, **kwargs):
+    # A save from outside the autosave API (admin, editor) goes after the
+    # note's buffered autosave, instead of that overwriting it later, and
+    # never reuses a revision the autosave (or anyone) stored meanwhile.
+    if raw or instance.pk is None or getattr(instance, "_autosave_flush", False):
+        return
+    note_write_buffer.flush_note(instance.pk)
+    stored = Note.objects.filter(pk=instance.pk).values_list("revision", flat=True).first()
+    if stored is not None and stored >= instance.revision:
+        instance.revision = stored + 1
+
+
+@receiver(post_save, sender=Note)
+def note_saved_recv(sender, instance, created=False, raw=False, **kwargs):
+    sidebar_tree.note_saved(instance)
+    _publish_note_event("note.created" if created else "note.updated", instance)
+
+
+@receiver(post_delete, sender=Note)
+def note_deleted_recv(sender, instance, **kwargs):
+    note_write_buffer.discard(instance.pk)
+    sidebar_tree.note_deleted(instance)
+    _publish_note_event("note.deleted", instance)
+
+
+def release_attachment_blob(name, content_hash="", derivative_names=()):
+    """
+    Delete a stored file once no attachment refers to it any more, and its
+    derivatives once no attachment has the same content.
+    Blobs are shared between attachments with identical content; an upload
+    that just reused this one keeps it (and its derivatives) for the GC.
+    """
+    with attachment_storage.blob_lock():
+        released = not name or attachment_storage.release(
+            name, NoteAttachment.objects.filter(file=name).exists
+        )
+        if released and derivative_names:
+            same_content = NoteAttachment.objects.filter(content_hash=content_hash)
+            for derivative_name in derivative_names:
+                attachment_storage.release(
+                    derivative_name, lambda: bool(content_hash) and same_content.exists()
+                )
+
+
+@receiver(post_save, sender=NoteAttachment)
+def attachment_saved_recv(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    transaction.on_commit(lambda: schedule_derivatives(instance))
+    transaction.on_commit(lambda: schedule_text_extraction(instance))
+
+
+@receiver(post_delete, sender=NoteAttachment)
+def attachment_deleted_recv(sender, instance, **kwargs):
+    name = instance.file.name
+    content_hash = instance.content_hash
+    derivative_names = list(iter_derivative_names(instance.derivatives))
+    delete_attachment_text(instance.pk)
+    transaction.on_commit(
+        lambda: release_attachment_blob(name, content_hash, derivative_names)
+    )
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed_recv(sender, instance, **kwargs):
+    sidebar_tree.categories_changed()
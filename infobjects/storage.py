@@ -0,0 +1,166 @@
+import contextlib
+import fcntl
+import os
+import re
+import time
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+from django.utils import timezone
+
+CAS_PREFIX = "cas"
+
+# Attachments saved before content addressing (or without a hash) keep
+# going to date directories.
+LEGACY_UPLOAD_TO = "notes/attachments/%Y/%m/%d/"
+
+_EXTENSION_RE = re.compile(r"^\.[a-z0-9]{1,10}$")
+
+# A blob written or reused this recently may belong to a row that is not
+# committed yet, so releasing it is left to the GC (gc_media).
+BLOB_CLAIM_SECONDS = 3600
+
+
+def claim_marker_path(path):
+    """
+    Dot file next to a blob whose mtime records its last reuse. The blob's
+    own mtime is left alone: protected_media derives ETag and
+    Last-Modified from it.
+    """
+    directory, filename = os.path.split(path)
+    return os.path.join(directory, f".{filename}.claim")
+
+
+def last_used(path):
+    """When the file at path was last written or claimed, None if it is gone."""
+    try:
+        written = os.stat(path).st_mtime
+    except FileNotFoundError:
+        return None
+    try:
+        return max(written, os.stat(claim_marker_path(path)).st_mtime)
+    except FileNotFoundError:
+        return written
+
+
+def remove_blob(path):
+    """Delete the file at path and its claim marker."""
+    os.remove(path)
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(claim_marker_path(path))
+
+
+def cas_name(content_hash: str, filename: str = "") -> str:
+    """
+    Storage name of a blob: cas/ab/cd/abcd…<ext>. The extension is kept so
+    MIME types can still be guessed from the path (protected_media, nginx).
+    """
+    extension = os.path.splitext(filename or "")[1].lower()
+    if not _EXTENSION_RE.match(extension):
+        extension = ""
+    return f"{CAS_PREFIX}/{content_hash[:2]}/{content_hash[2:4]}/{content_hash}{extension}"
+
+
+def is_cas_name(name: str) -> bool:
+    return (name or "").startswith(f"{CAS_PREFIX}/")
+
+
+def attachment_upload_to(instance, filename):
+    if instance.content_hash:
+        return cas_name(instance.content_hash, filename)
+    return os.path.join(timezone.now().strftime(LEGACY_UPLOAD_TO), filename)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    FileSystemStorage under MEDIA_ROOT where a name is derived from the
+    content hash (attachment_upload_to). Saving content that is already
+    stored writes nothing and returns the existing name, so every copy of a
+    file shares one blob. Blobs are written to a temp name and renamed, so
+    a reader never sees a partial file.
+
+    Blobs are shared between rows: never delete one directly, use
+    release() (see infobjects.signals) or the GC command. Reusing a blob
+    and releasing one both happen under blob_lock(), so a blob is never
+    deleted after an upload has decided to point at it.
+    """
+
+    @contextlib.contextmanager
+    def blob_lock(self):
+        """Exclusive lock on the blob store, across threads and processes."""
+        path = self.path(f"{CAS_PREFIX}/.lock")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "a") as lockfile:
+            fcntl.flock(lockfile, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lockfile, fcntl.LOCK_UN)
+
+    def claim(self, name):
+        """Mark an existing blob as just used; False if it is not stored."""
+        path = self.path(name)
+        with self.blob_lock():
+            if not os.path.exists(path):
+                return False
+            marker = claim_marker_path(path)
+            with open(marker, "a"):
+                pass
+            os.utime(marker)
+        return True
+
+    def release(self, name, in_use):
+        """
+        Delete name unless in_use() or it was claimed within
+        BLOB_CLAIM_SECONDS. Call with blob_lock() held. Returns True if the
+        file is gone.
+        """
+        if is_cas_name(name):
+            claimed_at = last_used(self.path(name))
+            if claimed_at is None:
+                return True
+            if time.time() - claimed_at < BLOB_CLAIM_SECONDS:
+                return False
+        if in_use():
+            return False
+        self.delete(name)
+        return True
+
+    def delete(self, name):
+        super().delete(name)
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(claim_marker_path(self.path(name)))
+
+    def get_available_name(self, name, max_length=None):
+        if is_cas_name(name):
+            return name
+        return super().get_available_name(name, max_length=max_length)
+
+    def _save(self, name, content):
+        if not is_cas_name(name):
+            return super()._save(name, content)
+        if self.claim(name):
+            return name
+        temp_name = super()._save(f"{name}.{uuid.uuid4().hex}.tmp", content)
+        os.replace(self.path(temp_name), self.path(name))
+        return name
+
+    def store_file(self, path, name):
+        """
+        Move a file that is already on the same volume into the store (or
+        drop it if the blob exists). Returns True if the file was moved.
+        """
+        destination = self.path(name)
+        if self.claim(name):
+            os.remove(path)
+            return False
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        os.replace(path, destination)
+        return True
+
+
+attachment_storage = ContentAddressedStorage()
+
+
+def get_attachment_storage():
+    return attachment_storage
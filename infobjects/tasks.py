@@ -0,0 +1,29 @@
+from django.tasks import task
+
+from .models import NoteAttachment
+from .text_extraction import extract_attachment_text, wants_text_extraction
+
+
+@task(takes_context=True, max_attempts=3, timeout=1800)
+def extract_attachment_text_task(context, attachment_id):
+    """Resumable, so a retry continues from the last committed offset."""
+    attachment = NoteAttachment.objects.filter(pk=attachment_id).first()
+    if attachment is None:
+        return None
+    try:
+        return str(extract_attachment_text(attachment))
+    except Exception:
+        if context.attempt >= context.task_result.task.max_attempts:
+            NoteAttachment.objects.filter(pk=attachment_id).update(
+                text_status=NoteAttachment.TextStatus.FAILED
+            )
+        raise
+
+
+def schedule_text_extraction(attachment):
+    """Enqueue text extraction for the attachment, once."""
+    if not wants_text_extraction(attachment):
+        return None
+    return extract_attachment_text_task.using(
+        dedupe_key=f"attachment-text:{attachment.pk}"
+    ).enqueue(attachment.pk)
@@ -1,3 +1,121 @@
-from django.test import TestCase
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .autosave import NoteWriteBuffer, note_write_buffer
+from .models import Note
+from .storage import BLOB_CLAIM_SECONDS, attachment_storage, cas_name, claim_marker_path
+
+
+class NoteWriteBufferTests(TestCase):
+    def setUp(self):
+        self.buffer = NoteWriteBuffer(flush_interval=60, max_pending_bytes=1 << 20)
+        # Flushed by the tests, not by a background thread.
+        self.buffer._ensure_flusher = lambda: None
+        self.note = Note.objects.create(title="Note", content="old")
+
+    def stored_content(self):
+        return Note.objects.values_list("content", flat=True).get(pk=self.note.pk)
+
+    def stage(self, content):
+        current = self.buffer.current(self.note.pk)
+        return self.buffer.stage(self.note.pk, current.title, content, current.revision + 1)
+
+    def test_save_is_acknowledged_only_once_stored(self):
+        write = self.stage("new")
+        self.assertIsNone(self.buffer.wait_stored(write, 0))
+        self.assertEqual(self.stored_content(), "old")
+
+        with mock.patch.object(Note, "save", side_effect=DatabaseError), self.assertLogs(
+            "infobjects.autosave", "ERROR"
+        ):
+            self.buffer.flush()
+        self.assertIsNone(self.buffer.wait_stored(write, 0))
+        self.assertEqual(self.stored_content(), "old")
+
+        self.buffer.flush()
+        self.assertIs(self.buffer.wait_stored(write, 0), True)
+        self.assertEqual(self.stored_content(), "new")
+
+    def test_coalesced_saves_store_the_latest(self):
+        first = self.stage("first")
+        second = self.stage("second")
+        self.buffer.flush()
+        self.assertIs(self.buffer.wait_stored(first, 0), True)
+        self.assertIs(self.buffer.wait_stored(second, 0), True)
+        self.assertEqual(self.stored_content(), "second")
+        self.assertEqual(Note.objects.get(pk=self.note.pk).revision, second.revision)
+
+    def test_save_made_elsewhere_is_not_overwritten(self):
+        write = self.stage("buffered")
+        note = Note.objects.get(pk=self.note.pk)
+        note.content = "elsewhere"
+        note.save()
+
+        with self.assertLogs("infobjects.autosave", "WARNING"):
+            self.buffer.flush()
+        self.assertIs(self.buffer.wait_stored(write, 0), False)
+        self.assertEqual(self.stored_content(), "elsewhere")
+
+
+@mock.patch.object(note_write_buffer, "enabled", False)
+class NoteSaveApiTests(TestCase):
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_user("user"))
+        self.note = Note.objects.create(title="Note", content="old")
+        self.url = reverse("infobjects_api:note_detail_ajax", args=[self.note.pk])
+
+    def save(self, **data):
+        return self.client.post(self.url, json.dumps(data), content_type="application/json")
+
+    def test_save_answers_with_the_stored_revision(self):
+        response = self.save(content="new", base_revision=self.note.revision)
+        self.assertEqual(response.status_code, 200)
+        note = Note.objects.get(pk=self.note.pk)
+        self.assertEqual((note.content, note.revision), ("new", response.json()["revision"]))
+
+    def test_stale_base_revision_is_rejected(self):
+        self.save(content="first", base_revision=self.note.revision)
+        response = self.save(content="second", base_revision=self.note.revision)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Note.objects.get(pk=self.note.pk).content, "first")
+
+
+class BlobClaimTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        content = b"shared content"
+        self.name = cas_name(hashlib.sha256(content).hexdigest(), "a.txt")
+        attachment_storage.save(self.name, ContentFile(content))
+        self.path = attachment_storage.path(self.name)
+        self.old = time.time() - 2 * BLOB_CLAIM_SECONDS
+        os.utime(self.path, (self.old, self.old))
+
+    def test_reuse_keeps_the_blob_mtime(self):
+        self.assertEqual(attachment_storage.save(self.name, ContentFile(b"x")), self.name)
+        self.assertEqual(os.stat(self.path).st_mtime, self.old)
+        # The reuse still protects the blob from release().
+        self.assertFalse(attachment_storage.release(self.name, lambda: False))
+
+    def test_release_after_the_claim_window_removes_blob_and_marker(self):
+        attachment_storage.claim(self.name)
+        marker = claim_marker_path(self.path)
+        os.utime(marker, (self.old, self.old))
+        self.assertTrue(attachment_storage.release(self.name, lambda: False))
+        self.assertFalse(os.path.exists(self.path))
+        self.assertFalse(os.path.exists(marker))
@@ -0,0 +1,248 @@
+import codecs
+import os
+import re
+import unicodedata
+from html.parser import HTMLParser
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import NoteAttachment
+from .search_index import delete_attachment_text, index_attachment_chunks
+from .storage import attachment_storage
+
+NOTE_TEXT_INDEX_SETTINGS = getattr(settings, "NOTE_TEXT_INDEX", {})
+
+READ_SIZE = NOTE_TEXT_INDEX_SETTINGS.get("READ_SIZE", 64 * 1024)
+# Characters per FTS row; snippets are taken from the best matching row.
+CHUNK_CHARS = NOTE_TEXT_INDEX_SETTINGS.get("CHUNK_CHARS", 4000)
+# Progress is committed (and extraction can resume) about this often.
+COMMIT_BYTES = NOTE_TEXT_INDEX_SETTINGS.get("COMMIT_BYTES", 1024 * 1024)
+# Text beyond this many bytes of a file is not indexed.
+MAX_TEXT_BYTES = NOTE_TEXT_INDEX_SETTINGS.get("MAX_TEXT_BYTES", 64 * 1024 * 1024)
+
+TEXT_TYPES = {
+    "text/plain",
+    "text/markdown",
+    "text/x-markdown",
+    "text/csv",
+    "application/json",
+    "text/html",
+}
+TEXT_EXTENSIONS = {".txt", ".md", ".markdown", ".csv", ".json", ".html", ".htm"}
+HTML_EXTENSIONS = {".html", ".htm"}
+
+# Lone surrogates come from undecodable bytes (surrogateescape), control
+# characters would clash with the snippet markers in search_index.
+_JUNK_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f\ud800-\udfff]")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def _extension(attachment):
+    return os.path.splitext(attachment.original_name or attachment.file.name)[1].lower()
+
+
+def is_text_attachment(attachment):
+    return (
+        attachment.mime_type in TEXT_TYPES
+        or _extension(attachment) in TEXT_EXTENSIONS
+    )
+
+
+def _is_html(attachment):
+    return attachment.mime_type == "text/html" or _extension(attachment) in HTML_EXTENSIONS
+
+
+def normalize_text(text):
+    text = unicodedata.normalize("NFKC", _JUNK_RE.sub(" ", text))
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+class PlainTextExtractor:
+    def __init__(self):
+        self._buffer = ""
+
+    def feed(self, text):
+        self._buffer += text
+
+    def close(self):
+        pass
+
+    def take(self):
+        """Text up to the last whitespace, the partial word stays pending."""
+        cut = max(self._buffer.rfind(" "), self._buffer.rfind("\n"))
+        if cut < 0 and len(self._buffer) < CHUNK_CHARS:
+            return ""
+        cut = len(self._buffer) if cut < 0 else cut + 1
+        text, self._buffer = self._buffer[:cut], self._buffer[cut:]
+        return text
+
+    def take_all(self):
+        text, self._buffer = self._buffer, ""
+        return text
+
+    def pending(self):
+        return self._buffer
+
+    def at_safe_point(self):
+        return True
+
+
+class HTMLTextExtractor(HTMLParser):
+    """Visible text of an HTML document; script and style are skipped."""
+
+    SKIP_TAGS = {"script", "style", "template", "noscript"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._parts = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip += 1
+        # Tags separate words: <td>a</td><td>b</td> is "a b".
+        self._parts.append(" ")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS and self._skip:
+            self._skip -= 1
+        self._parts.append(" ")
+
+    def handle_data(self, data):
+        if not self._skip:
+            self._parts.append(data)
+
+    def take(self):
+        text = "".join(self._parts)
+        self._parts = []
+        return text
+
+    take_all = take
+
+    def pending(self):
+        # Not yet parsed: an incomplete tag, or text waiting for the next tag.
+        return self.rawdata
+
+    def at_safe_point(self):
+        # A fresh parser started at the pending offset must be in the same state.
+        return not self._skip and self.cdata_elem is None
+
+
+class TextChunker:
+    """Cuts text into normalized chunks of about CHUNK_CHARS at word breaks."""
+
+    def __init__(self, size=CHUNK_CHARS):
+        self.size = size
+        self._buffer = ""
+        self._chunks = []
+
+    def add(self, text):
+        self._buffer += text
+        while len(self._buffer) >= self.size * 2:
+            cut = self._buffer.rfind(" ", 0, self.size)
+            cut = self.size if cut <= 0 else cut
+            self._append(self._buffer[:cut])
+            self._buffer = self._buffer[cut:]
+
+    def flush(self):
+        """All chunks so far, including the partial one."""
+        self._append(self._buffer)
+        chunks, self._buffer, self._chunks = self._chunks, "", []
+        return chunks
+
+    def _append(self, text):
+        text = normalize_text(text)
+        if text:
+            self._chunks.append(text)
+
+
+def _save_progress(attachment, chunks, offset, status):
+    """
+    Index chunks and record the new offset in one transaction. Returns False
+    if the attachment was deleted or someone else extracted it meanwhile.
+    """
+    with transaction.atomic():
+        updated = NoteAttachment.objects.filter(
+            pk=attachment.pk,
+            text_offset=attachment.text_offset,
+            text_chunks=attachment.text_chunks,
+        ).update(
+            text_offset=offset,
+            text_chunks=attachment.text_chunks + len(chunks),
+            text_status=status,
+        )
+        if not updated:
+            return False
+        index_attachment_chunks(attachment.pk, attachment.text_chunks, chunks)
+    attachment.text_offset = offset
+    attachment.text_chunks += len(chunks)
+    attachment.text_status = status
+    return True
+
+
+def extract_attachment_text(attachment, max_bytes=None):
+    """
+    Stream a text attachment into the attachment search index.
+
+    The file is read in READ_SIZE blocks and never held in memory as a
+    whole. Progress (byte offset and chunk count) is committed together with
+    the indexed text every COMMIT_BYTES, so an interrupted run resumes where
+    it stopped. Returns the attachment's final text_status.
+    """
+    Status = NoteAttachment.TextStatus
+    if attachment.text_status in (Status.DONE, Status.SKIPPED):
+        return attachment.text_status
+    if not attachment.file or not is_text_attachment(attachment):
+        _save_progress(attachment, [], attachment.text_offset, Status.SKIPPED)
+        return Status.SKIPPED
+
+    max_bytes = MAX_TEXT_BYTES if max_bytes is None else max_bytes
+    if attachment.text_offset == 0 and attachment.text_chunks == 0:
+        # Starting over, e.g. after the file was replaced.
+        delete_attachment_text(attachment.pk)
+
+    extractor = HTMLTextExtractor() if _is_html(attachment) else PlainTextExtractor()
+    chunker = TextChunker()
+    # surrogateescape keeps undecodable bytes countable, see pending offsets.
+    decoder = codecs.getincrementaldecoder("utf-8")("surrogateescape")
+    position = attachment.text_offset
+
+    with attachment_storage.open(attachment.file.name, "rb") as fileobj:
+        fileobj.seek(position)
+        if position == 0 and fileobj.read(3) != codecs.BOM_UTF8:
+            fileobj.seek(0)
+        position = fileobj.tell()
+        since_commit = 0
+
+        while True:
+            block = fileobj.read(max(min(READ_SIZE, max_bytes - position), 0))
+            position += len(block)
+            since_commit += len(block)
+            extractor.feed(decoder.decode(block, final=not block))
+
+            if not block:
+                extractor.close()
+                chunker.add(extractor.take_all())
+                if not _save_progress(
+                    attachment, chunker.flush(), position, Status.DONE
+                ):
+                    return None
+                return Status.DONE
+
+            chunker.add(extractor.take())
+            if since_commit < COMMIT_BYTES or not extractor.at_safe_point():
+                continue
+
+            held = extractor.pending().encode("utf-8", "surrogateescape")
+            undecoded = decoder.getstate()[0]
+            offset = position - len(held) - len(undecoded)
+            if not _save_progress(attachment, chunker.flush(), offset, Status.PARTIAL):
+                return None
+            since_commit = 0
+
+
+
+def wants_text_extraction(attachment):
+    Status = NoteAttachment.TextStatus
+    return attachment.text_status in (Status.PENDING, Status.PARTIAL)
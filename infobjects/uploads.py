@@ -0,0 +1,264 @@
+import hashlib
+import os
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .attachments import HEAD_SIZE, describe_file
+from .models import NoteAttachment, UploadSession
+from .storage import attachment_storage
+
+NOTE_UPLOADS_SETTINGS = getattr(settings, "NOTE_UPLOADS", {})
+
+CHUNK_SIZE = NOTE_UPLOADS_SETTINGS.get("CHUNK_SIZE", 8 * 1024 * 1024)
+MAX_UPLOAD_SIZE = NOTE_UPLOADS_SETTINGS.get("MAX_UPLOAD_SIZE", 20 * 1024**3)
+# Relative to MEDIA_ROOT, so completed files can be renamed into place.
+UPLOAD_TEMP_DIR = NOTE_UPLOADS_SETTINGS.get("TEMP_DIR", "uploads/tmp")
+
+READ_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400, **data):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.data = data
+
+
+# Running SHA-256 per open session, keyed by session id, as (offset, hasher).
+# Lost on restart and rebuilt from the temp file on the next chunk.
+_hashers = {}
+_session_locks = {}
+_registry_lock = threading.Lock()
+
+
+def _session_lock(session_id):
+    with _registry_lock:
+        return _session_locks.setdefault(session_id, threading.Lock())
+
+
+def _forget(session_id):
+    with _registry_lock:
+        _hashers.pop(session_id, None)
+        _session_locks.pop(session_id, None)
+
+
+def temp_path(session):
+    return os.path.join(settings.MEDIA_ROOT, session.temp_name)
+
+
+def _hasher_at(session):
+    cached = _hashers.get(session.id)
+    if cached is not None and cached[0] == session.received_bytes:
+        return cached[1]
+
+    hasher = hashlib.sha256()
+    remaining = session.received_bytes
+    with open(temp_path(session), "rb") as fileobj:
+        while remaining:
+            chunk = fileobj.read(min(READ_SIZE, remaining))
+            if not chunk:
+                raise UploadError(
+                    "Partial upload is shorter than recorded, restart the upload",
+                    status=410,
+                )
+            hasher.update(chunk)
+            remaining -= len(chunk)
+    return hasher
+
+
+def serialize_session(session):
+    return {
+        "id": str(session.id),
+        "note_id": session.note_id,
+        "name": session.original_name,
+        "size": session.total_size,
+        "chunk_size": session.chunk_size,
+        "offset": session.received_bytes,
+        "status": session.status,
+        "attachment_id": session.attachment_id,
+    }
+
+
+def create_session(note, owner, name, total_size, mime_type="", expected_hash=""):
+    name = os.path.basename(name or "").strip()
+    if not name:
+        raise UploadError("name is required")
+    if not isinstance(total_size, int) or isinstance(total_size, bool) or total_size < 0:
+        raise UploadError("size must be a non-negative integer")
+    if total_size > MAX_UPLOAD_SIZE:
+        raise UploadError(f"size exceeds {MAX_UPLOAD_SIZE} bytes", status=413)
+    expected_hash = (expected_hash or "").lower()
+    if expected_hash and (
+        len(expected_hash) != 64
+        or any(c not in "0123456789abcdef" for c in expected_hash)
+    ):
+        raise UploadError("sha256 must be 64 hex digits")
+
+    session = UploadSession(
+        note=note,
+        owner=owner,
+        original_name=name[:255],
+        mime_type=(mime_type or "")[:100],
+        total_size=total_size,
+        chunk_size=CHUNK_SIZE,
+        expected_hash=expected_hash,
+    )
+    if expected_hash:
+        # Only content this user has uploaded before: a hash alone is no
+        # proof of having the file.
+        existing = (
+            NoteAttachment.objects.filter(
+                content_hash=expected_hash,
+                size=total_size,
+                upload_session__owner=owner,
+                upload_session__status=UploadSession.Status.COMPLETE,
+            )
+            .only(*NoteAttachment.METADATA_FIELDS, "file")
+            .first()
+        )
+        if existing is not None and attachment_storage.claim(existing.file.name):
+            # Content is already stored: attach it without receiving a byte.
+            return _attach_existing(session, existing)
+
+    path = temp_path(session)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, "wb").close()
+    session.save()
+    return session
+
+
+def _attach_existing(session, existing):
+    with transaction.atomic():
+        attachment = NoteAttachment(
+            note=session.note,
+            original_name=session.original_name,
+            mime_type=session.mime_type or existing.mime_type,
+            size=existing.size,
+            content_hash=existing.content_hash,
+            width=existing.width,
+            height=existing.height,
+        )
+        attachment.file.name = existing.file.name
+        attachment.save()
+        session.received_bytes = session.total_size
+        session.status = UploadSession.Status.COMPLETE
+        session.attachment = attachment
+        session.save()
+    return session
+
+
+def write_chunk(session_id, offset, stream, length):
+    """
+    Append `length` bytes read from `stream` at `offset`. Chunks must arrive
+    in order; a chunk that was already stored is acknowledged again, so a
+    client can blindly retry after a timeout.
+    """
+    with _session_lock(session_id):
+        session = UploadSession.objects.get(pk=session_id)
+        if session.status != UploadSession.Status.OPEN:
+            raise UploadError(f"Upload is {session.status.lower()}", status=409)
+
+        received = session.received_bytes
+        if offset < received and offset + length <= received:
+            return session
+        if offset != received:
+            raise UploadError("Unexpected offset", status=409, offset=received)
+        if length <= 0 or length > session.chunk_size:
+            raise UploadError(f"Chunks must be 1 to {session.chunk_size} bytes")
+        if offset + length > session.total_size:
+            raise UploadError("Chunk goes past the announced size")
+        if length < session.chunk_size and offset + length != session.total_size:
+            raise UploadError("Only the last chunk may be short")
+
+        hasher = _hasher_at(session).copy()
+        written = 0
+        with open(temp_path(session), "r+b") as fileobj:
+            # Drop whatever a request that died half-way left behind.
+            fileobj.seek(offset)
+            fileobj.truncate()
+            while written < length:
+                data = stream.read(min(READ_SIZE, length - written))
+                if not data:
+                    break
+                fileobj.write(data)
+                hasher.update(data)
+                written += len(data)
+            fileobj.flush()
+            os.fsync(fileobj.fileno())
+        if written != length:
+            raise UploadError("Chunk was cut short", offset=received)
+
+        session.received_bytes = offset + length
+        UploadSession.objects.filter(pk=session.pk, received_bytes=offset).update(
+            received_bytes=session.received_bytes, updated_at=timezone.now()
+        )
+        _hashers[session.id] = (session.received_bytes, hasher)
+        return session
+
+
+def complete_session(session_id):
+    """
+    Turn a fully received upload into a NoteAttachment. The temp file is
+    renamed into the attachment store, never copied, or just dropped when
+    the same content is already stored.
+    """
+    with _session_lock(session_id):
+        session = UploadSession.objects.select_related("note").get(pk=session_id)
+        if session.status == UploadSession.Status.COMPLETE:
+            return session
+        if session.status != UploadSession.Status.OPEN:
+            raise UploadError(f"Upload is {session.status.lower()}", status=409)
+        if session.received_bytes != session.total_size:
+            raise UploadError(
+                "Upload is not finished", status=409, offset=session.received_bytes
+            )
+
+        content_hash = _hasher_at(session).hexdigest()
+        if session.expected_hash and content_hash != session.expected_hash:
+            abort_session(session)
+            raise UploadError("Checksum mismatch, upload discarded", status=422)
+
+        source = temp_path(session)
+        with open(source, "rb") as fileobj:
+            head = fileobj.read(HEAD_SIZE)
+        info = describe_file(head, session.original_name, session.total_size, content_hash)
+
+        attachment = NoteAttachment(
+            note=session.note,
+            original_name=session.original_name,
+            mime_type=session.mime_type or info.mime_type,
+            size=info.size,
+            content_hash=info.content_hash,
+            width=info.width,
+            height=info.height,
+        )
+        file_field = NoteAttachment._meta.get_field("file")
+        attachment.file.name = file_field.generate_filename(
+            attachment, session.original_name
+        )
+
+        # The blob goes in first, so a committed row always has its file.
+        # A failed save leaves at worst an unreferenced blob for the GC.
+        attachment_storage.store_file(source, attachment.file.name)
+        with transaction.atomic():
+            attachment.save()
+            session.status = UploadSession.Status.COMPLETE
+            session.attachment = attachment
+            session.save(update_fields=["status", "attachment", "updated_at"])
+
+        _forget(session.id)
+        return session
+
+
+def abort_session(session):
+    session.status = UploadSession.Status.ABORTED
+    session.save(update_fields=["status", "updated_at"])
+    try:
+        os.remove(temp_path(session))
+    except FileNotFoundError:
+        pass
+    _forget(session.id)
@@ -6,4 +6,21 @@ app_name = "infobjects_api"
 
 urlpatterns = [
     path("notes/<int:pk>/", views.NoteDetailViewApi.as_view(), name="note_detail_ajax"),
+    path("notes/sidebar/", views.note_sidebar_api, name="note_sidebar_ajax"),
+    path("notes/events/", views.note_events_stream, name="note_events_stream"),
+    path(
+        "notes/<int:pk>/uploads/",
+        views.NoteUploadSessionCreateApi.as_view(),
+        name="note_upload_create",
+    ),
+    path(
+        "uploads/<uuid:upload_id>/",
+        views.UploadSessionApi.as_view(),
+        name="upload_session",
+    ),
+    path(
+        "uploads/<uuid:upload_id>/complete/",
+        views.UploadSessionCompleteApi.as_view(),
+        name="upload_session_complete",
+    ),
 ]
@@ -1,9 +1,11 @@
+import asyncio
+import hashlib
 import json
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q
+from django.db.models import Count, Max, Prefetch, Q
 from django.template import Template
 from django.template.loader import render_to_string
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.views import View
 from django.views.generic import (
     ListView,
@@ -13,16 +15,44 @@ from django.views.generic import (
     DeleteView,
 )
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.http import HttpResponse, HttpResponseRedirect, JsonResponse
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseRedirect,
+    JsonResponse,
+    StreamingHttpResponse,
+)
 from django.shortcuts import get_object_or_404, redirect, render
+from django.utils.cache import patch_cache_control
+from django.utils.decorators import method_decorator
+from django.utils.http import quote_etag
+from django.views.decorators.http import condition
 
 from django.views.generic.detail import SingleObjectMixin
 
 from iommi.style_base import base
 
 from infobjects.breadcrumbs import get_breadcrumbs_context
-
-from .models import Category, Note
+from infobjects.sidebar import sidebar_tree
+
+from .autosave import (
+    AUTOSAVE_BUFFER_SETTINGS,
+    TextPatchError,
+    apply_text_ops,
+    note_write_buffer,
+    parse_text_ops,
+)
+from .derivatives import serialize_derivatives
+from .events import NoteSubscription, stream_note_events
+from .uploads import (
+    UploadError,
+    abort_session,
+    complete_session,
+    create_session,
+    serialize_session,
+    write_chunk,
+)
+from .models import Category, Note, NoteAttachment, UploadSession
 from .forms import CategoryForm, NoteForm, NoteAttachmentFormSet
 
 from iommi import Action, Column, Header, Page, Form, Table, html
@@ -130,32 +160,6 @@ class CategoryDeleteView(LoginRequiredMixin, DeleteView):
     success_url = reverse_lazy("infobjects:category_list")
 
 
-def map_notes_to_menu_items(notes):
-    """
-    Convert a list/queryset of Note objects into sidebar menu items format.
-
-    Expected output structure:
-
-    [
-        {"label": ..., "url": ..., "children": []},
-        ...
-    ]
-    """
-
-    items = []
-
-    for note in notes:
-        items.append(
-            {
-                "label": note.title,
-                "url": note.get_absolute_url(),
-                "children": [],
-            }
-        )
-
-    return items
-
-
 def note_list(request):
     if request.headers.get("x-requested-with") == "XMLHttpRequest":
         html = render_to_string(
@@ -202,6 +206,7 @@ class NoteCreateEditView(View):
     def get_object(self):
         pk = self.kwargs.get("pk")
         if pk is not None:
+            note_write_buffer.flush_note(pk)
             return get_object_or_404(Note, pk=pk)
         return None
 
@@ -243,24 +248,86 @@ class NoteCreateEditView(View):
         )
 
 
+def _selected_category_id(request):
+    category_id = request.GET.get("category", "")
+    try:
+        return category_id, int(category_id) if category_id else None
+    except ValueError:
+        return category_id, None
+
+
 def get_sidebar_context(request, **kwargs):
+    """
+    Sidebar context served from the cached SidebarTree, see infobjects.sidebar.
+    """
     context = {}
 
-    category_id = request.GET.get("category", "")
+    category_id, category_pk = _selected_category_id(request)
 
-    context["categories"] = Category.objects.order_by("title")
+    context["categories"] = sidebar_tree.get_categories()
     context["selected_category"] = category_id
+    context["menu_items"] = sidebar_tree.get_menu_items(category_pk)
+    context["sidebar_version"] = sidebar_tree.version
 
-    if category_id:
-        notes = Note.objects.filter(Q(category_id=category_id)).select_related(
-            "category"
-        )
-    else:
-        notes = Note.objects.select_related("category")
+    return context
 
-    context["menu_items"] = map_notes_to_menu_items(notes)
 
-    return context
+@login_required
+def note_sidebar_api(request) -> JsonResponse:
+    """
+    JSON sidebar feed.
+
+    ?since=<version> returns only the changes after that version:
+        {"version": 12, "changes": [{"version": 12, "op": "upsert", "note": {...}}]}
+    Without it, or when the version is too old, the full (optionally
+    ?category= filtered) list is returned:
+        {"version": 12, "full": true, "notes": [{...}, ...]}
+    """
+    _category_id, category_pk = _selected_category_id(request)
+    since = request.GET.get("since")
+
+    if since is not None:
+        try:
+            changes = sidebar_tree.changes_since(int(since))
+        except ValueError:
+            changes = None
+        if changes is not None:
+            return JsonResponse(
+                {"version": sidebar_tree.version, "changes": changes}
+            )
+
+    notes = [sidebar_tree.serialize_row(row) for row in sidebar_tree.get_rows(category_pk)]
+    return JsonResponse({"version": sidebar_tree.version, "full": True, "notes": notes})
+
+
+def _parse_id_list(value):
+    return {int(part) for part in (value or "").split(",") if part.strip().isdigit()}
+
+
+async def note_events_stream(request) -> StreamingHttpResponse:
+    """
+    Server-Sent Events feed of note changes (note.created, note.updated,
+    note.deleted), needs an ASGI server.
+
+    ?notes=1,2&categories=3 limits the feed to those notes / categories.
+    Reconnects send Last-Event-ID and get the missed events replayed, or a
+    "reset" event when they are no longer buffered.
+    """
+    subscription = NoteSubscription(
+        asyncio.get_running_loop(),
+        note_ids=_parse_id_list(request.GET.get("notes")),
+        category_ids=_parse_id_list(request.GET.get("categories")),
+    )
+    last_event_id = request.headers.get("Last-Event-ID") or request.GET.get(
+        "last_event_id"
+    )
+    response = StreamingHttpResponse(
+        stream_note_events(subscription, last_event_id),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
 
 
 class NoteDetailView(LoginRequiredMixin, DetailView):
@@ -268,6 +335,10 @@ class NoteDetailView(LoginRequiredMixin, DetailView):
     template_name = "infobjects/note_detail.html"
     context_object_name = "note"
 
+    def get_object(self, queryset=None):
+        note_write_buffer.flush_note(self.kwargs["pk"])
+        return super().get_object(queryset)
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context.update(get_sidebar_context(self.request))
@@ -275,6 +346,96 @@ class NoteDetailView(LoginRequiredMixin, DetailView):
         return context
 
 
+def get_note_validators(request, pk, refresh=False):
+    """
+    (etag, last_modified) for a note, without loading its content.
+
+    The ETag covers the note's revision (bumped on every save), its
+    attachment set (count and highest id change on every add or remove) and
+    how many attachments have their derivatives, which are written later
+    with a queryset update that changes nothing else. The
+    result is memoized on the request, since condition() asks for both
+    validators separately.
+
+    Reads flush the note's buffered autosave first. Writes look at the pending
+    revision instead, so If-Match during a burst of autosaves doesn't force
+    a flush per request.
+    """
+    memo = getattr(request, "_note_validators", {})
+    if not refresh and pk in memo:
+        return memo[pk]
+
+    pending = None
+    if request.method in ("GET", "HEAD"):
+        note_write_buffer.flush_note(pk)
+    else:
+        pending = note_write_buffer.get(pk)
+
+    attachment_aggregates = dict(
+        attachment_count=Count("attachments"),
+        attachment_max_id=Max("attachments__id"),
+        attachment_derived=Count(
+            "attachments", filter=Q(attachments__derivatives__isnull=False)
+        ),
+        attachment_uploaded_at=Max("attachments__uploaded_at"),
+    )
+    if pending is not None:
+        row = Note.objects.filter(pk=pk).aggregate(**attachment_aggregates)
+        row.update(pk=pk, revision=pending.revision, updated_at=pending.staged_at)
+    else:
+        row = (
+            Note.objects.filter(pk=pk)
+            .order_by()
+            .values("pk", "updated_at", "revision")
+            .annotate(**attachment_aggregates)
+            .first()
+        )
+    if row is None:
+        validators = (None, None)
+    else:
+        fingerprint = "{pk}:{revision}:{count}:{max_id}:{derived}".format(
+            pk=row["pk"],
+            revision=row["revision"],
+            count=row["attachment_count"],
+            max_id=row["attachment_max_id"],
+            derived=row["attachment_derived"],
+        )
+        etag = hashlib.blake2b(fingerprint.encode(), digest_size=12).hexdigest()
+        last_modified = max(
+            filter(None, [row["updated_at"], row["attachment_uploaded_at"]])
+        )
+        validators = (etag, last_modified)
+
+    memo[pk] = validators
+    request._note_validators = memo
+    return validators
+
+
+# Everything the note API shows about an attachment comes from these columns,
+# the file itself is never touched (no stat per attachment per poll).
+NOTE_API_ATTACHMENT_FIELDS = [
+    "id",
+    "note_id",
+    "file",
+    "original_name",
+    "uploaded_at",
+    "derivatives",
+    *NoteAttachment.METADATA_FIELDS,
+]
+
+
+def _note_etag(request, pk, *args, **kwargs):
+    return get_note_validators(request, pk)[0]
+
+
+def _note_last_modified(request, pk, *args, **kwargs):
+    return get_note_validators(request, pk)[1]
+
+
+@method_decorator(
+    condition(etag_func=_note_etag, last_modified_func=_note_last_modified),
+    name="dispatch",
+)
 class NoteDetailViewApi(LoginRequiredMixin, SingleObjectMixin, View):
     """
     JSON endpoint for auto-update (AJAX/htmx).
@@ -287,13 +448,26 @@ class NoteDetailViewApi(LoginRequiredMixin, SingleObjectMixin, View):
         "note_type": "PLAINTEXT"
       }
     }
+
+    GET honours If-None-Match / If-Modified-Since and answers 304 without
+    touching the note content. POST honours If-Match (412 on mismatch) and
+    returns the new ETag so the client can chain saves.
     """
 
     model = Note
     context_object_name = "note"
 
     def get(self, request, pk, *args, **kwargs):
-        note = get_object_or_404(Note, pk=pk)
+        note_write_buffer.flush_note(pk)
+        note = get_object_or_404(
+            Note.objects.prefetch_related(
+                Prefetch(
+                    "attachments",
+                    queryset=NoteAttachment.objects.only(*NOTE_API_ATTACHMENT_FIELDS),
+                )
+            ),
+            pk=pk,
+        )
 
         # Map your internal type to whatever string you want to expose
         # Here I just pass the raw DB value; you can adjust if needed.
@@ -307,8 +481,14 @@ class NoteDetailViewApi(LoginRequiredMixin, SingleObjectMixin, View):
             {
                 "id": att.id,
                 "name": att.file.name,
-                "url": att.file.url,
-                "size": att.file.size,
+                "url": att.get_download_url(),
+                "original_name": att.original_name,
+                "size": att.size,
+                "mime_type": att.mime_type,
+                "content_hash": att.content_hash,
+                "width": att.width,
+                "height": att.height,
+                "derivatives": serialize_derivatives(att.derivatives),
                 "uploaded": att.uploaded_at.isoformat(),
             }
             for att in note.attachments.all()
@@ -322,13 +502,27 @@ class NoteDetailViewApi(LoginRequiredMixin, SingleObjectMixin, View):
                 "note_type": type_mapping.get(note.type, note.type),
                 "note_attachments": attachments,
                 "note_updated_at": note.updated_at,
+                "note_revision": note.revision,
             },
         }
-        return JsonResponse(payload)
+        response = JsonResponse(payload)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
 
     def post(self, request, *args, **kwargs):
-        note = self.get_object()
-
+        """
+        Two save modes:
+          {"content": "...", "title": "...", "base_revision": 7}
+              full replace (base_revision optional)
+          {"mode": "patch", "base_revision": 7,
+           "ops": [{"offset": 10, "delete": 3, "insert": "abc"}]}
+              apply text operations to the content of base_revision
+        A stale base_revision is rejected with 409 and the current revision.
+
+        Saves go to note_write_buffer and are answered once its next flush
+        stored them, with 202 if that takes longer than ACK_TIMEOUT, or with
+        409 if the note was saved elsewhere in the meantime.
+        """
         try:
             data = json.loads(request.body.decode("utf-8"))
         except (ValueError, TypeError):
@@ -337,23 +531,204 @@ class NoteDetailViewApi(LoginRequiredMixin, SingleObjectMixin, View):
                 status=400,
             )
 
-        content = data.get("content")
+        mode = data.get("mode", "full")
+        base_revision = data.get("base_revision")
+        if mode not in ("full", "patch"):
+            return JsonResponse(
+                {"status": "error", "message": f"Unknown mode {mode!r}"}, status=400
+            )
+        if mode == "patch" and not isinstance(base_revision, int):
+            return JsonResponse(
+                {"status": "error", "message": "patch mode requires base_revision"},
+                status=400,
+            )
+
+        try:
+            ops = parse_text_ops(data.get("ops")) if mode == "patch" else None
+        except TextPatchError as exc:
+            return JsonResponse({"status": "error", "message": str(exc)}, status=400)
+
         title = data.get("note_title") or data.get("title")  # support both keys
 
-        changed_fields = []
+        pk = self.kwargs["pk"]
+        with note_write_buffer.lock:
+            note = note_write_buffer.current(pk)
+            if note is None:
+                raise Http404("No Note matches the given query.")
+            if base_revision is not None and base_revision != note.revision:
+                return JsonResponse(
+                    {
+                        "status": "conflict",
+                        "message": "Note was changed since base_revision",
+                        "revision": note.revision,
+                    },
+                    status=409,
+                )
+
+            if mode == "patch":
+                try:
+                    content = apply_text_ops(note.content, ops)
+                except TextPatchError as exc:
+                    return JsonResponse(
+                        {"status": "error", "message": str(exc)}, status=400
+                    )
+            else:
+                content = data.get("content")
+
+            if content is None:
+                content = note.content
+            if title is None:
+                title = note.title
+
+            staged = None
+            if content != note.content or title != note.title:
+                note = staged = note_write_buffer.stage(
+                    pk, title, content, note.revision + 1
+                )
+
+        stored = True
+        if staged is not None:
+            stored = note_write_buffer.wait_stored(
+                staged, AUTOSAVE_BUFFER_SETTINGS.get("ACK_TIMEOUT", 5.0)
+            )
+            if stored is False:
+                current = note_write_buffer.current(pk)
+                if current is None:
+                    raise Http404("No Note matches the given query.")
+                return JsonResponse(
+                    {
+                        "status": "conflict",
+                        "message": "Note was changed elsewhere before the save was stored",
+                        "revision": current.revision,
+                    },
+                    status=409,
+                )
+
+        etag = quote_etag(get_note_validators(request, pk, refresh=True)[0])
+        response = JsonResponse(
+            {
+                "status": "ok",
+                "updated_at": note.staged_at.isoformat(),
+                "revision": note.revision,
+                "etag": etag,
+            },
+            # Accepted, but not stored yet.
+            status=200 if stored else 202,
+        )
+        response["ETag"] = etag
+        return response
+
+
+def _upload_error_response(exc):
+    return JsonResponse(
+        {"status": "error", "message": exc.message, **exc.data}, status=exc.status
+    )
+
+
+class NoteUploadSessionCreateApi(LoginRequiredMixin, View):
+    """
+    Start a resumable upload of one attachment:
+        POST {"name": "scan.pdf", "size": 123456789,
+              "mime_type": "application/pdf", "sha256": "..."}
+    mime_type and sha256 are optional. Answers 201 with the session, the
+    chunk size to use and its URL.
+    """
+
+    def post(self, request, pk, *args, **kwargs):
+        note = get_object_or_404(Note.objects.only("pk"), pk=pk)
+        try:
+            data = json.loads(request.body.decode("utf-8"))
+        except (ValueError, TypeError):
+            return JsonResponse(
+                {"status": "error", "message": "Invalid JSON payload"}, status=400
+            )
+        try:
+            session = create_session(
+                note,
+                request.user,
+                name=data.get("name"),
+                total_size=data.get("size"),
+                mime_type=data.get("mime_type", ""),
+                expected_hash=data.get("sha256", ""),
+            )
+        except UploadError as exc:
+            return _upload_error_response(exc)
+
+        result = serialize_session(session)
+        result["url"] = reverse("infobjects_api:upload_session", args=[session.pk])
+        return JsonResponse({"status": "ok", "result": result}, status=201)
+
+
+class UploadSessionApi(LoginRequiredMixin, View):
+    """
+    GET     status; "offset" is where the next chunk starts
+    PUT     raw chunk body, offset in the Upload-Offset header
+    DELETE  abort and drop the partial file
+    """
+
+    def get_session(self):
+        return get_object_or_404(
+            UploadSession, pk=self.kwargs["upload_id"], owner=self.request.user
+        )
 
-        if content is not None and content != note.content:
-            note.content = content
-            changed_fields.append("content")
+    def get(self, request, *args, **kwargs):
+        return JsonResponse(
+            {"status": "ok", "result": serialize_session(self.get_session())}
+        )
 
-        if title is not None and title != note.title:
-            note.title = title
-            changed_fields.append("title")
+    def put(self, request, *args, **kwargs):
+        session = self.get_session()
+        try:
+            offset = int(request.headers.get("Upload-Offset", ""))
+            length = int(request.headers.get("Content-Length", ""))
+        except ValueError:
+            return JsonResponse(
+                {
+                    "status": "error",
+                    "message": "Upload-Offset and Content-Length are required",
+                },
+                status=400,
+            )
+        try:
+            session = write_chunk(session.pk, offset, request, length)
+        except UploadError as exc:
+            return _upload_error_response(exc)
+        return JsonResponse({"status": "ok", "result": serialize_session(session)})
 
-        if changed_fields:
-            note.save(update_fields=changed_fields + ["updated_at"])
+    def delete(self, request, *args, **kwargs):
+        session = self.get_session()
+        if session.status == UploadSession.Status.OPEN:
+            abort_session(session)
+        return JsonResponse({"status": "ok", "result": serialize_session(session)})
 
-        return JsonResponse({"status": "ok", "updated_at": note.updated_at.isoformat()})
+
+class UploadSessionCompleteApi(LoginRequiredMixin, View):
+    def post(self, request, *args, **kwargs):
+        session = get_object_or_404(
+            UploadSession, pk=self.kwargs["upload_id"], owner=request.user
+        )
+        try:
+            session = complete_session(session.pk)
+        except UploadError as exc:
+            return _upload_error_response(exc)
+        attachment = session.attachment
+        return JsonResponse(
+            {
+                "status": "ok",
+                "result": {
+                    **serialize_session(session),
+                    "attachment": {
+                        "id": attachment.id,
+                        "name": attachment.file.name,
+                        "url": attachment.get_download_url(),
+                        "original_name": attachment.original_name,
+                        "size": attachment.size,
+                        "mime_type": attachment.mime_type,
+                        "content_hash": attachment.content_hash,
+                    },
+                },
+            }
+        )
 
 
 class NoteDeleteView(DeleteView):
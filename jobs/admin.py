@@ -0,0 +1,67 @@
+from django.contrib import admin, messages
+from django.utils import timezone
+
+from hyperadmin.admin import hyperadmin
+from .models import Job
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "task_path",
+        "status",
+        "priority",
+        "progress_display",
+        "attempts_display",
+        "run_after",
+        "finished_at",
+    )
+    list_filter = ("status", "queue_name")
+    search_fields = ("task_path", "dedupe_key")
+    readonly_fields = [field.name for field in Job._meta.fields]
+    actions = ["retry_jobs", "cancel_jobs"]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def progress_display(self, obj):
+        if obj.progress is None:
+            return "—"
+        text = f"{obj.progress:.0f}%"
+        return f"{text} {obj.progress_message}" if obj.progress_message else text
+
+    progress_display.short_description = "Progress"
+
+    def attempts_display(self, obj):
+        return f"{obj.attempts}/{obj.max_attempts}"
+
+    attempts_display.short_description = "Attempts"
+
+    @admin.action(description="Retry selected failed or cancelled jobs")
+    def retry_jobs(self, request, queryset):
+        count = queryset.filter(
+            status__in=[Job.Status.FAILED, Job.Status.CANCELLED]
+        ).update(
+            status=Job.Status.READY,
+            attempts=0,
+            run_after=timezone.now(),
+            finished_at=None,
+            lock_token=None,
+            progress=None,
+            progress_message="",
+        )
+        self.message_user(request, f"Requeued {count} jobs.", messages.SUCCESS)
+
+    @admin.action(description="Cancel selected ready or running jobs")
+    def cancel_jobs(self, request, queryset):
+        # A worker notices cancelled running jobs at its next heartbeat.
+        count = queryset.active().update(
+            status=Job.Status.CANCELLED, finished_at=timezone.now()
+        )
+        self.message_user(request, f"Cancelled {count} jobs.", messages.SUCCESS)
+
+
+hyperadmin.register(Job, JobAdmin)
@@ -0,0 +1,20 @@
+from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
+
+from hyperadmin.hooks import register_admin_action
+
+
+class JobsConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "jobs"
+    verbose_name = "Background tasks"
+
+    def ready(self):
+        from .tasks import delete_selected_in_background
+
+        # Workers find tasks by import path; importing every app's tasks.py
+        # up front surfaces broken task modules at startup.
+        autodiscover_modules("tasks")
+        register_admin_action(
+            delete_selected_in_background, name="delete_selected_in_background"
+        )
@@ -0,0 +1,167 @@
+from dataclasses import dataclass, replace
+
+from django.db import IntegrityError, transaction
+from django.tasks import Task, TaskResult, TaskResultStatus
+from django.tasks.backends.base import BaseTaskBackend
+from django.tasks.base import TaskError
+from django.tasks.exceptions import InvalidTask, TaskResultDoesNotExist
+from django.tasks.signals import task_enqueued
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+# Job.Status -> TaskResultStatus; cancelled jobs look failed to django.tasks.
+_RESULT_STATUSES = {
+    Job.Status.READY: TaskResultStatus.READY,
+    Job.Status.RUNNING: TaskResultStatus.RUNNING,
+    Job.Status.SUCCESSFUL: TaskResultStatus.SUCCESSFUL,
+    Job.Status.FAILED: TaskResultStatus.FAILED,
+    Job.Status.CANCELLED: TaskResultStatus.FAILED,
+}
+
+
+@dataclass(frozen=True, slots=True, kw_only=True)
+class JobTask(Task):
+    """
+    django.tasks Task with the extra options of the database backend:
+
+        @task(max_attempts=5, timeout=600)
+        def rebuild(context, pk): ...
+
+        rebuild.using(dedupe_key=f"rebuild:{pk}").enqueue(pk)
+
+    Unset options fall back to the backend's OPTIONS.
+    """
+
+    max_attempts: int | None = None
+    timeout: float | None = None
+    dedupe_key: str | None = None
+
+    def using(self, *, max_attempts=None, timeout=None, dedupe_key=None, **kwargs):
+        # Zero-argument super() does not work in slotted dataclasses.
+        task = Task.using(self, **kwargs)
+        changes = {}
+        if max_attempts is not None:
+            changes["max_attempts"] = max_attempts
+        if timeout is not None:
+            changes["timeout"] = timeout
+        if dedupe_key is not None:
+            changes["dedupe_key"] = dedupe_key
+        return replace(task, **changes)
+
+
+class DatabaseBackend(BaseTaskBackend):
+    """
+    Stores enqueued tasks as jobs.models.Job rows in the default database.
+    Nothing runs until a worker (`manage.py run_tasks`) picks them up.
+    """
+
+    task_class = JobTask
+    supports_defer = True
+    supports_async_task = True
+    supports_get_result = True
+    supports_priority = True
+
+    def __init__(self, alias, params):
+        super().__init__(alias, params)
+        self.default_timeout = self.options.get("DEFAULT_TIMEOUT", 90)
+        self.default_max_attempts = self.options.get("DEFAULT_MAX_ATTEMPTS", 3)
+        self.retry_backoff = self.options.get("RETRY_BACKOFF", 30)
+        self.retry_backoff_max = self.options.get("RETRY_BACKOFF_MAX", 3600)
+
+    def validate_task(self, task):
+        super().validate_task(task)
+        max_attempts = getattr(task, "max_attempts", None)
+        if max_attempts is not None and max_attempts < 1:
+            raise InvalidTask("max_attempts must be at least 1.")
+        timeout = getattr(task, "timeout", None)
+        if timeout is not None and timeout <= 0:
+            raise InvalidTask("timeout must be positive.")
+
+    def enqueue(self, task, args, kwargs):
+        """
+        Insert a Job for the task. With a dedupe key, an equal ready or
+        running job is returned instead of adding another one.
+        """
+        self.validate_task(task)
+        dedupe_key = getattr(task, "dedupe_key", None)
+        if dedupe_key:
+            existing = Job.objects.active().filter(dedupe_key=dedupe_key).first()
+            if existing is not None:
+                return self.to_task_result(existing)
+
+        job = Job(
+            task_path=task.module_path,
+            backend=self.alias,
+            queue_name=task.queue_name,
+            priority=task.priority,
+            dedupe_key=dedupe_key or None,
+            run_after=task.run_after or timezone.now(),
+            max_attempts=getattr(task, "max_attempts", None)
+            or self.default_max_attempts,
+            timeout=getattr(task, "timeout", None) or self.default_timeout,
+        )
+        result = TaskResult(
+            task=task,
+            id="",
+            status=TaskResultStatus.READY,
+            enqueued_at=None,
+            started_at=None,
+            last_attempted_at=None,
+            finished_at=None,
+            args=args,
+            kwargs=kwargs,
+            backend=self.alias,
+            errors=[],
+            worker_ids=[],
+        )
+        # TaskResult has normalized args/kwargs to JSON types.
+        job.args, job.kwargs = result.args, result.kwargs
+        try:
+            with transaction.atomic():
+                job.save()
+        except IntegrityError:
+            # Lost a race against an equal dedupe key.
+            existing = Job.objects.active().filter(dedupe_key=dedupe_key).first()
+            if existing is None:
+                raise
+            return self.to_task_result(existing)
+
+        object.__setattr__(result, "id", str(job.pk))
+        object.__setattr__(result, "enqueued_at", job.enqueued_at)
+        task_enqueued.send(type(self), task_result=result)
+        return result
+
+    def get_result(self, result_id):
+        try:
+            job = Job.objects.get(pk=int(result_id), backend=self.alias)
+        except (Job.DoesNotExist, ValueError):
+            raise TaskResultDoesNotExist(result_id) from None
+        return self.to_task_result(job)
+
+    def get_task(self, job):
+        task = import_string(job.task_path)
+        return task.using(priority=job.priority, queue_name=job.queue_name)
+
+    def to_task_result(self, job):
+        result = TaskResult(
+            task=self.get_task(job),
+            id=str(job.pk),
+            status=_RESULT_STATUSES[job.status],
+            enqueued_at=job.enqueued_at,
+            started_at=job.started_at,
+            last_attempted_at=job.last_attempted_at,
+            finished_at=job.finished_at,
+            args=job.args,
+            kwargs=job.kwargs,
+            backend=self.alias,
+            errors=[TaskError(**error) for error in job.errors],
+            worker_ids=list(job.worker_ids),
+        )
+        object.__setattr__(result, "_return_value", job.return_value)
+        return result
+
+    def retry_delay(self, attempts):
+        """Exponential backoff: RETRY_BACKOFF, then doubled per attempt."""
+        return min(self.retry_backoff * 2 ** max(attempts - 1, 0), self.retry_backoff_max)
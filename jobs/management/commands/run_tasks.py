@@ -0,0 +1,75 @@
+import os
+import signal
+import sys
+
+from django.core.management.base import BaseCommand
+
+from jobs.worker import Worker
+
+
+class Command(BaseCommand):
+    help = (
+        "Run background tasks enqueued on the database task backend. "
+        "SIGTERM or Ctrl-C stops claiming jobs and waits for running ones."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--backend",
+            default="default",
+            help="Alias in settings.TASKS (default: default).",
+        )
+        parser.add_argument(
+            "--mode",
+            choices=["thread", "process"],
+            help="Run jobs in a thread pool or in one process per attempt "
+            "(default: WORKER_MODE option, thread).",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            help="Jobs run at the same time (default: WORKER_CONCURRENCY option, 2).",
+        )
+        parser.add_argument(
+            "--queue",
+            action="append",
+            dest="queues",
+            help="Only run jobs from this queue; can be repeated.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            help="Seconds between polls when idle (default: POLL_INTERVAL option, 1).",
+        )
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="Exit once no job is due instead of waiting for more.",
+        )
+
+    def handle(self, *args, **options):
+        worker = Worker(
+            backend=options["backend"],
+            mode=options["mode"],
+            concurrency=options["concurrency"],
+            queues=options["queues"],
+            poll_interval=options["poll_interval"],
+            burst=options["burst"],
+        )
+
+        def stop(signum, frame):
+            self.stdout.write("Stopping, waiting for running jobs...")
+            worker.stop()
+            # A second signal interrupts for real.
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGTERM, stop)
+        worker.run()
+        if worker.hung_threads:
+            # Python would wait for them at exit; their jobs are failed already.
+            self.stderr.write(f"Exiting with {worker.hung_threads} task threads still running.")
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(1)
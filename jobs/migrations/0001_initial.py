@@ -0,0 +1,49 @@
+# Generated by Django 6.1.2 on 2026-10-18 15:25
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task_path', models.CharField(max_length=255)),
+                ('args', models.JSONField(blank=True, default=list)),
+                ('kwargs', models.JSONField(blank=True, default=dict)),
+                ('backend', models.CharField(default='default', max_length=100)),
+                ('queue_name', models.CharField(default='default', max_length=100)),
+                ('priority', models.IntegerField(default=0, help_text='Higher runs first.')),
+                ('status', models.CharField(choices=[('READY', 'Ready'), ('RUNNING', 'Running'), ('SUCCESSFUL', 'Successful'), ('FAILED', 'Failed'), ('CANCELLED', 'Cancelled')], default='READY', max_length=10)),
+                ('dedupe_key', models.CharField(blank=True, help_text='At most one ready or running job per key.', max_length=255, null=True)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('max_attempts', models.PositiveIntegerField(default=1)),
+                ('timeout', models.FloatField(blank=True, help_text='Seconds per attempt.', null=True)),
+                ('lock_token', models.UUIDField(blank=True, editable=False, null=True)),
+                ('worker_ids', models.JSONField(blank=True, default=list, editable=False)),
+                ('heartbeat_at', models.DateTimeField(blank=True, editable=False, null=True)),
+                ('progress', models.FloatField(blank=True, help_text='0 to 100.', null=True)),
+                ('progress_message', models.CharField(blank=True, max_length=255)),
+                ('return_value', models.JSONField(blank=True, null=True)),
+                ('errors', models.JSONField(blank=True, default=list)),
+                ('enqueued_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('last_attempted_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-enqueued_at'],
+                'indexes': [models.Index(fields=['status', 'queue_name', '-priority', 'run_after'], name='jobs_job_due_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status__in', ['READY', 'RUNNING'])), fields=('dedupe_key',), name='jobs_job_active_dedupe_key')],
+            },
+        ),
+    ]
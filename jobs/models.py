@@ -0,0 +1,112 @@
+from django.db import models
+from django.db.models import Count, Q
+from django.tasks import DEFAULT_TASK_QUEUE_NAME
+from django.utils import timezone
+
+
+class JobQuerySet(models.QuerySet):
+    def active(self):
+        return self.filter(status__in=Job.ACTIVE_STATUSES)
+
+    def due(self, queues=None):
+        jobs = self.filter(status=Job.Status.READY, run_after__lte=timezone.now())
+        if queues:
+            jobs = jobs.filter(queue_name__in=queues)
+        return jobs.order_by("-priority", "run_after", "id")
+
+    def summary(self, running_limit=10):
+        """Counts per status and the running jobs, for the dashboard."""
+        counts = dict(
+            self.values_list("status").annotate(count=Count("id")).order_by()
+        )
+        return {
+            "counts": {
+                label: counts.get(status, 0) for status, label in Job.Status.choices
+            },
+            "due": self.due().count(),
+            "running": list(
+                self.filter(status=Job.Status.RUNNING).order_by("last_attempted_at")[
+                    :running_limit
+                ]
+            ),
+        }
+
+
+class Job(models.Model):
+    """
+    A django.tasks task enqueued on the database backend (jobs.backend),
+    executed by `manage.py run_tasks`.
+    """
+
+    class Status(models.TextChoices):
+        # Same values as django.tasks.TaskResultStatus, plus CANCELLED.
+        READY = "READY", "Ready"
+        RUNNING = "RUNNING", "Running"
+        SUCCESSFUL = "SUCCESSFUL", "Successful"
+        FAILED = "FAILED", "Failed"
+        CANCELLED = "CANCELLED", "Cancelled"
+
+    ACTIVE_STATUSES = [Status.READY, Status.RUNNING]
+
+    task_path = models.CharField(max_length=255)
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    backend = models.CharField(max_length=100, default="default")
+    queue_name = models.CharField(max_length=100, default=DEFAULT_TASK_QUEUE_NAME)
+    priority = models.IntegerField(default=0, help_text="Higher runs first.")
+    status = models.CharField(
+        max_length=10,
+        choices=Status.choices,
+        default=Status.READY,
+    )
+    dedupe_key = models.CharField(
+        max_length=255,
+        null=True,
+        blank=True,
+        help_text="At most one ready or running job per key.",
+    )
+    run_after = models.DateTimeField(default=timezone.now)
+
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=1)
+    timeout = models.FloatField(null=True, blank=True, help_text="Seconds per attempt.")
+
+    # Changes on every claim; a worker only records the outcome of its own attempt.
+    lock_token = models.UUIDField(null=True, blank=True, editable=False)
+    worker_ids = models.JSONField(default=list, blank=True, editable=False)
+    heartbeat_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    progress = models.FloatField(null=True, blank=True, help_text="0 to 100.")
+    progress_message = models.CharField(max_length=255, blank=True)
+    return_value = models.JSONField(null=True, blank=True)
+    errors = models.JSONField(default=list, blank=True)
+
+    enqueued_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    last_attempted_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    objects = JobQuerySet.as_manager()
+
+    class Meta:
+        ordering = ["-enqueued_at"]
+        indexes = [
+            models.Index(
+                fields=["status", "queue_name", "-priority", "run_after"],
+                name="jobs_job_due_idx",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["dedupe_key"],
+                condition=Q(status__in=["READY", "RUNNING"]),
+                name="jobs_job_active_dedupe_key",
+            ),
+        ]
+
+    @property
+    def task_name(self):
+        return self.task_path.rpartition(".")[2]
+
+    def __str__(self):
+        return f"{self.task_name} #{self.pk}"
@@ -0,0 +1,19 @@
+"""
+Entry point of the processes `run_tasks --mode process` spawns, one per
+attempt. A spawned child starts from a fresh interpreter, so Django is set
+up here before anything touches models.
+"""
+
+import os
+
+
+def run_job(settings_module, job_id, lock_token, worker_id):
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings_module)
+
+    import django
+
+    django.setup()
+
+    from .worker import execute_job
+
+    execute_job(job_id, lock_token, worker_id)
@@ -0,0 +1,36 @@
+import threading
+import time
+
+from .models import Job
+
+# Progress writes per job are throttled to one every PROGRESS_INTERVAL seconds.
+PROGRESS_INTERVAL = 1.0
+
+_last_report = {}
+_last_report_lock = threading.Lock()
+
+
+def report_progress(context, done, total=None, message=""):
+    """
+    Record how far a running task got, shown in the admin and on the
+    dashboard. For tasks declared with @task(takes_context=True):
+
+        report_progress(context, index, len(items), "Deleting notes")
+
+    Without total, done is taken as a percentage.
+    """
+    job_id = context.task_result.id
+    percent = done * 100 / total if total else done
+    percent = max(0.0, min(float(percent), 100.0))
+
+    now = time.monotonic()
+    with _last_report_lock:
+        if percent < 100 and now - _last_report.get(job_id, 0.0) < PROGRESS_INTERVAL:
+            return
+        _last_report[job_id] = now
+        if percent >= 100:
+            _last_report.pop(job_id, None)
+
+    Job.objects.filter(pk=job_id, status=Job.Status.RUNNING).update(
+        progress=percent, progress_message=message[:255]
+    )
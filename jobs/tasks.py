@@ -0,0 +1,106 @@
+from django.apps import apps
+from django.contrib import messages
+from django.contrib.admin.sites import all_sites
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.http import HttpRequest
+from django.tasks import task
+
+from .progress import report_progress
+
+DELETE_BATCH_SIZE = 500
+# Primary keys per delete job, so no job's arguments grow without bound.
+DELETE_JOB_SIZE = 10000
+
+
+def _model_admin(site_name, model):
+    for site in all_sites:
+        if site.name == site_name:
+            return site._registry.get(model)
+    return None
+
+
+def _deletable(model_admin, request, model, pks):
+    """The pks of rows of model the request's user may delete."""
+    if model_admin is None:
+        return []
+    return [
+        obj.pk
+        for obj in model._default_manager.filter(pk__in=pks)
+        if model_admin.has_delete_permission(request, obj)
+    ]
+
+
+@task(takes_context=True, timeout=3600)
+def delete_objects(context, model_label, pks, user_id, admin_site="admin"):
+    """
+    Delete rows in batches, each in its own transaction. Every row is
+    checked again against the admin's has_delete_permission() for the user
+    who asked, as of now; rows they may no longer delete are skipped.
+    """
+    model = apps.get_model(model_label)
+    request = HttpRequest()
+    request.user = (
+        get_user_model()._default_manager.filter(pk=user_id, is_active=True).first()
+    )
+    if request.user is None:
+        return {"deleted": 0, "skipped": len(pks)}
+    model_admin = _model_admin(admin_site, model)
+    deleted = skipped = 0
+    for start in range(0, len(pks), DELETE_BATCH_SIZE):
+        batch = pks[start : start + DELETE_BATCH_SIZE]
+        with transaction.atomic():
+            allowed = _deletable(model_admin, request, model, batch)
+            skipped += len(batch) - len(allowed)
+            _, per_model = model._default_manager.filter(pk__in=allowed).delete()
+        deleted += per_model.get(model._meta.label, 0)
+        report_progress(
+            context,
+            start + len(batch),
+            len(pks),
+            f"Deleted {deleted} {model._meta.verbose_name_plural}",
+        )
+    return {"deleted": deleted, "skipped": skipped}
+
+
+def delete_selected_in_background(modeladmin, request, queryset):
+    if not modeladmin.has_delete_permission(request):
+        modeladmin.message_user(
+            request, "You may not delete these objects.", messages.ERROR
+        )
+        return
+    opts = modeladmin.model._meta
+    # Only rows this user may delete, object by object (e.g. by subject
+    # role); task arguments are stored as JSON.
+    pks, skipped = [], 0
+    for obj in queryset.iterator(chunk_size=DELETE_BATCH_SIZE):
+        if modeladmin.has_delete_permission(request, obj):
+            pks.append(str(obj.pk))
+        else:
+            skipped += 1
+    if not pks:
+        modeladmin.message_user(
+            request, "You may not delete any of these objects.", messages.ERROR
+        )
+        return
+    job_ids = [
+        delete_objects.enqueue(
+            opts.label,
+            pks[start : start + DELETE_JOB_SIZE],
+            request.user.pk,
+            modeladmin.admin_site.name,
+        ).id
+        for start in range(0, len(pks), DELETE_JOB_SIZE)
+    ]
+    message = (
+        f"Deleting {len(pks)} {opts.verbose_name_plural} in the background "
+        f"(job {', '.join(f'#{job_id}' for job_id in job_ids)})."
+    )
+    if skipped:
+        message += f" Skipped {skipped} you may not delete."
+    modeladmin.message_user(request, message, messages.SUCCESS)
+
+
+delete_selected_in_background.short_description = (
+    "Delete selected %(verbose_name_plural)s in the background"
+)
@@ -0,0 +1,447 @@
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import timedelta
+from traceback import format_exception
+
+from django.db import connections
+from django.db.models import DateTimeField, F, Value
+from django.db.models.functions import Coalesce
+from django.tasks import TaskContext, task_backends
+from django.tasks.signals import task_finished, task_started
+from django.utils import timezone
+from django.utils.json import normalize_json
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# Only the last few tracebacks of a job are kept.
+MAX_ERRORS = 5
+
+
+class JobTimeout(TimeoutError):
+    pass
+
+
+class JobCrashed(RuntimeError):
+    pass
+
+
+class JobLost(RuntimeError):
+    """The worker running the job stopped sending heartbeats."""
+
+
+def _error(exception_class, message):
+    return {
+        "exception_class_path": f"{exception_class.__module__}.{exception_class.__qualname__}",
+        "traceback": f"{exception_class.__name__}: {message}\n",
+    }
+
+
+def _exception_error(exc):
+    exception_class = type(exc)
+    return {
+        "exception_class_path": f"{exception_class.__module__}.{exception_class.__qualname__}",
+        "traceback": "".join(format_exception(exc)),
+    }
+
+
+def _owned(job_id, lock_token):
+    return Job.objects.filter(pk=job_id, lock_token=lock_token, status=Job.Status.RUNNING)
+
+
+def _finish_attempt(job, lock_token, **changes):
+    """
+    Apply the outcome with one conditional UPDATE, only while the attempt
+    still owns the job (not timed out, cancelled or taken over). A read
+    followed by a write in one transaction would fail outright on SQLite
+    when another connection is writing.
+    """
+    updated = _owned(job.pk, lock_token).update(lock_token=None, **changes)
+    for name, value in changes.items():
+        setattr(job, name, value)
+    return bool(updated)
+
+
+def _send_finished(job):
+    backend = task_backends[job.backend]
+    try:
+        task_result = backend.to_task_result(job)
+    except (ImportError, AttributeError):
+        return
+    task_finished.send(type(backend), task_result=task_result)
+
+
+def record_success(job_id, lock_token, return_value):
+    job = _owned(job_id, lock_token).first()
+    if job is None or not _finish_attempt(
+        job,
+        lock_token,
+        status=Job.Status.SUCCESSFUL,
+        return_value=return_value,
+        finished_at=timezone.now(),
+        progress=100,
+    ):
+        return None
+    _send_finished(job)
+    return job
+
+
+def record_failure(job_id, lock_token, error, retry=True):
+    """
+    Fail one attempt. The job goes back to the queue after a backoff delay
+    while it has attempts left, otherwise it is failed for good.
+    """
+    job = _owned(job_id, lock_token).first()
+    if job is None:
+        return None
+    backend = task_backends[job.backend]
+    now = timezone.now()
+    errors = [*job.errors, error][-MAX_ERRORS:]
+    if retry and job.attempts < job.max_attempts:
+        run_after = now + timedelta(seconds=backend.retry_delay(job.attempts))
+        if not _finish_attempt(
+            job, lock_token, status=Job.Status.READY, errors=errors, run_after=run_after
+        ):
+            return None
+        logger.warning(
+            "[jobs] %s attempt %s/%s failed (%s), retrying at %s",
+            job,
+            job.attempts,
+            job.max_attempts,
+            error["exception_class_path"],
+            run_after.isoformat(),
+        )
+        return job
+
+    if not _finish_attempt(
+        job, lock_token, status=Job.Status.FAILED, errors=errors, finished_at=now
+    ):
+        return None
+    logger.error(
+        "[jobs] %s failed after %s attempts: %s",
+        job,
+        job.attempts,
+        error["exception_class_path"],
+    )
+    _send_finished(job)
+    return job
+
+
+def release(job_id, lock_token):
+    """Put an interrupted attempt back in the queue without counting it."""
+    _owned(job_id, lock_token).update(
+        status=Job.Status.READY,
+        lock_token=None,
+        attempts=F("attempts") - 1,
+        run_after=timezone.now(),
+    )
+
+
+def execute_job(job_id, lock_token, worker_id):
+    """
+    Run one claimed attempt of a job and record its outcome. Runs in a
+    worker thread, or in a spawned process (see jobs.process).
+    """
+    try:
+        job = _owned(job_id, lock_token).first()
+        if job is None:
+            return
+        job.worker_ids = [*job.worker_ids, worker_id]
+        Job.objects.filter(pk=job_id, lock_token=lock_token).update(
+            worker_ids=job.worker_ids
+        )
+        backend = task_backends[job.backend]
+        try:
+            task_result = backend.to_task_result(job)
+            task = task_result.task
+            task_started.send(type(backend), task_result=task_result)
+            if task.takes_context:
+                return_value = task.call(
+                    TaskContext(task_result=task_result), *job.args, **job.kwargs
+                )
+            else:
+                return_value = task.call(*job.args, **job.kwargs)
+            return_value = normalize_json(return_value)
+        except KeyboardInterrupt:
+            raise
+        except BaseException as exc:
+            logger.exception("[jobs] %s raised", job)
+            record_failure(job_id, lock_token, _exception_error(exc))
+        else:
+            record_success(job_id, lock_token, return_value)
+    finally:
+        connections.close_all()
+
+
+@dataclass
+class RunningJob:
+    job_id: int
+    lock_token: uuid.UUID
+    timeout: float | None
+    handle: object
+    started: float = field(default_factory=time.monotonic)
+    # Timed out or cancelled; the outcome no longer counts.
+    abandoned: bool = False
+
+
+class Worker:
+    """
+    Claims due jobs and runs them in a thread pool or in one spawned process
+    per attempt. Threads are cheap but cannot be killed, so a timed out
+    thread keeps its slot until the task returns and its job is failed
+    without a retry; processes are terminated and their jobs retried.
+    """
+
+    def __init__(
+        self,
+        backend="default",
+        mode=None,
+        concurrency=None,
+        queues=None,
+        poll_interval=None,
+        burst=False,
+    ):
+        self.backend = task_backends[backend]
+        options = self.backend.options
+        self.mode = mode or options.get("WORKER_MODE", "thread")
+        if self.mode not in ("thread", "process"):
+            raise ValueError(f"Unknown worker mode {self.mode!r}")
+        self.concurrency = concurrency or options.get("WORKER_CONCURRENCY", 2)
+        self.queues = list(queues or self.backend.queues)
+        self.poll_interval = poll_interval or options.get("POLL_INTERVAL", 1.0)
+        self.heartbeat_interval = options.get("HEARTBEAT_INTERVAL", 10)
+        self.stale_after = options.get("STALE_AFTER", 120)
+        self.shutdown_timeout = options.get("SHUTDOWN_TIMEOUT", 30)
+        self.keep_finished = timedelta(days=options.get("KEEP_FINISHED_DAYS", 14))
+        self.burst = burst
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+        self.running = {}
+        self._stop = threading.Event()
+        self._last_heartbeat = 0.0
+        self._last_purge = 0.0
+        self._executor = None
+        # Threads of abandoned jobs still running when the worker stopped.
+        self.hung_threads = 0
+        self._mp_context = multiprocessing.get_context("spawn")
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self):
+        logger.info(
+            "[jobs] worker %s started: %s mode, %s slots, queues %s",
+            self.worker_id,
+            self.mode,
+            self.concurrency,
+            ", ".join(self.queues),
+        )
+        if self.mode == "thread":
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.concurrency, thread_name_prefix="jobs-worker"
+            )
+        try:
+            while not self._stop.is_set():
+                self.reap()
+                self.enforce_timeouts()
+                self.maintain()
+                started = self.start_jobs(self.concurrency - len(self.running))
+                if self.burst and not started and not self.running:
+                    break
+                if not started:
+                    self._stop.wait(self.poll_interval)
+        finally:
+            self.shutdown()
+
+    def claim(self, limit):
+        """Atomically take up to limit due jobs; returns [(job, lock_token)]."""
+        if limit <= 0:
+            return []
+        now = timezone.now()
+        candidates = Job.objects.due(self.queues).values_list("id", flat=True)
+        claimed = []
+        for job_id in list(candidates[: limit * 2]):
+            lock_token = uuid.uuid4()
+            # Conditional UPDATE: only one worker wins a job, without
+            # holding locks (SQLite has no SELECT ... FOR UPDATE).
+            won = Job.objects.filter(pk=job_id, status=Job.Status.READY).update(
+                status=Job.Status.RUNNING,
+                lock_token=lock_token,
+                attempts=F("attempts") + 1,
+                started_at=Coalesce("started_at", Value(now, DateTimeField())),
+                last_attempted_at=now,
+                heartbeat_at=now,
+            )
+            if won:
+                claimed.append((Job.objects.get(pk=job_id), lock_token))
+                if len(claimed) == limit:
+                    break
+        return claimed
+
+    def start_jobs(self, limit):
+        claimed = self.claim(limit)
+        for job, lock_token in claimed:
+            if self.mode == "thread":
+                handle = self._executor.submit(
+                    execute_job, job.pk, lock_token, self.worker_id
+                )
+            else:
+                from .process import run_job
+
+                handle = self._mp_context.Process(
+                    target=run_job,
+                    args=(
+                        os.environ["DJANGO_SETTINGS_MODULE"],
+                        job.pk,
+                        lock_token,
+                        self.worker_id,
+                    ),
+                    name=f"jobs-{job.pk}",
+                    daemon=True,
+                )
+                handle.start()
+            self.running[lock_token] = RunningJob(job.pk, lock_token, job.timeout, handle)
+            logger.info("[jobs] started %s (attempt %s)", job, job.attempts)
+        return len(claimed)
+
+    def _is_done(self, running):
+        if self.mode == "thread":
+            return running.handle.done()
+        return not running.handle.is_alive()
+
+    def reap(self):
+        for lock_token, running in list(self.running.items()):
+            if not self._is_done(running):
+                continue
+            del self.running[lock_token]
+            if self.mode == "process":
+                running.handle.join()
+                exitcode = running.handle.exitcode
+                if exitcode and not running.abandoned:
+                    record_failure(
+                        running.job_id,
+                        lock_token,
+                        _error(JobCrashed, f"worker process exited with code {exitcode}"),
+                    )
+            elif running.handle.exception() is not None and not running.abandoned:
+                # Recording the outcome itself failed, e.g. the database was busy.
+                record_failure(
+                    running.job_id, lock_token, _exception_error(running.handle.exception())
+                )
+
+    def enforce_timeouts(self):
+        now = time.monotonic()
+        for running in self.running.values():
+            if running.abandoned or not running.timeout:
+                continue
+            if now - running.started < running.timeout:
+                continue
+            self.abandon(running, f"no result after {running.timeout:g} s")
+
+    def abandon(self, running, message):
+        """
+        Give up on a running attempt. A process is terminated and the job
+        retried; a thread cannot be stopped, so its job fails for good
+        rather than run twice at once.
+        """
+        running.abandoned = True
+        if self.mode == "process":
+            record_failure(running.job_id, running.lock_token, _error(JobTimeout, message))
+            running.handle.terminate()
+            return
+        record_failure(
+            running.job_id,
+            running.lock_token,
+            _error(JobTimeout, f"{message}, its thread could not be stopped"),
+            retry=False,
+        )
+        logger.warning(
+            "[jobs] job %s abandoned (%s), its thread keeps running until it returns",
+            running.job_id,
+            message,
+        )
+
+    def maintain(self):
+        """Heartbeats, cancellations, jobs of dead workers, old results."""
+        now = time.monotonic()
+        if now - self._last_heartbeat >= self.heartbeat_interval:
+            self._last_heartbeat = now
+            self.heartbeat()
+            self.recover_stale()
+        if now - self._last_purge >= 3600:
+            self._last_purge = now
+            Job.objects.filter(
+                status=Job.Status.SUCCESSFUL,
+                finished_at__lt=timezone.now() - self.keep_finished,
+            ).delete()
+
+    def heartbeat(self):
+        tokens = [token for token, running in self.running.items() if not running.abandoned]
+        if not tokens:
+            return
+        owned = Job.objects.filter(lock_token__in=tokens, status=Job.Status.RUNNING)
+        alive = set(owned.values_list("lock_token", flat=True))
+        owned.update(heartbeat_at=timezone.now())
+        for token in set(tokens) - alive:
+            # Cancelled from the admin, or taken over as stale.
+            running = self.running[token]
+            running.abandoned = True
+            if self.mode == "process":
+                running.handle.terminate()
+
+    def recover_stale(self):
+        cutoff = timezone.now() - timedelta(seconds=self.stale_after)
+        stale = Job.objects.filter(status=Job.Status.RUNNING, heartbeat_at__lt=cutoff)
+        for job_id, lock_token in stale.values_list("id", "lock_token"):
+            if lock_token in self.running:
+                continue
+            record_failure(job_id, lock_token, _error(JobLost, "worker stopped responding"))
+
+    def _waiting(self, deadline):
+        if not self.running:
+            return False
+        if time.monotonic() < deadline:
+            return True
+        # Past SHUTDOWN_TIMEOUT threads still get until their own timeout.
+        return self.mode == "thread" and any(
+            not running.abandoned and running.timeout
+            for running in self.running.values()
+        )
+
+    def shutdown(self):
+        """
+        Let running jobs finish. Processes still running after
+        SHUTDOWN_TIMEOUT are terminated and their jobs requeued. Threads get
+        until their job's timeout; jobs without one are abandoned at
+        SHUTDOWN_TIMEOUT, and hung threads are left behind (see hung_threads).
+        """
+        deadline = time.monotonic() + self.shutdown_timeout
+        while self._waiting(deadline):
+            self.reap()
+            self.enforce_timeouts()
+            self.maintain()
+            time.sleep(0.2)
+        for lock_token, running in list(self.running.items()):
+            if self.mode == "thread":
+                if not running.abandoned:
+                    self.abandon(running, "still running at shutdown")
+                self.hung_threads += 1
+                continue
+            running.handle.terminate()
+            running.handle.join(self.shutdown_timeout)
+            if running.handle.is_alive():
+                running.handle.kill()
+                running.handle.join(self.shutdown_timeout)
+            release(running.job_id, lock_token)
+            del self.running[lock_token]
+        if self._executor is not None:
+            self._executor.shutdown(wait=not self.hung_threads, cancel_futures=True)
+        logger.info("[jobs] worker %s stopped", self.worker_id)
@@ -0,0 +1,195 @@
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.db import connections
+
+from search.providers import provider_options, provider_registry
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_SEARCH_SETTINGS = getattr(settings, "GLOBAL_SEARCH", {})
+
+MAX_WORKERS = GLOBAL_SEARCH_SETTINGS.get("MAX_WORKERS", 4)
+PROVIDER_TIMEOUT = GLOBAL_SEARCH_SETTINGS.get("PROVIDER_TIMEOUT", 0.8)
+TOTAL_TIMEOUT = GLOBAL_SEARCH_SETTINGS.get("TOTAL_TIMEOUT", 1.5)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# session key -> SearchRun currently in flight for that session
+_active_runs = {}
+_active_runs_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """
+    One bounded pool per process. Providers that overrun their deadline keep
+    their thread until they return, so a stuck provider can never occupy more
+    than MAX_WORKERS threads and never blocks the request worker itself.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=MAX_WORKERS, thread_name_prefix="global-search"
+            )
+        return _executor
+
+
+class SearchRun:
+    """
+    A single global search request. Superseding it (a newer query from the
+    same session) cancels providers that have not started yet and wakes up
+    the waiting request immediately.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.cancelled = threading.Event()
+        self.cancel_future = Future()
+        self.futures = []
+
+    def cancel(self):
+        self.cancelled.set()
+        for future in self.futures:
+            future.cancel()
+        if not self.cancel_future.done():
+            self.cancel_future.set_result(None)
+
+
+def _session_key(request):
+    session = getattr(request, "session", None)
+    session_key = session.session_key if session is not None else None
+    user = getattr(request, "user", None)
+    if session_key is None and (user is None or not user.is_authenticated):
+        return None
+    return f"{getattr(user, 'pk', None)}:{session_key}"
+
+
+def _start_run(request) -> SearchRun:
+    run = SearchRun(_session_key(request))
+    if run.key is None:
+        return run
+    with _active_runs_lock:
+        previous = _active_runs.get(run.key)
+        _active_runs[run.key] = run
+    if previous is not None:
+        previous.cancel()
+    return run
+
+
+def _finish_run(run: SearchRun):
+    if run.key is None:
+        return
+    with _active_runs_lock:
+        if _active_runs.get(run.key) is run:
+            del _active_runs[run.key]
+
+
+def _call_provider(provider, request, query, cancelled):
+    if cancelled.is_set():
+        return [], 0.0
+    started = time.monotonic()
+    try:
+        return list(provider(request, query) or []), time.monotonic() - started
+    finally:
+        # Pool threads are long-lived; don't leave a connection open per thread.
+        connections.close_all()
+
+
+def run_search_providers(request, query, providers=None):
+    """
+    Run every provider concurrently, each against its own deadline.
+
+    Returns (results, meta) where results is a list of (provider_name, items)
+    in registration order for providers that finished in time, and meta holds
+    per-provider status ("ok", "error", "timeout", "cancelled") and timings.
+
+    Providers may check request.search_cancelled (a threading.Event) to stop
+    early once the query has been superseded.
+    """
+    providers = provider_registry if providers is None else providers
+    started = time.monotonic()
+    run = _start_run(request)
+    request.search_cancelled = run.cancelled
+
+    executor = get_executor()
+    deadlines = {}
+    names = {}
+    for provider in providers:
+        options = provider_options.get(provider, {})
+        timeout = min(options.get("timeout") or PROVIDER_TIMEOUT, TOTAL_TIMEOUT)
+        future = executor.submit(
+            _call_provider, provider, request, query, run.cancelled
+        )
+        run.futures.append(future)
+        deadlines[future] = started + timeout
+        names[future] = options.get("name") or getattr(
+            provider, "__name__", repr(provider)
+        )
+
+    outcomes = {}
+    pending = set(run.futures)
+    try:
+        while pending:
+            now = time.monotonic()
+            for future in [f for f in pending if deadlines[f] <= now]:
+                future.cancel()
+                pending.discard(future)
+                outcomes[future] = {
+                    "status": "timeout",
+                    "elapsed_ms": round((now - started) * 1000, 1),
+                }
+            if run.cancelled.is_set():
+                for future in pending:
+                    outcomes[future] = {"status": "cancelled", "elapsed_ms": None}
+                break
+            if not pending:
+                break
+
+            next_deadline = min(deadlines[f] for f in pending)
+            done, _ = wait(
+                pending | {run.cancel_future},
+                timeout=max(next_deadline - now, 0),
+                return_when=FIRST_COMPLETED,
+            )
+            for future in done & pending:
+                pending.discard(future)
+                try:
+                    items, elapsed = future.result()
+                except Exception:
+                    logger.exception(
+                        "[search] provider %r failed for query %r",
+                        names[future],
+                        query,
+                    )
+                    outcomes[future] = {
+                        "status": "error",
+                        "elapsed_ms": round((time.monotonic() - started) * 1000, 1),
+                    }
+                else:
+                    outcomes[future] = {
+                        "status": "ok",
+                        "elapsed_ms": round(elapsed * 1000, 1),
+                        "items": items,
+                    }
+    finally:
+        _finish_run(run)
+
+    results = []
+    meta = []
+    for future in run.futures:
+        outcome = outcomes.get(future, {"status": "cancelled", "elapsed_ms": None})
+        items = outcome.pop("items", [])
+        if outcome["status"] == "ok":
+            results.append((names[future], items))
+        meta.append({"name": names[future], "count": len(items), **outcome})
+
+    return results, {
+        "providers": meta,
+        "superseded": run.cancelled.is_set(),
+        "elapsed_ms": round((time.monotonic() - started) * 1000, 1),
+    }
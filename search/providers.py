@@ -1,5 +1,27 @@
 provider_registry = []
+provider_options = {}
 
-def register_global_search_provider(func):
-    provider_registry.append(func)
-    return func
+
+def register_global_search_provider(func=None, *, timeout=None, name=None):
+    """
+    Register provider(request, query) -> list[dict].
+
+    Can be called directly or used as a decorator, with or without options:
+        register_global_search_provider(provider)
+        @register_global_search_provider(timeout=0.3)
+
+    timeout: seconds this provider may take before its results are dropped,
+    defaults to GLOBAL_SEARCH["PROVIDER_TIMEOUT"].
+    """
+
+    def register(func):
+        provider_registry.append(func)
+        provider_options[func] = {
+            "name": name or getattr(func, "__name__", repr(func)),
+            "timeout": timeout,
+        }
+        return func
+
+    if func is None:
+        return register
+    return register(func)
@@ -1,6 +1,6 @@
 from django.http import JsonResponse
 
-from search.providers import provider_registry
+from search.executor import run_search_providers
 
 
 def global_search_api(request) -> JsonResponse:
@@ -8,6 +8,9 @@ def global_search_api(request) -> JsonResponse:
         JSON global search endpoint.
 
         Expects ?query=...
+        Providers run concurrently, each with its own deadline; whatever
+        finished in time is returned. A newer query from the same session
+        supersedes this one.
         Returns:
             {
             "results": [
@@ -17,21 +20,25 @@ def global_search_api(request) -> JsonResponse:
                 "url": "/hyperdossier/admin/app/model/pk/change/"
                 },
                 ...
-            ]
+            ],
+            "providers": [
+                {"name": "...", "status": "ok|error|timeout|cancelled",
+                 "elapsed_ms": 12.3, "count": 5},
+                ...
+            ],
+            "superseded": false,
+            "elapsed_ms": 15.2
             }
         """
         query = (request.GET.get("query") or "").strip()
         results = []
 
         if not query:
-            return JsonResponse({"results": []})
+            return JsonResponse({"results": [], "providers": [], "superseded": False})
 
-        for provider in provider_registry:
-            try:
-                extra = provider(request, query) or []
-            except Exception:
-                extra = []
+        provider_results, meta = run_search_providers(request, query)
 
+        for _name, extra in provider_results:
             for item in extra:
                 norm = {
                     "title": item.get("title", ""),
@@ -42,4 +49,4 @@ def global_search_api(request) -> JsonResponse:
 
         results = results[:200]
 
-        return JsonResponse({"results": results})
+        return JsonResponse({"results": results, **meta})